@@ -28,22 +28,36 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'shop.metrics.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'shop.profiling.ProfilingMiddleware',
+    'shop.guest_cart.GuestCartMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+# STATICFILES_STORAGE is ignored since Django 5.1; STORAGES is the only way to
+# get hashed file names (served with far-future immutable caching by
+# WhiteNoise) and precompressed gzip/Brotli copies at collectstatic time.
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+    },
+}
 
 
 ROOT_URLCONF = 'ecommerce_site.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's own backend, plus render timing for /metrics
+        'BACKEND': 'shop.metrics.InstrumentedTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -67,6 +81,14 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Web workers and run_worker threads write concurrently: take the
+        # write lock up front (no deadlock on lock upgrade) and wait for it
+        # instead of failing with "database is locked". Readers carry on
+        # during writes because migration 0017 switches the file to WAL.
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -86,8 +108,50 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# One SQLite-backed cache shared by all gunicorn/worker processes on the
+# machine, fronted by a small per-process LRU (see shop/cache_backend.py).
+CACHES = {
+    'default': {
+        'BACKEND': 'shop.cache_backend.TwoTierCache',
+        'LOCATION': BASE_DIR / 'var' / 'cache',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100_000,
+            'LOCAL_MAX_ENTRIES': 2_000,
+        },
+    }
+}
+
 
 # Auth redirects
 LOGIN_URL = 'login'            # named URL
 LOGIN_REDIRECT_URL = 'home'    # after successful login
 LOGOUT_REDIRECT_URL = 'login'  # after logout
+
+# Delivered/cancelled orders older than this move to the archive tables
+# (see shop/archive.py and the archive_orders command)
+ORDER_ARCHIVE_AFTER_DAYS = 180
+
+# Pincode serviceability index built by `manage.py load_pincodes <csv>` (see
+# shop/serviceability.py). Without it every pincode gets a flat 3-5 day estimate.
+PINCODE_INDEX_PATH = BASE_DIR / 'var' / 'pincodes.idx'
+
+# Per-request profiler (see shop/profiling.py). Staff can profile any request
+# with ?_profile=1 or an X-Profile header; a non-zero sample rate also
+# profiles that fraction of all requests.
+PROFILER_SAMPLE_RATE = float(os.environ.get("PROFILER_SAMPLE_RATE", "0"))
+PROFILER_INTERVAL = 0.002  # seconds between stack samples
+PROFILER_DIR = BASE_DIR / 'var' / 'profiles'
+
+# Prometheus metrics at /metrics (see shop/metrics.py): readable by staff, or
+# by a scraper sending "Authorization: Bearer $METRICS_TOKEN".
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+METRICS_DIR = BASE_DIR / 'var' / 'metrics'
+SLOW_QUERY_MS = 250
+SLOW_QUERY_LOG = BASE_DIR / 'var' / 'log' / 'slow_queries.log'
+
+# Sitemaps (/sitemap.xml) and the product feed (/feeds/products.csv|xml) are
+# pre-built files, refreshed chunk by chunk (see shop/feeds.py and the
+# build_feeds command). SITE_URL makes their links absolute.
+SITE_URL = os.environ.get("SITE_URL", "")
+FEEDS_DIR = BASE_DIR / 'var' / 'feeds'
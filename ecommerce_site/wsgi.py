@@ -4,3 +4,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_site.settings')
 
 application = get_wsgi_application()
+
+# Start building this worker's in-memory catalog snapshot (shop/catalog.py)
+from shop import catalog  # noqa: E402
+
+catalog.warm()
@@ -0,0 +1,114 @@
+"""
+Saved addresses, one row per distinct address.
+
+Every address carries a ``content_hash`` of its normalized fields (case,
+spacing and punctuation folded; phone and pincode reduced to digits), unique
+per user, so checkout reuses the row it already has instead of inserting a
+copy per order. A partial unique index allows a single ``is_default`` row per
+user, which makes the checkout prefill an index lookup.
+
+Rows from before the hash existed have an empty ``content_hash`` (exempt from
+the unique constraint); ``dedupe_addresses`` hashes them in batches, folding
+duplicates into one row and repointing their orders.
+"""
+import hashlib
+import re
+
+from django.db import transaction
+
+from .models import Address, ArchivedOrder, Order
+
+FIELDS = ('full_name', 'phone', 'email', 'pincode', 'address_line', 'flat_house_no', 'landmark')
+DIGIT_FIELDS = ('phone', 'pincode')
+
+_PUNCTUATION_RE = re.compile(r'[^\w]+')
+
+
+def _normalize(field, value):
+    value = str(value or '')
+    if field in DIGIT_FIELDS:
+        digits = ''.join(ch for ch in value if ch.isdigit())
+        return digits[-10:] if field == 'phone' else digits  # drop +91 / leading 0
+    return ' '.join(_PUNCTUATION_RE.sub(' ', value.casefold()).split())
+
+
+def content_hash(values):
+    """Hash of an address's normalized fields; ``values`` is an Address or a dict of its fields."""
+    if isinstance(values, Address):
+        values = {field: getattr(values, field) for field in FIELDS}
+    key = '\x1f'.join(_normalize(field, values.get(field)) for field in FIELDS)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def save_default(user, values):
+    """
+    The user's address matching ``values`` (created if new), made their
+    default. Call inside a transaction.
+    """
+    address, _ = Address.objects.get_or_create(
+        user=user, content_hash=content_hash(values),
+        defaults={field: values.get(field, '') for field in FIELDS},
+    )
+    if not address.is_default:
+        # Clear the old default first: at most one per user (address_one_default_per_user)
+        Address.objects.filter(user=user, is_default=True).update(is_default=False)
+        Address.objects.filter(pk=address.pk).update(is_default=True)
+        address.is_default = True
+    return address
+
+
+# ---------------- DEDUPLICATION ----------------
+def _keeper(rows):
+    # The default wins, then a row that is already hashed, then the newest
+    return max(rows, key=lambda row: (row.is_default, bool(row.content_hash), row.pk))
+
+
+def dedupe_batch(batch_size=200):
+    """
+    Hash the addresses of up to ``batch_size`` users that still have unhashed
+    ones, collapsing duplicates. Returns ``(users, removed)``; ``(0, 0)``
+    once there is nothing left.
+    """
+    with transaction.atomic():
+        user_ids = list(
+            Address.objects.filter(content_hash='').order_by('user_id')
+            .values_list('user_id', flat=True).distinct()[:batch_size]
+        )
+        if not user_ids:
+            return 0, 0
+        groups = {}
+        for row in Address.objects.filter(user_id__in=user_ids).only('id', 'user_id', 'is_default', 'content_hash', *FIELDS):
+            groups.setdefault((row.user_id, content_hash(row)), []).append(row)
+
+        hashed, duplicates = [], []
+        for (_, digest), rows in groups.items():
+            keeper = _keeper(rows)
+            others = [row.pk for row in rows if row is not keeper]
+            if others:
+                Order.objects.filter(address_id__in=others).update(address_id=keeper.pk)
+                ArchivedOrder.objects.filter(address_id__in=others).update(address_id=keeper.pk)
+                duplicates.extend(others)
+            if keeper.content_hash != digest:
+                keeper.content_hash = digest
+                hashed.append(keeper)
+        Address.objects.filter(pk__in=duplicates).delete()
+        Address.objects.bulk_update(hashed, ['content_hash'], batch_size=500)
+    return len(user_ids), len(duplicates)
+
+
+def dedupe(batch_size=200, max_batches=None):
+    users = removed = batches = 0
+    while max_batches is None or batches < max_batches:
+        batch_users, batch_removed = dedupe_batch(batch_size)
+        if not batch_users:
+            break
+        users += batch_users
+        removed += batch_removed
+        batches += 1
+    return users, removed
+
+
+def pending_counts():
+    """``(users, addresses)`` still waiting to be hashed."""
+    pending = Address.objects.filter(content_hash='')
+    return pending.values('user_id').distinct().count(), pending.count()
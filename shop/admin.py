@@ -1,8 +1,17 @@
+import os
+
 from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html, format_html_join
 from .models import (
     Category, Product, Address, Order, OrderItem, CartItem,
-    UserProfile, Wishlist, Review, ProductImage, ProductVariant, VariantType
+    UserProfile, Wishlist, Review, ProductImage, ProductVariant, VariantType,
+    Coupon, CouponRedemption, Job, ArchivedOrder, ArchivedOrderItem, RequestProfile,
 )
+from . import profiling
 
 # Category Admin
 @admin.register(Category)
@@ -33,9 +42,102 @@ class ProductAdmin(admin.ModelAdmin):
     inlines = [ProductImageInline, ProductVariantInline]
 
 
+# Coupon Admin
+@admin.register(Coupon)
+class CouponAdmin(admin.ModelAdmin):
+    list_display = ('code', 'discount_type', 'value', 'used_count', 'usage_limit', 'starts_at', 'ends_at', 'auto_apply', 'is_active')
+    list_filter = ('discount_type', 'auto_apply', 'is_active')
+    search_fields = ('code', 'description')
+    filter_horizontal = ('categories',)
+    raw_id_fields = ('variants',)
+    readonly_fields = ('used_count',)
+
+
+@admin.register(CouponRedemption)
+class CouponRedemptionAdmin(admin.ModelAdmin):
+    list_display = ('coupon', 'user', 'order', 'archived_order', 'amount', 'created_at')
+    list_select_related = ('coupon', 'user', 'order', 'archived_order')
+    raw_id_fields = ('order', 'archived_order')
+    search_fields = ('coupon__code', 'user__username')
+
+
+# Job Admin
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'idempotency_key')
+    readonly_fields = ('locked_by', 'locked_at', 'last_error', 'created_at', 'finished_at')
+    actions = ['retry_jobs']
+
+    @admin.action(description="Retry selected jobs now")
+    def retry_jobs(self, request, queryset):
+        updated = queryset.exclude(status='running').update(status='queued', run_at=timezone.now(), attempts=0)
+        self.message_user(request, f"{updated} job(s) queued.")
+
+
+# Request Profile Admin
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('path', 'method', 'status_code', 'duration_ms', 'query_count', 'sql_ms', 'trigger', 'user', 'created_at')
+    list_filter = ('trigger', 'method', 'status_code')
+    search_fields = ('path',)
+    list_select_related = ('user',)
+    date_hierarchy = 'created_at'
+    fields = ('method', 'path', 'status_code', 'user', 'trigger', 'created_at', 'duration_ms', 'query_count',
+              'sql_ms', 'samples', 'downloads', 'top_functions', 'queries')
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/<str:kind>/', self.admin_site.admin_view(self.download),
+                 name='shop_requestprofile_download'),
+        ] + super().get_urls()
+
+    def download(self, request, pk, kind):
+        if kind not in ('pstats', 'folded'):
+            raise Http404
+        record = get_object_or_404(RequestProfile, pk=pk)
+        filename = profiling.file_path(record, kind)
+        if not os.path.exists(filename):
+            raise Http404
+        return FileResponse(open(filename, 'rb'), as_attachment=True, filename=f"profile-{pk}.{kind}")
+
+    @admin.display(description="Files")
+    def downloads(self, obj):
+        return format_html(
+            '<a href="{}">cProfile stats (.pstats)</a> &middot; <a href="{}">collapsed stacks (.folded)</a>',
+            reverse('admin:shop_requestprofile_download', args=[obj.pk, 'pstats']),
+            reverse('admin:shop_requestprofile_download', args=[obj.pk, 'folded']),
+        )
+
+    @admin.display(description="Top functions (cumulative)")
+    def top_functions(self, obj):
+        return format_html('<pre style="font-size:11px;overflow:auto">{}</pre>', profiling.stats_text(obj) or "No stats file.")
+
+    @admin.display(description="SQL timeline")
+    def queries(self, obj):
+        rows = format_html_join(
+            '', '<tr><td>{}</td><td>{}</td><td>{}</td><td><code>{}</code></td></tr>',
+            ((q['start_ms'], q['duration_ms'], q['alias'], q['sql']) for q in obj.sql_timeline),
+        )
+        return format_html(
+            '<table><thead><tr><th>Start ms</th><th>ms</th><th>DB</th><th>SQL</th></tr></thead><tbody>{}</tbody></table>',
+            rows,
+        )
+
+
 admin.site.register(Address)
 admin.site.register(Order)
 admin.site.register(OrderItem)
+admin.site.register(ArchivedOrder)
+admin.site.register(ArchivedOrderItem)
 admin.site.register(CartItem)
 admin.site.register(UserProfile)
 admin.site.register(Wishlist)
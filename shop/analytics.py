@@ -0,0 +1,139 @@
+"""
+Store-wide sales analytics for staff, computed from the daily rollups.
+
+Each chart reads one rollup table for the selected period as flat columns
+and does the grouping, moving averages and ranking with NumPy, so a report
+over several years is a few thousand rows and a handful of array operations
+rather than a scan of every order.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from .models import Category, DailyCategorySales, DailyProductSales, DailyStatusSales, Product
+
+CHART_WIDTH = 600
+CHART_HEIGHT = 160
+
+
+def _columns(queryset, *fields):
+    rows = list(queryset.values_list(*fields))
+    if not rows:
+        return [np.zeros(0) for _ in fields]
+    return [np.asarray(column) for column in zip(*rows)]
+
+
+def _day_index(days, start):
+    return np.fromiter(((day - start).days for day in days), dtype=np.int64, count=len(days))
+
+
+def moving_average(series, window):
+    """Trailing mean over ``window`` days (shorter at the start of the series)."""
+    cumsum = np.cumsum(np.insert(series, 0, 0.0))
+    counts = np.minimum(np.arange(1, len(series) + 1), window)
+    return (cumsum[1:] - cumsum[np.maximum(np.arange(1, len(series) + 1) - window, 0)]) / counts
+
+
+def _polyline(series, peak):
+    """SVG polyline points for ``series`` scaled to the chart box."""
+    if len(series) < 2 or peak <= 0:
+        return ''
+    x = np.linspace(0, CHART_WIDTH, len(series))
+    y = CHART_HEIGHT - series / peak * CHART_HEIGHT
+    return ' '.join(f"{a:.1f},{b:.1f}" for a, b in zip(x, y))
+
+
+def _ranked(keys, units, revenue, top):
+    """Sum ``units``/``revenue`` per key and return the ``top`` keys by revenue."""
+    if not len(keys):
+        return []
+    # None (deleted product/category) becomes its own group
+    keys = np.array([-1 if k is None else k for k in keys], dtype=np.int64)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    unit_totals = np.bincount(inverse, weights=units.astype(float))
+    revenue_totals = np.bincount(inverse, weights=revenue.astype(float))
+    order = np.argsort(revenue_totals)[::-1][:top]
+    peak = revenue_totals[order[0]] or 1
+    return [
+        {
+            'id': int(unique[i]),
+            'units': int(unit_totals[i]),
+            'revenue': round(float(revenue_totals[i]), 2),
+            'percent': round(float(revenue_totals[i] / peak * 100)),
+        }
+        for i in order
+    ]
+
+
+def sales_report(days=90, top=10):
+    end = timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    in_range = {'day__gte': start, 'day__lte': end}
+
+    # ---------------- DAILY REVENUE ----------------
+    day, status, orders, revenue = _columns(
+        DailyStatusSales.objects.filter(**in_range), 'day', 'status', 'orders', 'revenue',
+    )
+    counted = status != 'cancelled'
+    index = _day_index(day[counted], start)
+    daily_revenue = np.bincount(index, weights=revenue[counted].astype(float), minlength=days)
+    daily_orders = np.bincount(index, weights=orders[counted].astype(float), minlength=days)
+    ma7 = moving_average(daily_revenue, 7)
+    ma30 = moving_average(daily_revenue, 30)
+    peak = float(daily_revenue.max()) if days else 0
+
+    total_revenue = float(daily_revenue.sum())
+    total_orders = int(daily_orders.sum())
+
+    # Previous period of the same length, for the growth figure
+    previous = DailyStatusSales.objects.filter(
+        day__gte=start - timedelta(days=days), day__lt=start,
+    ).exclude(status='cancelled')
+    _, previous_revenue = _columns(previous, 'day', 'revenue')
+    previous_total = float(previous_revenue.astype(float).sum())
+
+    status_breakdown = []
+    if len(status):
+        labels, inverse = np.unique(status, return_inverse=True)
+        status_orders = np.bincount(inverse, weights=orders.astype(float))
+        status_breakdown = [(str(label), int(n)) for label, n in zip(labels, status_orders)]
+
+    # ---------------- TOP SELLERS ----------------
+    product_ids, units, revenue = _columns(
+        DailyProductSales.objects.filter(**in_range), 'product_id', 'units', 'revenue',
+    )
+    top_products = _ranked(product_ids, units, revenue, top)
+    names = dict(Product.objects.filter(id__in=[p['id'] for p in top_products]).values_list('id', 'name'))
+    for row in top_products:
+        row['name'] = names.get(row['id'], 'Deleted product')
+
+    category_ids, units, revenue = _columns(
+        DailyCategorySales.objects.filter(**in_range), 'category_id', 'units', 'revenue',
+    )
+    top_categories = _ranked(category_ids, units, revenue, top)
+    names = dict(Category.objects.filter(id__in=[c['id'] for c in top_categories]).values_list('id', 'name'))
+    for row in top_categories:
+        row['name'] = names.get(row['id'], 'Uncategorised')
+
+    return {
+        'start': start,
+        'end': end,
+        'days': days,
+        'total_revenue': round(total_revenue, 2),
+        'total_orders': total_orders,
+        'avg_order_value': round(total_revenue / total_orders, 2) if total_orders else 0,
+        'growth': round((total_revenue - previous_total) / previous_total * 100, 1) if previous_total else None,
+        'best_day': start + timedelta(days=int(daily_revenue.argmax())) if total_revenue else None,
+        'peak_revenue': round(peak, 2),
+        'chart': {
+            'width': CHART_WIDTH,
+            'height': CHART_HEIGHT,
+            'revenue': _polyline(daily_revenue, peak),
+            'ma7': _polyline(ma7, peak),
+            'ma30': _polyline(ma30, peak),
+        },
+        'status_breakdown': status_breakdown,
+        'top_products': top_products,
+        'top_categories': top_categories,
+    }
@@ -7,6 +7,7 @@ class ShopConfig(AppConfig):
     name = "shop"
 
     def ready(self):
+        from . import signals, tasks  # noqa: F401  (connects receivers, registers jobs)
         from django.contrib.auth import get_user_model
         from django.db.utils import OperationalError, ProgrammingError
 
@@ -0,0 +1,111 @@
+"""
+Order archival.
+
+Delivered and cancelled orders older than ``ORDER_ARCHIVE_AFTER_DAYS`` are
+copied into ``ArchivedOrder``/``ArchivedOrderItem`` (their coupon redemptions
+repointed to the archived order) and deleted from the hot tables, one batch per transaction, so an interrupted run simply continues
+where it stopped. Orders the sales rollups have not counted yet are left
+alone until they have been.
+
+``order_history`` pages through a user's hot orders first and only queries
+the archive once a page reaches back past the archive horizon.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Prefetch, Q, Sum
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, CouponRedemption, Order, OrderItem
+from .reviews import decode_cursor, encode_cursor
+
+FINAL_STATUSES = ('delivered', 'cancelled')
+HISTORY_PAGE_SIZE = 12
+
+
+def archive_after():
+    return timedelta(days=getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 180))
+
+
+def archivable(cutoff=None):
+    cutoff = cutoff or timezone.now() - archive_after()
+    return Order.objects.filter(
+        status__in=FINAL_STATUSES, created_at__lt=cutoff, rollup_status=F('status'),
+    )
+
+
+def archive_batch(cutoff=None, batch_size=500):
+    """Move one batch of archivable orders. Returns how many were moved."""
+    with transaction.atomic():
+        orders = list(archivable(cutoff).order_by('pk')[:batch_size])
+        if not orders:
+            return 0
+        ids = [order.pk for order in orders]
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(
+                id=o.pk, user_id=o.user_id, address_id=o.address_id, order_id=o.order_id,
+                total_amount=o.total_amount, status=o.status, created_at=o.created_at,
+            )
+            for o in orders
+        ])
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(id=i.pk, order_id=i.order_id, product_id=i.product_id, quantity=i.quantity, price=i.price)
+            for i in OrderItem.objects.filter(order_id__in=ids)
+        ])
+        # Archived ids equal the order ids; move the coupon link before the delete nulls it
+        CouponRedemption.objects.filter(order_id__in=ids).update(archived_order_id=F('order_id'))
+        OrderItem.objects.filter(order_id__in=ids).delete()
+        Order.objects.filter(pk__in=ids).delete()
+    return len(orders)
+
+
+def archive_orders(cutoff=None, batch_size=500, max_batches=None):
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = archive_batch(cutoff, batch_size)
+        if not count:
+            break
+        moved += count
+        batches += 1
+    return moved
+
+
+# ---------------- ORDER HISTORY ----------------
+def _page(queryset, item_model, position, size):
+    items = Prefetch('items', queryset=item_model.objects.select_related('product').only(
+        'id', 'order', 'quantity', 'price', 'product__name',
+    ))
+    queryset = queryset.prefetch_related(items).order_by('-created_at', '-id')
+    if position:
+        created_at, order_id = position
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id))
+    return list(queryset[:size + 1])
+
+
+def order_history(user, cursor=None, size=HISTORY_PAGE_SIZE):
+    """
+    Return ``(orders, next_cursor)`` for ``user``, newest first, mixing hot
+    and archived orders. Archived orders are all older than the archive
+    horizon, so the archive is only queried once the page reaches that far
+    back (or the hot orders run out).
+    """
+    position = decode_cursor(cursor) if cursor else None
+    orders = _page(Order.objects.filter(user=user), OrderItem, position, size)
+
+    horizon = timezone.now() - archive_after()
+    if len(orders) <= size or orders[size - 1].created_at < horizon:
+        orders += _page(ArchivedOrder.objects.filter(user=user), ArchivedOrderItem, position, size)
+        orders.sort(key=lambda o: (o.created_at, o.id), reverse=True)
+
+    next_cursor = encode_cursor(orders[size - 1]) if len(orders) > size else None
+    return orders[:size], next_cursor
+
+
+def order_totals(queryset):
+    """Spent/order/delivered totals of an Order or ArchivedOrder queryset in one query."""
+    return queryset.aggregate(
+        spent=Sum('total_amount'),
+        orders=Count('id'),
+        delivered=Count('id', filter=Q(status='delivered')),
+    )
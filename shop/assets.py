@@ -0,0 +1,455 @@
+"""
+Front-end asset pipeline.
+
+Builds the self-hosted CSS/JS bundles served from ``static/dist/`` out of the
+vendored Bootstrap sources in ``assets/vendor/`` and ``css/custom_style.css``:
+
+* unused Bootstrap and Bootstrap Icons rules are dropped by matching
+  selectors against the class names that appear in our templates,
+* the icon font is subset to the glyphs we actually use (needs fontTools),
+* everything is minified and concatenated into ``neomart.css`` / ``neomart.js``,
+* the rules needed to paint the header and the home page hero are extracted
+  to ``critical.css`` (a few KB), which ``base.html`` inlines: only resting
+  states of the elements and classes used there, with the custom properties
+  those rules reference. Everything else arrives with the full bundle.
+
+Content hashing and gzip/Brotli precompression are left to WhiteNoise's
+``CompressedManifestStaticFilesStorage`` at ``collectstatic`` time.
+"""
+import re
+import shutil
+from pathlib import Path
+
+from django.conf import settings
+
+VENDOR_DIR = settings.BASE_DIR / 'assets' / 'vendor'
+DIST_DIR = settings.BASE_DIR / 'static' / 'dist'
+CUSTOM_CSS = settings.BASE_DIR / 'shop' / 'static' / 'css' / 'custom_style.css'
+SCRIPT_DIR = settings.BASE_DIR / 'shop' / 'static' / 'js'
+TEMPLATE_DIRS = [settings.BASE_DIR / 'templates', settings.BASE_DIR / 'shop' / 'templates']
+
+BOOTSTRAP_CSS = VENDOR_DIR / 'bootstrap' / 'bootstrap.min.css'
+ICONS_CSS = VENDOR_DIR / 'bootstrap-icons' / 'bootstrap-icons.min.css'
+ICONS_FONT = VENDOR_DIR / 'bootstrap-icons' / 'fonts' / 'bootstrap-icons.woff2'
+JS_SOURCES = [VENDOR_DIR / 'bootstrap' / 'popper.min.js', VENDOR_DIR / 'bootstrap' / 'bootstrap.min.js']
+
+# At-rules whose blocks contain further rules that can be filtered.
+NESTED_AT_RULES = ('@media', '@supports', '@container', '@layer')
+
+TOKEN_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_-]*')
+# "text-bg-{{ message.tags }}" -> every class starting with "text-bg-" is kept.
+DYNAMIC_PREFIX_RE = re.compile(r'([A-Za-z0-9_-]+-)\{[{%]')
+JS_STRING_RE = re.compile(r'["\']([a-z][a-z0-9-]*)["\']')
+CLASS_RE = re.compile(r'\.(-?[_a-zA-Z][_a-zA-Z0-9-]*)')
+LICENSE_RE = re.compile(r'/\*!.*?\*/', re.S)
+SOURCE_MAP_RE = re.compile(r'/[/*]# sourceMappingURL=[^\n*]*(\*/)?')
+ICON_GLYPH_RE = re.compile(r'\.bi-([a-z0-9-]+)::?before\{content:"\\([0-9a-f]+)"\}')
+
+# Markup painted first: base.html's <header>, plus regions of other templates
+# between these comments (the home page hero).
+CRITICAL_START, CRITICAL_END = '{# critical-css #}', '{# /critical-css #}'
+# Icons need the font (declared by the full bundle). Panels hidden until
+# opened only get the declarations that keep them hidden, and what's inside
+# them nothing.
+CRITICAL_SKIP = ('bi', 'dropdown-item', 'dropdown-divider', 'dropdown-header', 'offcanvas-', 'suggestion-',
+                 'live-suggestion', 'mini-cart-')
+CRITICAL_HIDDEN = ('dropdown-menu', 'offcanvas', 'search-suggestions')
+HIDING_PROPERTIES = ('display', 'visibility', 'position', 'opacity', 'pointer-events')
+MOTION_PROPERTIES = ('transition', 'animation')  # nothing moves before the bundle arrives
+# States and parts nobody sees at first paint
+UNPAINTED_RE = re.compile(
+    r':(?:hover|focus|focus-visible|focus-within|active|disabled|checked|invalid|valid|indeterminate|autofill)\b'
+    r'|::?-(?:webkit|moz|ms)-|::placeholder|::selection|::file-selector-button|:-ms-'
+)
+CLASS_ATTR_RE = re.compile(r'class="([^"]*)"')
+TAG_RE = re.compile(r'<([a-z][a-z0-9]*)')
+ELEMENT_RE = re.compile(r'(?:^|[\s>+~(])([a-z][a-z0-9]*)')
+VAR_RE = re.compile(r'var\((--[\w-]+)')
+
+
+# ---------------- CSS PARSING ----------------
+def _skip_string(css, i):
+    quote = css[i]
+    i += 1
+    while i < len(css) and css[i] != quote:
+        i += 2 if css[i] == '\\' else 1
+    return i + 1
+
+
+def _find(css, i, stops):
+    """Index of the next character in ``stops`` outside strings and comments."""
+    while i < len(css):
+        ch = css[i]
+        if ch in '"\'':
+            i = _skip_string(css, i)
+        elif css.startswith('/*', i):
+            end = css.find('*/', i + 2)
+            i = len(css) if end == -1 else end + 2
+        elif ch in stops:
+            return i
+        else:
+            i += 1
+    return len(css)
+
+
+def _block_end(css, start):
+    """Index just past the ``}`` matching the ``{`` at ``start``."""
+    depth, i = 0, start
+    while i < len(css):
+        i = _find(css, i, '{}')
+        if i >= len(css):
+            break
+        depth += 1 if css[i] == '{' else -1
+        i += 1
+        if depth == 0:
+            return i
+    return len(css)
+
+
+def parse_css(css):
+    """
+    Split a stylesheet into nodes:
+    ``('rule', selector, body)``, ``('nested', prelude, [nodes])``,
+    ``('block', prelude, body)`` and ``('statement', text)``.
+    """
+    css = strip_comments(css)
+    nodes, i = [], 0
+    while i < len(css):
+        stop = _find(css, i, '{;}')
+        head = css[i:stop].strip()
+        if stop >= len(css):
+            break
+        if css[stop] == ';':
+            if head:
+                nodes.append(('statement', head))
+            i = stop + 1
+            continue
+        if css[stop] == '}':
+            i = stop + 1
+            continue
+        end = _block_end(css, stop)
+        body = css[stop + 1:end - 1]
+        if head.startswith(NESTED_AT_RULES):
+            nodes.append(('nested', head, parse_css(body)))
+        elif head.startswith('@'):
+            nodes.append(('block', head, body.strip()))
+        else:
+            nodes.append(('rule', head, body.strip()))
+        i = end
+    return nodes
+
+
+def _split_strings(css):
+    """Yield ``(is_string, chunk)`` pieces so rewrites can leave strings alone."""
+    i = start = 0
+    while i < len(css):
+        if css[i] in '"\'':
+            if start < i:
+                yield False, css[start:i]
+            end = _skip_string(css, i)
+            yield True, css[i:end]
+            i = start = end
+        else:
+            i += 1
+    if start < len(css):
+        yield False, css[start:]
+
+
+def strip_comments(css):
+    out, in_comment = [], False
+    for is_string, chunk in _split_strings(css):
+        if is_string:
+            if not in_comment:
+                out.append(chunk)
+            continue
+        while chunk:
+            if in_comment:
+                end = chunk.find('*/')
+                if end == -1:
+                    chunk = ''
+                else:
+                    chunk, in_comment = chunk[end + 2:], False
+            else:
+                start = chunk.find('/*')
+                if start == -1:
+                    out.append(chunk)
+                    chunk = ''
+                else:
+                    out.append(chunk[:start])
+                    chunk, in_comment = chunk[start + 2:], True
+    return ''.join(out)
+
+
+def _rewrite(css, pattern, repl):
+    return ''.join(
+        chunk if is_string else re.sub(pattern, repl, chunk)
+        for is_string, chunk in _split_strings(css)
+    )
+
+
+def _minify_body(body):
+    body = _rewrite(body, r'\s+', ' ')
+    body = _rewrite(body, r'\s*([:;,{}])\s*', r'\1')
+    return body.strip().rstrip(';')
+
+
+def _minify_selector(selector):
+    selector = _rewrite(selector, r'\s+', ' ')
+    return _rewrite(selector, r'\s*([,>~{}])\s*', r'\1').strip()
+
+
+def serialize_css(nodes):
+    out = []
+    for node in nodes:
+        kind = node[0]
+        if kind == 'statement':
+            out.append(_minify_selector(node[1]) + ';')
+        elif kind == 'nested':
+            inner = serialize_css(node[2])
+            if inner:
+                out.append(f"{_minify_selector(node[1])}{{{inner}}}")
+        elif kind == 'block':
+            out.append(f"{_minify_selector(node[1])}{{{_minify_body(node[2])}}}")
+        else:
+            out.append(f"{_minify_selector(node[1])}{{{_minify_body(node[2])}}}")
+    return ''.join(out)
+
+
+def _split_selectors(selector):
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(selector):
+        if ch in '([':
+            depth += 1
+        elif ch in ')]':
+            depth -= 1
+        elif ch == ',' and depth == 0:
+            parts.append(selector[start:i])
+            start = i + 1
+    parts.append(selector[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def purge(nodes, is_used, keep_blocks=True):
+    """
+    Drop selectors whose classes are not all used. ``is_used`` is called with a
+    class name. ``@font-face``/``@keyframes`` blocks are kept when
+    ``keep_blocks`` is true.
+    """
+    kept = []
+    for node in nodes:
+        kind = node[0]
+        if kind == 'rule':
+            selectors = [
+                s for s in _split_selectors(node[1])
+                # Strip :not(...) so that ".btn:not(.foo)" only needs "btn".
+                if all(is_used(c) for c in CLASS_RE.findall(re.sub(r':not\([^)]*\)|\[[^\]]*\]', '', s)))
+            ]
+            if selectors:
+                kept.append(('rule', ','.join(selectors), node[2]))
+        elif kind == 'nested':
+            children = purge(node[2], is_used, keep_blocks)
+            if children:
+                kept.append(('nested', node[1], children))
+        elif kind == 'block':
+            if keep_blocks:
+                kept.append(node)
+        elif kind == 'statement' and keep_blocks:
+            kept.append(node)
+    return kept
+
+
+# ---------------- USAGE SCAN ----------------
+def collect_used_classes():
+    """
+    Every identifier-like token in our templates and scripts counts as a used
+    class, plus the class names Bootstrap's JavaScript toggles at runtime.
+    """
+    tokens, prefixes = set(), set()
+    for directory in TEMPLATE_DIRS:
+        for path in directory.rglob('*.html'):
+            text = path.read_text(encoding='utf-8')
+            tokens.update(TOKEN_RE.findall(text))
+            prefixes.update(DYNAMIC_PREFIX_RE.findall(text))
+    for path in JS_SOURCES:
+        tokens.update(JS_STRING_RE.findall(path.read_text(encoding='utf-8')))
+    # Our own scripts build markup too
+    for path in SCRIPT_DIR.rglob('*.js'):
+        tokens.update(TOKEN_RE.findall(path.read_text(encoding='utf-8')))
+    return tokens, tuple(prefixes)
+
+
+def _critical_markup():
+    base = (settings.BASE_DIR / 'templates' / 'shop' / 'base.html').read_text(encoding='utf-8')
+    start, end = base.find('<header'), base.find('</header>')
+    markup = [base[:end]] if start != -1 else []  # <body> and <header>
+    for directory in TEMPLATE_DIRS:
+        for path in directory.rglob('*.html'):
+            text = path.read_text(encoding='utf-8')
+            markup += re.findall(re.escape(CRITICAL_START) + '(.*?)' + re.escape(CRITICAL_END), text, re.S)
+    markup = ''.join(markup)
+    # Holes (see shop/shells.py) are part of the first paint too
+    for name in re.findall(r'{% hole "(\w+)" %}', markup):
+        markup += (settings.BASE_DIR / 'templates' / 'shop' / 'fragments' / f'{name}.html').read_text(encoding='utf-8')
+    return markup
+
+
+def _critical_tokens():
+    """Class and element names in the first-paint markup."""
+    markup = _critical_markup()
+    tokens = set(TAG_RE.findall(markup)) | {'app-main', 'container-fluid', 'html', 'body'}
+    for value in CLASS_ATTR_RE.findall(markup):
+        tokens.update(TOKEN_RE.findall(value))
+    return tokens | set(CRITICAL_HIDDEN)  # on every page (the mini cart is outside the header)
+
+
+def _declarations(body):
+    out, i = [], 0
+    while i < len(body):
+        stop = _find(body, i, ';')
+        if body[i:stop].strip():
+            out.append(body[i:stop].strip())
+        i = stop + 1
+    return out
+
+
+def _walk_rules(nodes):
+    for node in nodes:
+        if node[0] == 'rule':
+            yield node
+        elif node[0] == 'nested':
+            yield from _walk_rules(node[2])
+
+
+def _map_rules(nodes, fn):
+    out = []
+    for node in nodes:
+        if node[0] == 'nested':
+            children = _map_rules(node[2], fn)
+            if children:
+                out.append(('nested', node[1], children))
+        elif node[0] == 'rule':
+            out.extend(fn(node))
+    return out
+
+
+def critical_css(nodes, tokens):
+    """
+    The first-paint subset of ``nodes`` for markup using ``tokens``: selectors
+    whose classes and element names all appear there (bar ``CRITICAL_SKIP``),
+    in their resting state, and the hiding declarations of ``CRITICAL_HIDDEN``
+    panels; then custom properties pruned to the ones used.
+    """
+    def is_critical(cls):
+        return cls in tokens and not cls.startswith(CRITICAL_SKIP)
+
+    hidden = {f'.{cls}' for cls in CRITICAL_HIDDEN}
+
+    def at_rest(rule):
+        selectors, panels = [], []
+        for sel in _split_selectors(rule[1]):
+            if sel in hidden:
+                panels.append(sel)
+            elif (not UNPAINTED_RE.search(sel) and not hidden & {f'.{cls}' for cls in CLASS_RE.findall(sel)}
+                  and all(name in tokens for name in ELEMENT_RE.findall(re.sub(r'\[[^\]]*\]|\\.', '', sel)))):
+                selectors.append(sel)
+        out = [('rule', ','.join(selectors), rule[2])] if selectors else []
+        hiding = [d for d in _declarations(rule[2]) if d.split(':', 1)[0].strip() in HIDING_PROPERTIES]
+        if panels and hiding:
+            out.append(('rule', ','.join(panels), ';'.join(hiding)))
+        return out
+
+    nodes = _map_rules(purge(nodes, is_critical, keep_blocks=False), at_rest)
+
+    # Keep the custom properties the kept rules reference, following var() chains
+    defined = {}
+    for rule in _walk_rules(nodes):
+        for decl in _declarations(rule[2]):
+            if decl.startswith('--'):
+                defined.setdefault(decl.split(':', 1)[0].strip(), []).append(decl)
+    wanted = set()
+    pending = [
+        ref for rule in _walk_rules(nodes) for decl in _declarations(rule[2])
+        if not decl.startswith(('--', *MOTION_PROPERTIES)) for ref in VAR_RE.findall(decl)
+    ]
+    while pending:
+        name = pending.pop()
+        if name not in wanted:
+            wanted.add(name)
+            pending += [ref for decl in defined.get(name, ()) for ref in VAR_RE.findall(decl)]
+
+    def used_properties(rule):
+        decls = [
+            d for d in _declarations(rule[2])
+            if (d.split(':', 1)[0].strip() in wanted if d.startswith('--') else not d.startswith(MOTION_PROPERTIES))
+        ]
+        return [('rule', rule[1], ';'.join(decls))] if decls else []
+
+    return _map_rules(nodes, used_properties)
+
+
+def _icon_codepoints(icon_nodes, is_used):
+    codepoints = []
+    for node in icon_nodes:
+        if node[0] != 'rule':
+            continue
+        match = ICON_GLYPH_RE.match(f"{node[1]}{{{node[2]}}}")
+        if match and is_used(f"bi-{match.group(1)}"):
+            codepoints.append(int(match.group(2), 16))
+    return codepoints
+
+
+def subset_icon_font(codepoints, target):
+    """Subset the icon font to ``codepoints``; copies the full font without fontTools."""
+    try:
+        from fontTools import subset
+    except ImportError:
+        shutil.copyfile(ICONS_FONT, target)
+        return False
+    options = subset.Options()
+    options.flavor = 'woff2'
+    options.layout_features = []
+    font = subset.load_font(str(ICONS_FONT), options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+    subset.save_font(font, str(target), options)
+    return True
+
+
+# ---------------- BUILD ----------------
+def build(dist_dir=DIST_DIR):
+    """Write the bundles to ``dist_dir`` and return ``{filename: size}``."""
+    dist_dir = Path(dist_dir)
+    (dist_dir / 'fonts').mkdir(parents=True, exist_ok=True)
+
+    tokens, prefixes = collect_used_classes()
+
+    def is_used(cls):
+        return cls in tokens or cls.startswith(prefixes)
+
+    bootstrap = purge(parse_css(BOOTSTRAP_CSS.read_text(encoding='utf-8')), is_used)
+    icons_all = parse_css(ICONS_CSS.read_text(encoding='utf-8'))
+    icons = purge([n for n in icons_all if n[0] != 'block'], is_used)
+    icons.insert(0, ('block', '@font-face', (
+        'font-display:block;font-family:bootstrap-icons;'
+        'src:url("fonts/bootstrap-icons.woff2") format("woff2")'
+    )))
+    custom = parse_css(CUSTOM_CSS.read_text(encoding='utf-8'))
+
+    banner = ''.join(LICENSE_RE.findall(BOOTSTRAP_CSS.read_text(encoding='utf-8'))[:1]
+                     + LICENSE_RE.findall(ICONS_CSS.read_text(encoding='utf-8'))[:1])
+    bundle_css = banner + serialize_css(bootstrap + icons + custom)
+    (dist_dir / 'neomart.css').write_text(bundle_css, encoding='utf-8')
+
+    critical = critical_css(bootstrap + custom, _critical_tokens())
+    (dist_dir / 'critical.css').write_text(serialize_css(critical), encoding='utf-8')
+
+    js = [SOURCE_MAP_RE.sub('', path.read_text(encoding='utf-8')).strip() for path in JS_SOURCES]
+    (dist_dir / 'neomart.js').write_text(';\n'.join(js) + '\n', encoding='utf-8')
+
+    subset_icon_font(_icon_codepoints(icons_all, is_used), dist_dir / 'fonts' / 'bootstrap-icons.woff2')
+
+    return {
+        str(path.relative_to(dist_dir)): path.stat().st_size
+        for path in sorted(dist_dir.rglob('*')) if path.is_file()
+    }
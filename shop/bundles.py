@@ -0,0 +1,105 @@
+"""
+Cached product-detail bundles.
+
+Everything on the product page that is the same for every visitor (product
+fields, category, extra images, variants grouped by type and the IDs of the
+recommended products) is assembled once into plain tuples and cached under a
+per-product version. Product, ProductImage and ProductVariant signals (and the
+jobs that ``.update()`` stock or rating) bump that version; the bundle also
+expires after ``BUNDLE_MAX_AGE`` so recommendations pick up new products.
+"""
+from django.core.cache import cache
+
+from . import versions
+from .models import Category, Product, ProductImage, ProductVariant, VariantType
+
+BUNDLE_FORMAT = 1  # bump when the bundle layout below changes
+BUNDLE_MAX_AGE = 3600
+RECOMMENDED_COUNT = 4
+PRODUCT_FIELDS = tuple(f.attname for f in Product._meta.concrete_fields)
+
+SLUG_KEY = 'product-bundle:slug:{}'
+VERSION_KEY = 'product-bundle:version:{}'
+BUNDLE_KEY = 'product-bundle:{}:{}:{}'
+
+
+def invalidate(product_id):
+    versions.bump(VERSION_KEY.format(product_id))
+
+
+def build(product_id):
+    row = Product.objects.filter(pk=product_id).values_list(*PRODUCT_FIELDS).first()
+    if row is None:
+        return None
+    product = dict(zip(PRODUCT_FIELDS, row))
+    category = Category.objects.filter(pk=product['category_id']).values_list('id', 'name', 'slug').first()
+    images = list(ProductImage.objects.filter(product_id=product_id).values_list('id', 'image', 'is_primary'))
+
+    groups = {}
+    variants = (
+        ProductVariant.objects.filter(product_id=product_id)
+        .order_by('variant_type__name', 'id')
+        .values_list('variant_type_id', 'variant_type__name', 'id', 'value', 'price', 'stock')
+    )
+    for type_id, type_name, *variant in variants:
+        groups.setdefault((type_id, type_name), []).append(tuple(variant))
+
+    recommended = list(
+        Product.objects.filter(category_id=product['category_id']).exclude(pk=product_id)
+        .values_list('id', flat=True)[:RECOMMENDED_COUNT]
+    )
+    return (row, category, images, [(key, rows) for key, rows in groups.items()], recommended)
+
+
+def get(slug, retry=True):
+    """Return the hydrated bundle for ``slug`` or None if there is no such product."""
+    product_id = cache.get(SLUG_KEY.format(slug))
+    if product_id is None:
+        product_id = Product.objects.filter(slug=slug).values_list('id', flat=True).first()
+        if product_id is None:
+            return None
+        cache.set(SLUG_KEY.format(slug), product_id, BUNDLE_MAX_AGE)
+
+    # Read the version before building, so a change made while we build
+    # leaves our copy under a key nobody asks for any more.
+    key = BUNDLE_KEY.format(BUNDLE_FORMAT, product_id, versions.current(VERSION_KEY.format(product_id)))
+    bundle = cache.get(key)
+    if bundle is None:
+        bundle = build(product_id)
+        if bundle is None:
+            cache.delete(SLUG_KEY.format(slug))
+            return None
+        cache.set(key, bundle, BUNDLE_MAX_AGE)
+
+    hydrated = _hydrate(bundle)
+    if hydrated['product'].slug != slug:
+        # The product's slug changed since either key was cached
+        cache.delete(SLUG_KEY.format(slug))
+        invalidate(product_id)
+        return get(slug, retry=False) if retry else None
+    return hydrated
+
+
+def _hydrate(bundle):
+    # Unsaved instances render like queried ones without touching the database
+    row, category, images, groups, recommended = bundle
+    product = Product(**dict(zip(PRODUCT_FIELDS, row)))
+    if category:
+        product.category = Category(id=category[0], name=category[1], slug=category[2])
+    extra_images = [ProductImage(id=i, product_id=product.id, image=image, is_primary=primary)
+                    for i, image, primary in images]
+    variant_groups = []
+    for (type_id, type_name), rows in groups:
+        variant_type = VariantType(id=type_id, name=type_name)
+        variant_groups.append({
+            'grouper': variant_type,
+            'list': [ProductVariant(id=i, product_id=product.id, variant_type=variant_type,
+                                    value=value, price=price, stock=stock)
+                     for i, value, price, stock in rows],
+        })
+    return {
+        'product': product,
+        'extra_images': extra_images,
+        'variant_groups': variant_groups,
+        'recommended_ids': recommended,
+    }
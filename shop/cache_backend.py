@@ -0,0 +1,330 @@
+"""
+Two-tier cache backend: a bounded in-process LRU in front of a SQLite store
+shared by every worker on the machine.
+
+    CACHES = {'default': {
+        'BACKEND': 'shop.cache_backend.TwoTierCache',
+        'LOCATION': BASE_DIR / 'var' / 'cache',     # a directory
+        'OPTIONS': {'LOCAL_MAX_ENTRIES': 2000, 'MAX_ENTRIES': 100_000},
+    }}
+
+Reads are served from the local LRU when possible, so hot keys (versions,
+snapshots) cost a dict lookup instead of a SQLite query. To keep workers
+consistent, every key hashes to one of ``GENERATION_SLOTS`` counters in a
+small memory-mapped file; a write or delete bumps that key's counter after
+updating the shared store, and a local entry is only used while the counter
+still has the value it had when the entry was filled. Reading a counter is an
+unlocked 8-byte read from shared memory.
+
+``stats()`` returns this process's hit/miss/eviction counters.
+"""
+import mmap
+import os
+import pickle
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+GENERATION_SLOTS = 4096
+_COUNTER = struct.Struct('=Q')
+_MISSING = object()
+
+_process_state = {}
+_process_lock = threading.Lock()
+
+
+class _Generations:
+    """Per-slot change counters shared by all processes through a memory-mapped file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._pid = None
+
+    def _open(self):
+        if self._pid == os.getpid():
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            size = GENERATION_SLOTS * _COUNTER.size
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        # A lock file of our own: flock locks inherited across fork are shared
+        self._lock_file = open(self.path + '.lock', 'a')
+        self._pid = os.getpid()
+
+    def slot(self, key):
+        return zlib.crc32(key.encode()) % GENERATION_SLOTS
+
+    def read(self, slot):
+        self._open()
+        return _COUNTER.unpack_from(self._map, slot * _COUNTER.size)[0]
+
+    def bump(self, slots):
+        self._open()
+        if fcntl:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            for slot in slots:
+                offset = slot * _COUNTER.size
+                _COUNTER.pack_into(self._map, offset, _COUNTER.unpack_from(self._map, offset)[0] + 1)
+        finally:
+            if fcntl:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+
+class _SharedStore:
+    """Pickled values in one SQLite table, one connection per thread and process."""
+
+    def __init__(self, path, max_entries, cull_frequency):
+        self.path = path
+        self.max_entries = max_entries
+        self.cull_frequency = cull_frequency
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def db(self):
+        if getattr(self._local, 'pid', None) != os.getpid():
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)"
+            )
+            self._local.db, self._local.pid = db, os.getpid()
+        return self._local.db
+
+    def get(self, key, now):
+        """Return ``(pickled value, expires)`` or None."""
+        row = self.db.execute("SELECT value, expires FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] is not None and row[1] <= now:
+            self.db.execute("DELETE FROM cache_entries WHERE key = ? AND expires <= ?", (key, now))
+            return None
+        return row
+
+    def set(self, key, value, expires, only_if_missing=False, now=None):
+        db = self.db
+        if only_if_missing:
+            # Expired rows don't count as present
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute("DELETE FROM cache_entries WHERE key = ? AND expires <= ?", (key, now))
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)",
+                    (key, value, expires),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            stored = cursor.rowcount == 1
+        else:
+            db.execute("INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)",
+                       (key, value, expires))
+            stored = True
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.cull(now or time.time())
+        return stored
+
+    def update(self, key, func, now):
+        """Atomically replace the value with ``func(value)``; None if the key is missing."""
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT value FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, now),
+            ).fetchone()
+            if row is None:
+                db.execute("ROLLBACK")
+                return None
+            value = func(row[0])
+            db.execute("UPDATE cache_entries SET value = ? WHERE key = ?", (value, key))
+            db.execute("COMMIT")
+            return value
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def touch(self, key, expires, now):
+        cursor = self.db.execute(
+            "UPDATE cache_entries SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (expires, key, now),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key):
+        return self.db.execute("DELETE FROM cache_entries WHERE key = ?", (key,)).rowcount == 1
+
+    def clear(self):
+        self.db.execute("DELETE FROM cache_entries")
+
+    def cull(self, now):
+        db = self.db
+        db.execute("DELETE FROM cache_entries WHERE expires <= ?", (now,))
+        count = db.execute("SELECT count(*) FROM cache_entries").fetchone()[0]
+        if count > self.max_entries:
+            db.execute(
+                "DELETE FROM cache_entries WHERE rowid IN "
+                "(SELECT rowid FROM cache_entries ORDER BY rowid LIMIT ?)",
+                (count // self.cull_frequency,),
+            )
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        location = os.fspath(location)
+        os.makedirs(location, exist_ok=True)
+        self._store = _SharedStore(
+            os.path.join(location, 'cache.sqlite3'), self._max_entries, self._cull_frequency,
+        )
+        # Django creates a backend instance per thread; the local tier,
+        # counters and generation map are per process, like LocMemCache's.
+        with _process_lock:
+            if location not in _process_state:
+                _process_state[location] = (
+                    OrderedDict(),  # key -> (pickled value, expires, generation)
+                    threading.Lock(),
+                    dict.fromkeys(('local_hits', 'shared_hits', 'misses', 'stale', 'evictions', 'sets', 'deletes'), 0),
+                    _Generations(os.path.join(location, 'generations')),
+                )
+            self._local, self._lock, self._stats, self._generations = _process_state[location]
+        self._local_max = int(options.get('LOCAL_MAX_ENTRIES', 2000))
+
+    # ---------------- LOCAL TIER ----------------
+    def _local_get(self, key, now):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires, generation = entry
+            if (expires is not None and expires <= now) or generation != self._generations.read(
+                self._generations.slot(key)
+            ):
+                del self._local[key]
+                self._stats['stale'] += 1
+                return _MISSING
+            self._local.move_to_end(key)
+            self._stats['local_hits'] += 1
+            return value
+
+    def _local_put(self, key, value, expires, generation):
+        with self._lock:
+            self._local[key] = (value, expires, generation)
+            self._local.move_to_end(key)
+            while len(self._local) > self._local_max:
+                self._local.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _local_drop(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _expiry(self, timeout):
+        # Absolute expiry time, or None for "never"
+        return self.get_backend_timeout(timeout)
+
+    def _changed(self, key):
+        self._local_drop(key)
+        self._generations.bump([self._generations.slot(key)])
+
+    # ---------------- CACHE API ----------------
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        value = self._local_get(key, now)
+        if value is not _MISSING:
+            return pickle.loads(value)
+
+        # Read the generation before the shared value: a write in between
+        # then only makes our local copy look stale, never the other way round
+        generation = self._generations.read(self._generations.slot(key))
+        row = self._store.get(key, now)
+        if row is None:
+            self._count('misses')
+            return default
+        self._count('shared_hits')
+        self._local_put(key, row[0], row[1], generation)
+        return pickle.loads(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._store.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expiry(timeout), now=time.time())
+        self._count('sets')
+        self._changed(key)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        stored = self._store.set(
+            key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expiry(timeout),
+            only_if_missing=True, now=time.time(),
+        )
+        if stored:
+            self._count('sets')
+            self._changed(key)
+        return stored
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        touched = self._store.touch(key, self._expiry(timeout), time.time())
+        if touched:
+            self._changed(key)
+        return touched
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        deleted = self._store.delete(key)
+        self._count('deletes')
+        self._changed(key)
+        return deleted
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        result = {}
+
+        def add_delta(raw):
+            result['value'] = pickle.loads(raw) + delta
+            return pickle.dumps(result['value'], pickle.HIGHEST_PROTOCOL)
+
+        if self._store.update(key, add_delta, time.time()) is None:
+            raise ValueError(f"Key '{key}' not found")
+        self._changed(key)
+        return result['value']
+
+    def clear(self):
+        self._store.clear()
+        with self._lock:
+            self._local.clear()
+        self._generations.bump(range(GENERATION_SLOTS))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, local_entries=len(self._local), local_max_entries=self._local_max)
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['local_hits'] + stats['shared_hits']) / lookups, 4) if lookups else None
+        return stats
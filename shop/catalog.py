@@ -0,0 +1,226 @@
+"""
+In-process columnar snapshot of the catalog listing fields.
+
+Listing pages only ever filter by category, sort by date, price or rating,
+pick the deal shelves and cut out one page, so every worker keeps the fields
+those need in a handful of NumPy arrays (one entry per product, ~40 bytes):
+
+    ids       int64     product id
+    category  int32     category id
+    price     int64     price in paise (exact, unlike a float)
+    stock     int32
+    rating    float32
+    flags     uint8     FLAG_HOT | FLAG_TOP
+    created   int64     created_at, microseconds since the epoch
+    names     offsets into one UTF-8 buffer (``name(row)``)
+    slugs     offsets into another (``slug(row)``)
+
+The rows are stored newest first and the other sort orders are precomputed as
+permutations, so a listing is a boolean mask, one ``take`` and a slice; only
+the IDs of the page being shown are then loaded from the database
+(``hydrate``).
+
+The snapshot records the page-shell catalog version (``shells``) it was
+built under. When Product/Category signals bump that version, or the snapshot
+is older than ``SNAPSHOT_MAX_AGE`` (changes made with ``.update()``: stock,
+ratings), one background thread rebuilds it while requests keep being answered
+from the current one; only a worker with no snapshot at all builds it inline.
+Listing pages key their shells by the version of the snapshot they were
+rendered from, so a shell is never cached under a newer version than its
+data. ``warm`` builds the snapshot when a worker starts.
+"""
+import logging
+import threading
+import time
+from datetime import timezone as dt_timezone
+
+import numpy as np
+
+from django.db import connections
+
+from . import shells
+from .models import Category, Product
+from .shelves import CARD_FIELDS, SHELF_SIZES
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAX_AGE = 300
+FLAG_HOT, FLAG_TOP = 1, 2
+DEFAULT_SORT = 'newest'
+# The same orders in SQL, for listings that still go to the database (text search)
+ORDERINGS = {
+    'newest': ('-created_at', '-id'),
+    'price_asc': ('price', '-created_at', '-id'),
+    'price_desc': ('-price', '-created_at', '-id'),
+    'rating': ('-rating', '-created_at', '-id'),
+}
+
+
+def _strings(values):
+    """Pack strings into one UTF-8 buffer plus int64 offsets (``len(values) + 1`` of them)."""
+    encoded = [value.encode() for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return b''.join(encoded), offsets
+
+
+class CatalogSnapshot:
+    def __init__(self, rows, categories, version=None):
+        """
+        ``rows``: ``(id, category_id, price, stock, rating, is_hot_deal,
+        is_top_deal, created_at, name, slug)`` tuples, newest first.
+        ``categories``: ``(id, name, slug)`` tuples.
+        """
+        self.version = version
+        self.built_at = time.monotonic()
+        columns = list(zip(*rows)) or [()] * 10
+        (ids, category, price, stock, rating, hot, top, created, names, slugs) = columns
+        self.ids = np.array(ids, dtype=np.int64)
+        self.category = np.array(category, dtype=np.int32)
+        self.price = np.array([int(value * 100) for value in price], dtype=np.int64)
+        self.stock = np.array(stock, dtype=np.int32)
+        self.rating = np.array(rating, dtype=np.float32)
+        self.flags = (np.array(hot, dtype=np.uint8) * FLAG_HOT) | (np.array(top, dtype=np.uint8) * FLAG_TOP)
+        self.created = np.array(
+            [int(value.astimezone(dt_timezone.utc).timestamp() * 1_000_000) for value in created], dtype=np.int64,
+        )
+        self._names, self._name_offsets = _strings(names)
+        self._slugs, self._slug_offsets = _strings(slugs)
+        self.categories = {slug: Category(id=pk, name=name, slug=slug) for pk, name, slug in categories}
+
+        # Row permutations for each sort; stable, so ties stay newest first
+        self.orders = {
+            'newest': np.arange(len(self.ids)),
+            'price_asc': np.argsort(self.price, kind='stable'),
+            'price_desc': np.argsort(-self.price, kind='stable'),
+            'rating': np.argsort(-self.rating, kind='stable'),
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        arrays = (self.ids, self.category, self.price, self.stock, self.rating, self.flags, self.created,
+                  self._name_offsets, self._slug_offsets, *self.orders.values())
+        return sum(a.nbytes for a in arrays) + len(self._names) + len(self._slugs)
+
+    def name(self, row):
+        return self._names[self._name_offsets[row]:self._name_offsets[row + 1]].decode()
+
+    def slug(self, row):
+        return self._slugs[self._slug_offsets[row]:self._slug_offsets[row + 1]].decode()
+
+    def rows(self, category_id=None, sort=DEFAULT_SORT, flags=0):
+        """Row numbers matching the filters, in ``sort`` order."""
+        order = self.orders[sort]
+        mask = None
+        if category_id is not None:
+            mask = self.category == category_id
+        if flags:
+            flagged = (self.flags & flags) == flags
+            mask = flagged if mask is None else mask & flagged
+        return order if mask is None else order[mask[order]]
+
+    def product_ids(self, category_id=None, sort=DEFAULT_SORT, flags=0):
+        """Product IDs matching the filters, in ``sort`` order (an int64 array; slice it to page)."""
+        return self.ids[self.rows(category_id, sort, flags)]
+
+    def shelves(self, category_id=None):
+        """Home page shelf IDs (hot deals, top deals, latest), newest first."""
+        return {
+            'hot_deals': self.product_ids(category_id, flags=FLAG_HOT)[:SHELF_SIZES['hot_deals']],
+            'top_deals': self.product_ids(category_id, flags=FLAG_TOP)[:SHELF_SIZES['top_deals']],
+            'latest_products': self.product_ids(category_id)[:SHELF_SIZES['latest_products']],
+        }
+
+
+def load():
+    rows = Product.objects.order_by('-created_at', '-id').values_list(
+        'id', 'category_id', 'price', 'stock', 'rating', 'is_hot_deal', 'is_top_deal', 'created_at', 'name', 'slug',
+    ).iterator(chunk_size=5000)
+    return rows, Category.objects.values_list('id', 'name', 'slug')
+
+
+# ---------------- PROCESS-WIDE SNAPSHOT ----------------
+_lock = threading.Lock()
+_state = {'snapshot': None, 'refreshing': False}
+
+
+def rebuild(version=None):
+    version = version or shells.catalog_version()  # read first: a change during the build means another rebuild
+    rows, categories = load()
+    snapshot = CatalogSnapshot(list(rows), list(categories), version)
+    _state['snapshot'] = snapshot
+    return snapshot
+
+
+def _refresh_in_background():
+    try:
+        rebuild()
+    except Exception:
+        logger.exception("Catalog snapshot rebuild failed")  # the next request tries again
+    finally:
+        _state['refreshing'] = False
+        connections.close_all()
+
+
+def _start_refresh():
+    with _lock:
+        if _state['refreshing']:
+            return
+        _state['refreshing'] = True
+    threading.Thread(target=_refresh_in_background, name='catalog-snapshot', daemon=True).start()
+
+
+def get_snapshot():
+    """
+    This process's snapshot. If the catalog version has moved on (or the
+    snapshot is old) it is still returned, and a rebuild starts in the background.
+    """
+    snapshot = _state['snapshot']
+    if snapshot is None:
+        with _lock:  # a cold worker whose warm() hasn't finished: wait for (or do) the first build
+            snapshot = _state['snapshot'] or rebuild()
+    elif snapshot.version != shells.catalog_version() or time.monotonic() - snapshot.built_at > SNAPSHOT_MAX_AGE:
+        _start_refresh()
+    return snapshot
+
+
+def warm():
+    """Build the snapshot in the background (called as a worker starts)."""
+    def build():
+        try:
+            with _lock:
+                if _state['snapshot'] is None:
+                    rebuild()
+        except Exception:
+            pass  # e.g. tables not migrated yet; the first listing builds it
+        finally:
+            connections.close_all()
+    threading.Thread(target=build, name='catalog-snapshot', daemon=True).start()
+
+
+def reset():
+    with _lock:
+        _state.update(snapshot=None, refreshing=False)
+
+
+# ---------------- HYDRATION ----------------
+def _cards(product_ids):
+    return Product.objects.select_related('category').only(*CARD_FIELDS, 'category__name').in_bulk(product_ids)
+
+
+def hydrate(product_ids):
+    """Card-ready products (category name included) for ``product_ids``, in that order: one query."""
+    product_ids = [int(pk) for pk in product_ids]
+    products = _cards(product_ids) if product_ids else {}
+    return [products[pk] for pk in product_ids if pk in products]
+
+
+def hydrate_shelves(shelves):
+    """``shelves()`` with the IDs replaced by products, all shelves in one query."""
+    shelves = {name: [int(pk) for pk in ids] for name, ids in shelves.items()}
+    wanted = {pk for ids in shelves.values() for pk in ids}
+    products = _cards(wanted) if wanted else {}
+    return {name: [products[pk] for pk in ids if pk in products] for name, ids in shelves.items()}
@@ -13,14 +13,19 @@ def category_context(request):
     return {'nav_categories': categories}
 
 def cart_context(request):
+    if getattr(request, 'page_shell', False):
+        # The mini cart is a hole in page shells, filled in per visitor
+        return {}
     if request.user.is_authenticated:
-        items = CartItem.objects.filter(user=request.user).select_related('product')
+        items = CartItem.objects.filter(user=request.user).select_related('product', 'variant')
         total = sum(item.subtotal for item in items) or Decimal('0.00')
         count = sum(item.quantity for item in items) or 0
     else:
-        items = []
-        total = Decimal('0.00')
-        count = 0
+        # Anonymous: the signed-cookie cart; no queries when it is empty
+        guest_cart = getattr(request, 'guest_cart', None)
+        items = guest_cart.items() if guest_cart else []
+        total = sum(item.subtotal for item in items) or Decimal('0.00')
+        count = sum(item.quantity for item in items) or 0
 
     return {
         'mini_cart_items': items,
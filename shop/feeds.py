@@ -0,0 +1,283 @@
+"""
+Sitemaps and the product feed, served as pre-built files.
+
+Products are split into chunks by ID (``CHUNK_SIZE`` IDs per chunk, so a
+product never changes chunk). Each chunk gets three files in ``FEEDS_DIR``:
+
+    sitemap-products-<n>.xml   a complete <urlset> for the chunk
+    feed-<n>.csv               the chunk's feed rows, no header
+    feed-<n>.xml               the chunk's RSS <item>s, no wrapper
+
+plus ``sitemap-pages.xml`` (home, listings, categories) and the sitemap index
+``sitemap.xml``. The feed lists every product and every variant (with
+``item_group_id``) with price, stock, availability, image URL and category;
+``/feeds/products.csv`` and ``.xml`` stream the chunk files in order between a
+header and a footer. The XML feed is RSS 2.0 with the Google Merchant ``g:``
+namespace, the CSV uses the same attribute names. Until the first ``refresh`` has run (``refresh_feeds``,
+or ``build_feeds`` on deploy) the views answer 503 and queue one.
+
+Product, variant and category changes bump the version of the chunks they
+touch (``versions``, like the page shells); ``refresh`` regenerates only
+chunks whose version differs from the one recorded in ``manifest.json`` (or
+whose files are missing), reading them with ``only()`` and ``iterator()``.
+URLs are absolute, built from ``SITE_URL``.
+"""
+import csv
+import io
+import json
+import os
+import time
+import uuid
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Max
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from . import jobs, versions
+from .models import Category, Product, ProductVariant
+
+CHUNK_SIZE = 10_000  # product IDs per chunk; a sitemap may hold 50,000 URLs
+CHUNK_VERSION_KEY = 'feeds:chunk:{}'
+CATEGORIES_VERSION_KEY = 'feeds:categories'
+MANIFEST = 'manifest.json'
+FEED_FORMAT = 2  # bump when the chunk file layout changes: everything is rebuilt
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+GOOGLE_NS = 'http://base.google.com/ns/1.0'
+FEED_TITLE = 'NeoMart products'
+CSV_COLUMNS = ('id', 'item_group_id', 'title', 'description', 'link', 'image_link', 'price', 'availability',
+               'stock', 'product_type')
+REFRESH_COALESCE = 60  # seconds
+FORMATS = {'csv': 'text/csv; charset=utf-8', 'xml': 'application/xml; charset=utf-8'}
+
+
+def feeds_dir():
+    return os.fspath(getattr(settings, 'FEEDS_DIR', settings.BASE_DIR / 'var' / 'feeds'))
+
+
+def site_url():
+    url = getattr(settings, 'SITE_URL', '')
+    if not url:
+        host = next((h for h in settings.ALLOWED_HOSTS if h not in ('*', '') and not h.startswith('.')), 'localhost')
+        url = f'https://{host}'
+    return url.rstrip('/')
+
+
+def chunk_of(product_id):
+    return product_id // CHUNK_SIZE
+
+
+def path(name):
+    return os.path.join(feeds_dir(), name)
+
+
+# ---------------- VERSIONS ----------------
+def mark_changed(product_id):
+    """The feed/sitemap chunk holding ``product_id`` needs regenerating."""
+    versions.bump(CHUNK_VERSION_KEY.format(chunk_of(product_id)))
+
+
+def mark_categories_changed():
+    # Category names appear in every feed row
+    versions.bump(CATEGORIES_VERSION_KEY)
+
+
+def _chunk_version(chunk):
+    return f"{versions.current(CATEGORIES_VERSION_KEY)}:{versions.current(CHUNK_VERSION_KEY.format(chunk))}"
+
+
+def read_manifest():
+    try:
+        with open(path(MANIFEST), encoding='utf-8') as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return {'chunks': {}}
+
+
+def _write(name, data):
+    """Atomically replace a file in FEEDS_DIR."""
+    target = path(name)
+    tmp = f"{target}.{uuid.uuid4().hex}.tmp"  # unique per writer, process or thread
+    with open(tmp, 'w', encoding='utf-8', newline='') as fh:
+        fh.write(data)
+    os.replace(tmp, target)
+
+
+def _remove(name):
+    try:
+        os.remove(path(name))
+    except FileNotFoundError:
+        pass
+
+
+# ---------------- GENERATION ----------------
+def _url_entry(loc, lastmod=None):
+    lastmod = f"<lastmod>{lastmod}</lastmod>" if lastmod else ''
+    return f"<url><loc>{escape(loc)}</loc>{lastmod}</url>\n"
+
+
+def _urlset(entries):
+    return f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NS}">\n{"".join(entries)}</urlset>\n'
+
+
+def _feed_rows(chunk, categories, base):
+    """Feed rows (dicts keyed by CSV_COLUMNS) and sitemap entries for one chunk."""
+    lo, hi = chunk * CHUNK_SIZE, (chunk + 1) * CHUNK_SIZE - 1
+    variants = {}
+    variant_rows = (
+        ProductVariant.objects.filter(product_id__gte=lo, product_id__lte=hi)
+        .select_related('variant_type').only('id', 'product', 'value', 'price', 'stock', 'variant_type__name')
+        .order_by('product_id', 'id')
+    )
+    for variant in variant_rows.iterator(chunk_size=2000):
+        variants.setdefault(variant.product_id, []).append(variant)
+
+    products = (
+        Product.objects.filter(id__range=(lo, hi))
+        .only('id', 'name', 'slug', 'short_description', 'price', 'stock', 'image', 'category_id', 'created_at')
+        .order_by('id')
+    )
+    rows, urls = [], []
+    for product in products.iterator(chunk_size=2000):
+        link = base + reverse('product_detail', args=[product.slug])
+        urls.append(_url_entry(link, product.created_at.date().isoformat()))
+        base_row = {
+            'title': product.name,
+            'description': product.short_description,
+            'link': link,
+            'image_link': base + product.image.url if product.image else '',
+            'product_type': categories.get(product.category_id, ''),
+        }
+        own = variants.get(product.id, ())
+        if not own:
+            rows.append({**base_row, 'id': str(product.id), 'item_group_id': '',
+                         'price': f"{product.price} INR", 'stock': product.stock})
+        for variant in own:
+            rows.append({
+                **base_row, 'id': f"{product.id}-{variant.id}", 'item_group_id': str(product.id),
+                'title': f"{product.name} - {variant.variant_type.name}: {variant.value}",
+                'price': f"{variant.price} INR", 'stock': variant.stock,
+            })
+    for row in rows:
+        row['availability'] = 'in_stock' if row['stock'] > 0 else 'out_of_stock'
+    return rows, urls
+
+
+def _csv(rows):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, CSV_COLUMNS, lineterminator='\n')
+    writer.writerows(rows)
+    return out.getvalue()
+
+
+# RSS elements per feed column; the rest are g: attributes. Stock has no feed attribute.
+RSS_ELEMENTS = {'title': 'title', 'description': 'description', 'link': 'link', 'stock': None}
+
+
+def _xml_items(rows):
+    items = []
+    for row in rows:
+        fields = []
+        for col in CSV_COLUMNS:
+            tag = RSS_ELEMENTS.get(col, f'g:{col}')
+            if tag and row[col] != '':
+                fields.append(f"<{tag}>{escape(str(row[col]))}</{tag}>")
+        items.append(f"<item>{''.join(fields)}</item>\n")
+    return ''.join(items)
+
+
+def build_chunk(chunk, categories, base):
+    """Write one chunk's files. Returns the number of products in it (0: files removed)."""
+    rows, urls = _feed_rows(chunk, categories, base)
+    if not urls:
+        for name in (f'sitemap-products-{chunk}.xml', f'feed-{chunk}.csv', f'feed-{chunk}.xml'):
+            _remove(name)
+        return 0
+    _write(f'sitemap-products-{chunk}.xml', _urlset(urls))
+    _write(f'feed-{chunk}.csv', _csv(rows))
+    _write(f'feed-{chunk}.xml', _xml_items(rows))
+    return len(urls)
+
+
+def build_pages(base):
+    entries = [_url_entry(base + reverse('home')), _url_entry(base + reverse('product_list'))]
+    for slug in Category.objects.order_by('id').values_list('slug', flat=True):
+        entries.append(_url_entry(base + reverse('product_list_by_category', args=[slug])))
+    _write('sitemap-pages.xml', _urlset(entries))
+
+
+def build_index(manifest, base):
+    entries = [f"<sitemap><loc>{escape(base + reverse('sitemap_file', args=['sitemap-pages.xml']))}</loc></sitemap>\n"]
+    for chunk, info in sorted(manifest['chunks'].items(), key=lambda item: int(item[0])):
+        if info['products']:
+            loc = base + reverse('sitemap_file', args=[f'sitemap-products-{chunk}.xml'])
+            entries.append(f"<sitemap><loc>{escape(loc)}</loc><lastmod>{info['built_at']}</lastmod></sitemap>\n")
+    _write('sitemap.xml', f'<?xml version="1.0" encoding="UTF-8"?>\n'
+                          f'<sitemapindex xmlns="{SITEMAP_NS}">\n{"".join(entries)}</sitemapindex>\n')
+
+
+def schedule_refresh():
+    """Queue a refresh (one per ``REFRESH_COALESCE`` seconds however often it is asked for)."""
+    jobs.enqueue('tasks.refresh_feeds', key=f"feeds-refresh:{int(time.time() // REFRESH_COALESCE)}")
+
+
+def refresh(full=False):
+    """
+    Regenerate the chunks that changed since they were last built (all of
+    them with ``full``), then the pages sitemap and the index. Returns the
+    list of rebuilt chunk numbers.
+    """
+    os.makedirs(feeds_dir(), exist_ok=True)
+    base = site_url()
+    manifest = read_manifest()
+    if manifest.get('base') != base or manifest.get('format') != FEED_FORMAT:
+        full = True
+    categories = dict(Category.objects.values_list('id', 'name'))
+    max_id = Product.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+    chunks = set(range(chunk_of(max_id) + 1)) | {int(chunk) for chunk in manifest['chunks']}
+
+    rebuilt = []
+    for chunk in sorted(chunks):
+        version = _chunk_version(chunk)  # read first: a change during the build leaves the chunk stale
+        info = manifest['chunks'].get(str(chunk))
+        if not full and info and info['version'] == version and (
+                not info['products'] or os.path.exists(path(f'feed-{chunk}.csv'))):
+            continue
+        count = build_chunk(chunk, categories, base)
+        manifest['chunks'][str(chunk)] = {
+            'version': version, 'products': count, 'built_at': timezone.now().isoformat(timespec='seconds'),
+        }
+        rebuilt.append(chunk)
+
+    if rebuilt or not os.path.exists(path('sitemap.xml')):
+        build_pages(base)
+        manifest.update(base=base, format=FEED_FORMAT)
+        build_index(manifest, base)
+        _write(MANIFEST, json.dumps(manifest))
+    return rebuilt
+
+
+# ---------------- SERVING ----------------
+def feed_parts(fmt):
+    """The product feed as an iterator of strings: header, each chunk's file, footer."""
+    manifest = read_manifest()
+    if fmt == 'csv':
+        yield ','.join(CSV_COLUMNS) + '\n'
+    else:
+        yield (f'<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0" xmlns:g="{GOOGLE_NS}">\n<channel>\n'
+               f"<title>{FEED_TITLE}</title>\n<link>{escape(site_url())}/</link>\n"
+               f"<description>{FEED_TITLE}</description>\n"
+               f"<lastBuildDate>{http_date()}</lastBuildDate>\n")
+    for chunk, info in sorted(manifest['chunks'].items(), key=lambda item: int(item[0])):
+        if not info['products']:
+            continue
+        try:
+            with open(path(f'feed-{chunk}.{fmt}'), encoding='utf-8') as fh:
+                while block := fh.read(64 * 1024):
+                    yield block
+        except FileNotFoundError:
+            continue  # being rebuilt; the next fetch has it
+    if fmt == 'xml':
+        yield '</channel>\n</rss>\n'
@@ -0,0 +1,179 @@
+"""
+Carts for anonymous visitors.
+
+The lines (product, variant, quantity) live in a small signed cookie instead
+of ``CartItem`` rows or the session, so browsing and building a cart cost no
+database writes at all. ``GuestCartMiddleware`` puts a lazily decoded
+``request.guest_cart`` on every request and writes the cookie back only when
+a view changed it. On login the lines are merged into the user's
+``CartItem`` rows in one transaction (``merge``, called from the
+``user_logged_in`` signal) and the cookie is dropped.
+
+Guest cart items quack like ``CartItem`` (product, variant, quantity,
+subtotal), so ``pricing.cart_totals`` and the cart templates take either.
+Their ``id`` is the 1-based line number.
+"""
+from django.core import signing
+from django.db import transaction
+
+from . import shells
+from .models import CartItem, Product, ProductVariant
+
+COOKIE_NAME = 'guest_cart'
+COOKIE_SALT = 'shop.guest_cart'
+COOKIE_MAX_AGE = 30 * 24 * 3600
+MAX_LINES = 30
+MAX_QUANTITY = 99
+
+
+def _decode(raw):
+    """``"12:3:2,40::1"`` -> ``[[12, 3, 2], [40, None, 1]]``; anything malformed is dropped."""
+    lines = []
+    for part in raw.split(',')[:MAX_LINES] if raw else ():
+        try:
+            product_id, variant_id, quantity = part.split(':')
+            line = [int(product_id), int(variant_id) if variant_id else None, int(quantity)]
+        except ValueError:
+            continue
+        if 0 < line[2] <= MAX_QUANTITY:
+            lines.append(line)
+    return lines
+
+
+def _encode(lines):
+    return ','.join(f"{p}:{v or ''}:{q}" for p, v, q in lines)
+
+
+class GuestCartItem:
+    def __init__(self, line_no, product, variant, quantity):
+        self.id = line_no
+        self.product = product
+        self.variant = variant
+        self.variant_id = variant.id if variant else None
+        self.quantity = quantity
+
+    @property
+    def subtotal(self):
+        price = self.variant.price if self.variant else self.product.price
+        return price * self.quantity
+
+
+class GuestCart:
+    def __init__(self, raw=None):
+        self._raw = raw
+        self._lines = None
+        self._items = None
+        self.changed = False
+
+    @property
+    def lines(self):
+        if self._lines is None:
+            raw = ''
+            if self._raw:
+                try:
+                    raw = signing.get_cookie_signer(salt=COOKIE_NAME + COOKIE_SALT).unsign(
+                        self._raw, max_age=COOKIE_MAX_AGE,
+                    )
+                except signing.BadSignature:
+                    pass
+            self._lines = _decode(raw)
+        return self._lines
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    def _changed(self):
+        self.changed = True
+        self._items = None
+
+    def add(self, product_id, variant_id=None, quantity=1):
+        """Add to a line (or start one). False if the cart already has MAX_LINES lines."""
+        for line in self.lines:
+            if line[0] == product_id and line[1] == variant_id:
+                line[2] = min(line[2] + quantity, MAX_QUANTITY)
+                break
+        else:
+            if len(self.lines) >= MAX_LINES:
+                return False
+            self.lines.append([product_id, variant_id, min(quantity, MAX_QUANTITY)])
+        self._changed()
+        return True
+
+    def set_quantity(self, line_no, quantity):
+        if not 1 <= line_no <= len(self.lines):
+            return False
+        if quantity <= 0:
+            del self.lines[line_no - 1]
+        else:
+            self.lines[line_no - 1][2] = min(quantity, MAX_QUANTITY)
+        self._changed()
+        return True
+
+    def remove(self, line_no):
+        return self.set_quantity(line_no, 0)
+
+    def clear(self):
+        self._lines = []
+        self._changed()
+
+    def items(self):
+        """Lines with their products and variants loaded (two queries, cached per request)."""
+        if self._items is None:
+            products = Product.objects.select_related('category').in_bulk({p for p, _, _ in self.lines})
+            variants = ProductVariant.objects.select_related('variant_type').in_bulk(
+                {v for _, v, _ in self.lines if v}
+            )
+            self._items = []
+            for line_no, (product_id, variant_id, quantity) in enumerate(self.lines, start=1):
+                product, variant = products.get(product_id), variants.get(variant_id)
+                # Skip lines whose product or variant has gone away since
+                if product is None or (variant_id and (variant is None or variant.product_id != product_id)):
+                    continue
+                self._items.append(GuestCartItem(line_no, product, variant, quantity))
+        return self._items
+
+    def cookie_value(self):
+        return _encode(self.lines)
+
+
+def merge(user, cart):
+    """Fold a guest cart into ``user``'s CartItem rows and empty it. Returns the number of lines merged."""
+    items = cart.items()
+    if items:
+        with transaction.atomic():
+            existing = {
+                (row.product_id, row.variant_id): row
+                for row in CartItem.objects.filter(user=user, product_id__in=[item.product.id for item in items])
+            }
+            created, updated = [], []
+            for item in items:
+                row = existing.get((item.product.id, item.variant_id))
+                if row is None:
+                    created.append(CartItem(user=user, product=item.product, variant=item.variant,
+                                            quantity=item.quantity))
+                else:
+                    row.quantity += item.quantity
+                    updated.append(row)
+            CartItem.objects.bulk_update(updated, ['quantity'])
+            CartItem.objects.bulk_create(created)
+        shells.invalidate_visitor(user.pk)  # bulk writes send no signals
+    cart.clear()
+    return len(items)
+
+
+class GuestCartMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        cart = request.guest_cart = GuestCart(request.COOKIES.get(COOKIE_NAME))
+        response = self.get_response(request)
+        if cart.changed:
+            if cart.lines:
+                response.set_signed_cookie(
+                    COOKIE_NAME, cart.cookie_value(), salt=COOKIE_SALT,
+                    max_age=COOKIE_MAX_AGE, httponly=True, samesite='Lax',
+                )
+            else:
+                response.delete_cookie(COOKIE_NAME, samesite='Lax')
+        return response
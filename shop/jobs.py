@@ -0,0 +1,215 @@
+"""
+Small database-backed job queue.
+
+Views enqueue side-effects with ``enqueue()`` (inside their own transaction,
+so a job only exists if the request's writes were committed) and
+``manage.py run_worker`` executes them:
+
+* jobs are claimed with a conditional UPDATE, so any number of worker
+  threads/processes can poll the same table without SELECT ... FOR UPDATE
+  (which SQLite doesn't have),
+* failures are retried with exponential backoff up to ``max_attempts``,
+* a running job renews its lock while the task runs; one whose worker died
+  stops renewing and is requeued after ``STALE_AFTER``,
+* ``idempotency_key`` makes enqueueing the same piece of work twice a no-op,
+* tasks registered with ``every=`` are enqueued periodically, deduplicated by
+  an idempotency key per time slot so several workers don't double-run them.
+
+Tasks are plain functions registered with ``@task`` in ``shop/tasks.py``.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE = 5        # seconds; attempt n waits BACKOFF_BASE * 2**(n-1)
+BACKOFF_MAX = 3600
+STALE_AFTER = 600       # running jobs whose lock wasn't renewed for this long are requeued
+HEARTBEAT_EVERY = STALE_AFTER // 4  # how often a running job renews its lock
+
+_tasks = {}
+_periodic_slots = {}
+
+
+class TaskSpec:
+    __slots__ = ('name', 'func', 'max_attempts', 'every')
+
+    def __init__(self, name, func, max_attempts, every):
+        self.name = name
+        self.func = func
+        self.max_attempts = max_attempts
+        self.every = every
+
+
+def task(name=None, max_attempts=5, every=None):
+    """Register a function as a job. ``every`` (seconds) also schedules it periodically."""
+    def decorator(func):
+        spec_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+        _tasks[spec_name] = TaskSpec(spec_name, func, max_attempts, every)
+        func.task_name = spec_name
+        return func
+    return decorator
+
+
+def registered_tasks():
+    return dict(_tasks)
+
+
+def enqueue(name, payload=None, key=None, delay=0, max_attempts=None):
+    """
+    Queue ``name`` to run with ``payload`` as keyword arguments. Returns the
+    Job, or the existing one when ``key`` was already used.
+    """
+    name = getattr(name, 'task_name', name)
+    spec = _tasks.get(name)
+    fields = {
+        'name': name,
+        'payload': payload or {},
+        'run_at': timezone.now() + timedelta(seconds=delay),
+        'max_attempts': max_attempts or (spec.max_attempts if spec else 5),
+    }
+    if key is None:
+        return Job.objects.create(**fields)
+    try:
+        with transaction.atomic():
+            return Job.objects.create(idempotency_key=key, **fields)
+    except IntegrityError:
+        return Job.objects.get(idempotency_key=key)
+
+
+def enqueue_periodic(now=None):
+    now = now or time.time()
+    for spec in _tasks.values():
+        if not spec.every:
+            continue
+        slot = int(now // spec.every)
+        # Only touch the database once per slot and process
+        if _periodic_slots.get(spec.name) != slot:
+            enqueue(spec.name, key=f"periodic:{spec.name}:{slot}")
+            _periodic_slots[spec.name] = slot
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** max(0, attempts - 1))
+    return delay + random.uniform(0, delay / 10)
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def requeue_stale():
+    cutoff = timezone.now() - timedelta(seconds=STALE_AFTER)
+    return Job.objects.filter(status='running', locked_at__lt=cutoff).update(status='queued', locked_by='')
+
+
+def claim(worker, limit=10):
+    """Claim up to ``limit`` due jobs for ``worker``."""
+    now = timezone.now()
+    candidates = list(
+        Job.objects.filter(status='queued', run_at__lte=now)
+        .order_by('run_at').values_list('id', flat=True)[:limit * 2]
+    )
+    claimed = []
+    for job_id in candidates:
+        updated = Job.objects.filter(pk=job_id, status='queued').update(
+            status='running', locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+        )
+        if updated:
+            claimed.append(job_id)
+            if len(claimed) >= limit:
+                break
+    return claimed
+
+
+def heartbeat(job_id, worker):
+    """Renew ``worker``'s lock on a running job. A busy database just skips a beat."""
+    try:
+        return Job.objects.filter(pk=job_id, status='running', locked_by=worker).update(
+            locked_at=timezone.now(),
+        )
+    except DatabaseError:
+        logger.warning("Could not renew the lock on job %s", job_id)
+        return 0
+
+
+class _Heartbeat(threading.Thread):
+    """Calls heartbeat() every HEARTBEAT_EVERY seconds until stopped."""
+
+    def __init__(self, job_id, worker):
+        super().__init__(name=f'job-{job_id}-heartbeat', daemon=True)
+        self.job_id = job_id
+        self.worker = worker
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(HEARTBEAT_EVERY):
+                heartbeat(self.job_id, self.worker)
+        finally:
+            connections.close_all()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def _set_status(job_id, attempts=3, **fields):
+    """
+    Record a job's outcome, retrying briefly if the database is busy. Returns
+    False if it could not be written: the job then stays 'running' until it
+    goes stale and runs again, so a task's last step must be safe to repeat.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            Job.objects.filter(pk=job_id).update(**fields)
+            return True
+        except DatabaseError:
+            if attempt == attempts:
+                logger.exception("Could not record status %r for job %s", fields.get('status'), job_id)
+                return False
+            time.sleep(0.2 * attempt)
+
+
+def _call(spec, job):
+    # Long tasks keep their lock fresh so requeue_stale() doesn't start a second copy
+    beating = _Heartbeat(job.pk, job.locked_by)
+    beating.start()
+    try:
+        spec.func(**job.payload)
+    finally:
+        beating.stop()
+
+
+def run_job(job_id):
+    job = Job.objects.get(pk=job_id)
+    spec = _tasks.get(job.name)
+    try:
+        if spec is None:
+            raise LookupError(f"Unknown task {job.name!r}")
+        _call(spec, job)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning("Job %s (%s) failed on attempt %s", job.pk, job.name, job.attempts)
+        if job.attempts >= job.max_attempts:
+            _set_status(job.pk, status='failed', last_error=error, finished_at=timezone.now())
+        else:
+            _set_status(
+                job.pk, status='queued', last_error=error, locked_by='',
+                run_at=timezone.now() + timedelta(seconds=backoff(job.attempts)),
+            )
+        return False
+    _set_status(job.pk, status='done', finished_at=timezone.now(), last_error='')
+    return True
@@ -0,0 +1,134 @@
+"""
+Purging of data nobody will come back for.
+
+* expired sessions,
+* idle anonymous sessions that only hold browsing state (recently viewed,
+  compare list, theme) long before their two-week expiry,
+* cart items of users who have not logged in for ``CART_ABANDON_DAYS``.
+
+Everything is deleted in small batches, each in its own short transaction,
+with an optional pause in between, so it can run under live traffic without
+holding SQLite's write lock for long. ``incremental_vacuum`` then hands the
+freed pages back to the filesystem.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.models import Session
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import CartItem
+
+CART_ABANDON_DAYS = 60
+ANONYMOUS_IDLE_DAYS = 3
+VACUUM_PAGES_PER_RUN = 5000  # ~20 MB with 4 KB pages; bounds how long the daily job holds the lock
+
+
+def _delete_in_batches(queryset, pks, batch_size, pause):
+    """
+    Delete ``pks`` in batches, repeating ``queryset``'s condition in each
+    DELETE: a row that stopped matching since it was selected (a visitor who
+    just logged in, a user who came back) is left alone.
+    """
+    deleted = 0
+    for start in range(0, len(pks), batch_size):
+        with transaction.atomic():
+            deleted += queryset.filter(pk__in=pks[start:start + batch_size]).delete()[0]
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+def _batched_pks(queryset, batch_size):
+    """Yield lists of primary keys in pk order without loading the whole table."""
+    last = None
+    while True:
+        qs = queryset.order_by('pk')
+        if last is not None:
+            qs = qs.filter(pk__gt=last)
+        pks = list(qs.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        yield pks
+        last = pks[-1]
+
+
+def purge_expired_sessions(batch_size=500, pause=0.0):
+    deleted = 0
+    expired = Session.objects.filter(expire_date__lt=timezone.now())
+    # Deleting a batch moves the window, so always read the first one again
+    while True:
+        pks = list(expired.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        deleted += _delete_in_batches(expired, pks, batch_size, pause)
+
+
+def purge_idle_anonymous_sessions(idle_days=ANONYMOUS_IDLE_DAYS, batch_size=500, pause=0.0):
+    # expire_date is last modification + SESSION_COOKIE_AGE
+    cutoff = timezone.now() + timedelta(seconds=settings.SESSION_COOKIE_AGE) - timedelta(days=idle_days)
+    idle = Session.objects.filter(expire_date__lt=cutoff)
+    deleted = 0
+    for pks in _batched_pks(idle, batch_size):
+        anonymous = [
+            session.pk for session in Session.objects.filter(pk__in=pks)
+            if SESSION_KEY not in session.get_decoded()
+        ]
+        # Logging in saves the session, which pushes expire_date past the cutoff
+        deleted += _delete_in_batches(idle, anonymous, batch_size, pause)
+    return deleted
+
+
+def purge_abandoned_carts(days=CART_ABANDON_DAYS, batch_size=500, pause=0.0):
+    cutoff = timezone.now() - timedelta(days=days)
+    abandoned = CartItem.objects.filter(added_at__lt=cutoff).filter(
+        Q(user__last_login__lt=cutoff) | Q(user__last_login__isnull=True)
+    )
+    deleted = 0
+    for pks in _batched_pks(abandoned, batch_size):
+        deleted += _delete_in_batches(abandoned, pks, batch_size, pause)
+    return deleted
+
+
+def _pragma(cursor, name):
+    cursor.execute(f"PRAGMA {name}")
+    return cursor.fetchone()[0]
+
+
+def incremental_vacuum(max_pages=None):
+    """
+    Return ``(auto_vacuum_mode, pages_freed)``. Only SQLite databases created
+    (or VACUUMed once) with ``auto_vacuum=INCREMENTAL`` can shrink without a
+    full, blocking VACUUM; see ``enable_incremental_vacuum``.
+    """
+    if connection.vendor != 'sqlite':
+        return None, 0
+    with connection.cursor() as cursor:
+        mode = _pragma(cursor, "auto_vacuum")
+        if mode != 2:
+            return mode, 0
+        before = _pragma(cursor, "freelist_count")
+        pages = f"({int(max_pages)})" if max_pages else ""
+        cursor.execute(f"PRAGMA incremental_vacuum{pages}")
+        cursor.fetchall()
+        after = _pragma(cursor, "freelist_count")
+    return mode, before - after
+
+
+def enable_incremental_vacuum():
+    """One-off switch to auto_vacuum=INCREMENTAL. Runs a full VACUUM, which locks the database."""
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor.execute("VACUUM")
+
+
+def purge_all(batch_size=500, pause=0.0, cart_days=CART_ABANDON_DAYS, idle_days=ANONYMOUS_IDLE_DAYS):
+    return {
+        'expired sessions': purge_expired_sessions(batch_size, pause),
+        'idle anonymous sessions': purge_idle_anonymous_sessions(idle_days, batch_size, pause),
+        'abandoned cart items': purge_abandoned_carts(cart_days, batch_size, pause),
+    }
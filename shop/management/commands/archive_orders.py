@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from shop import archive
+
+
+class Command(BaseCommand):
+    help = "Move old delivered/cancelled orders into the archive tables in batches (safe to interrupt and rerun)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="Archive orders older than this (default: ORDER_ARCHIVE_AFTER_DAYS).")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--max-batches', type=int, default=None)
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be archived.")
+
+    def handle(self, *args, **opts):
+        age = archive.archive_after()
+        if opts['days'] is not None:
+            # my_orders only looks in the archive past the configured horizon
+            if timedelta(days=opts['days']) < age:
+                raise CommandError(f"--days cannot be lower than ORDER_ARCHIVE_AFTER_DAYS ({age.days}).")
+            age = timedelta(days=opts['days'])
+        cutoff = timezone.now() - age
+        if opts['dry_run']:
+            count = archive.archivable(cutoff).count()
+            self.stdout.write(f"{count:,} order(s) older than {cutoff:%Y-%m-%d} would be archived.")
+            return
+        moved = archive.archive_orders(cutoff, opts['batch_size'], opts['max_batches'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved:,} order(s) older than {cutoff:%Y-%m-%d}."))
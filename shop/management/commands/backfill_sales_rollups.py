@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from shop import rollups
+
+
+class Command(BaseCommand):
+    help = "Fold orders the sales rollups have not seen yet into them, or rebuild them from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Drop and recompute every rollup from Order/OrderItem "
+                                 "(much faster than catching up order by order for an initial backfill).")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **opts):
+        if opts['rebuild']:
+            rollups.rebuild()
+            self.stdout.write(self.style.SUCCESS("Sales rollups rebuilt."))
+            return
+        pending = rollups.pending_orders().count()
+        self.stdout.write(f"{pending:,} order(s) pending")
+        applied = rollups.catch_up(opts['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Applied {applied:,} order(s) to the sales rollups."))
@@ -0,0 +1,140 @@
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.urls import reverse
+
+from shop.models import Product
+
+from .seed_benchmark_data import PREFIX
+
+# (name, needs login, url builder). Builders receive the benchmark product.
+SCENARIOS = [
+    ('home', False, lambda p: reverse('home')),
+    ('product_list', False, lambda p: reverse('product_list')),
+    ('product_list_q', False, lambda p: reverse('product_list') + '?q=Pro'),
+    ('product_detail', True, lambda p: reverse('product_detail', args=[p.slug])),
+    ('cart_view', True, lambda p: reverse('cart')),
+    ('checkout', True, lambda p: reverse('checkout')),
+    ('my_orders', True, lambda p: reverse('my_orders')),
+    ('dashboard', True, lambda p: reverse('dashboard')),
+]
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = "Drive the storefront views through the test client and report latency, queries and memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--only', nargs='*', help="Run only these scenarios.")
+        parser.add_argument('--user', default=f"{PREFIX}_user_0")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+        parser.add_argument('--baseline', help="Compare against a JSON file written by --output.")
+        parser.add_argument('--tolerance', type=float, default=0.20,
+                            help="Allowed relative p95 regression against the baseline (default 20%%).")
+
+    def handle(self, *args, **opts):
+        setup_test_environment()
+
+        user = User.objects.filter(username=opts['user']).first()
+        if user is None:
+            raise CommandError(f"User {opts['user']!r} not found; run seed_benchmark_data first.")
+        product = (
+            Product.objects.filter(slug__startswith=f"{PREFIX}-product-").order_by('id').first()
+            or Product.objects.order_by('id').first()
+        )
+        if product is None:
+            raise CommandError("No products found; run seed_benchmark_data first.")
+
+        anon = Client()
+        authed = Client()
+        authed.force_login(user)
+
+        results = {}
+        for name, needs_login, url_for in SCENARIOS:
+            if opts['only'] and name not in opts['only']:
+                continue
+            client = authed if needs_login else anon
+            results[name] = self._run(client, url_for(product), opts['iterations'], opts['warmup'])
+
+        self._report(results)
+
+        if opts['output']:
+            Path(opts['output']).write_text(json.dumps(results, indent=2))
+            self.stdout.write(f"Results written to {opts['output']}")
+
+        if opts['baseline']:
+            self._compare(results, json.loads(Path(opts['baseline']).read_text()), opts['tolerance'])
+
+    def _run(self, client, url, iterations, warmup):
+        for _ in range(warmup):
+            client.get(url)
+
+        timings = []
+        queries = 0
+        status = None
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = len(ctx.captured_queries)
+            status = response.status_code
+
+        # Memory is measured in a separate pass: tracemalloc slows every
+        # allocation down and would distort the latency numbers.
+        tracemalloc.start()
+        client.get(url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'url': url,
+            'status': status,
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(_percentile(timings, 95), 3),
+            'queries': queries,
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def _report(self, results):
+        header = f"{'view':<16}{'status':>7}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}{'peak KB':>10}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, r in results.items():
+            self.stdout.write(
+                f"{name:<16}{r['status']:>7}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+                f"{r['queries']:>9}{r['peak_kb']:>10.1f}"
+            )
+
+    def _compare(self, results, baseline, tolerance):
+        self.stdout.write("\nAgainst baseline:")
+        regressions = []
+        for name, r in results.items():
+            base = baseline.get(name)
+            if not base:
+                continue
+            delta = (r['p95_ms'] - base['p95_ms']) / base['p95_ms'] if base['p95_ms'] else 0
+            query_delta = r['queries'] - base['queries']
+            line = f"  {name:<16} p95 {delta:+.1%}  queries {query_delta:+d}"
+            if delta > tolerance or query_delta > 0:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(self.style.SUCCESS(line))
+        if regressions:
+            raise CommandError(f"Regressions in: {', '.join(regressions)}")
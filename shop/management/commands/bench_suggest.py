@@ -0,0 +1,73 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.search_index import PrefixIndex
+
+BRANDS = ['Apple', 'Samsung', 'Sony', 'Lenovo', 'Asus', 'Boat', 'Noise', 'Puma', 'Nike', 'Intel', 'AMD', 'Logitech']
+NOUNS = ['Phone', 'Laptop', 'Headphones', 'Earbuds', 'Watch', 'T-Shirt', 'Sneakers', 'Processor', 'Keyboard',
+         'Mouse', 'Monitor', 'Charger', 'Backpack', 'Speaker', 'Tablet', 'Camera']
+ADJECTIVES = ['Pro', 'Max', 'Lite', 'Ultra', 'Wireless', 'Gaming', 'Classic', 'Sport', 'Slim', 'Mini']
+
+
+def _names(count, rng):
+    for i in range(count):
+        yield f"{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i % 997}"
+
+
+class Command(BaseCommand):
+    help = "Measure build time, lookup latency and incremental updates of the search suggestion index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', type=int, default=200_000)
+        parser.add_argument('--queries', type=int, default=20_000)
+        parser.add_argument('--updates', type=int, default=1_000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **opts):
+        rng = random.Random(opts['seed'])
+        names = list(_names(opts['entries'], rng))
+        entries = [(('p', i), name, 'product', f"bench-{i}", rng.randint(0, 500)) for i, name in enumerate(names)]
+
+        started = time.perf_counter()
+        index = PrefixIndex(entries)
+        build = time.perf_counter() - started
+        self.stdout.write(
+            f"Built index of {len(index):,} entries ({len(index.keys):,} keys, "
+            f"{len(index.top):,} precomputed prefixes) in {build:.2f}s"
+        )
+
+        # Prefixes as people type them: 1-6 characters of a random word start
+        prefixes = []
+        for _ in range(opts['queries']):
+            words = rng.choice(names).split()
+            start = rng.randrange(len(words))
+            prefixes.append(' '.join(words[start:])[:rng.randint(1, 6)])
+        timings = []
+        for prefix in prefixes:
+            t0 = time.perf_counter()
+            index.suggest(prefix)
+            timings.append((time.perf_counter() - t0) * 1e6)
+        timings.sort()
+        self.stdout.write(
+            f"suggest(): p50 {statistics.median(timings):.1f}µs, "
+            f"p99 {timings[int(len(timings) * 0.99) - 1]:.1f}µs, max {timings[-1]:.1f}µs "
+            f"over {len(timings):,} prefixes"
+        )
+
+        next_id = len(entries)
+        started = time.perf_counter()
+        for i in range(opts['updates']):
+            index.add(('p', next_id + i), f"{rng.choice(BRANDS)} New {rng.choice(NOUNS)}", 'product', 'x', 999)
+        added = time.perf_counter() - started
+        started = time.perf_counter()
+        for i in range(opts['updates']):
+            index.remove(('p', next_id + i))
+        removed = time.perf_counter() - started
+        n = max(1, opts['updates'])
+        self.stdout.write(
+            f"add(): {added / n * 1e3:.2f}ms, remove(): {removed / n * 1e3:.2f}ms per entry "
+            f"over {opts['updates']:,} updates"
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from shop import assets
+
+
+class Command(BaseCommand):
+    help = "Build the self-hosted CSS/JS bundles in static/dist/ (run collectstatic afterwards)."
+
+    def handle(self, *args, **opts):
+        sizes = assets.build()
+        for name, size in sizes.items():
+            self.stdout.write(f"  {name:<32} {size / 1024:>8.1f} KB")
+        self.stdout.write(self.style.SUCCESS("Assets built."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from shop import feeds
+
+
+class Command(BaseCommand):
+    help = "Regenerate the sitemaps and product feed chunks whose products changed (--full: all of them)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Rebuild every chunk.")
+
+    def handle(self, *args, **opts):
+        rebuilt = feeds.refresh(full=opts['full'])
+        chunks = ', '.join(map(str, rebuilt)) or 'none'
+        self.stdout.write(self.style.SUCCESS(f"Feeds written to {feeds.feeds_dir()} (rebuilt chunks: {chunks})."))
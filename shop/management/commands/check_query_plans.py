@@ -0,0 +1,89 @@
+import re
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+
+from shop.models import Product
+
+from .bench import SCENARIOS
+from .seed_benchmark_data import PREFIX
+
+# "SCAN shop_product" is a full table scan; "SCAN ... USING (COVERING) INDEX"
+# and "SEARCH ..." are index walks and fine.
+FULL_SCAN_RE = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+# Scans we know about and accept, with the reason. Keep this list short.
+ALLOWED_SCANS = {
+    # icontains search cannot use a B-tree index
+    ('product_list_q', 'shop_product'): "substring search",
+}
+
+
+class Command(BaseCommand):
+    help = "Run every view's queries through EXPLAIN QUERY PLAN and fail on full scans of large tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default=f"{PREFIX}_user_0")
+        parser.add_argument('--min-rows', type=int, default=1000,
+                            help="Only tables with at least this many rows count as large.")
+        parser.add_argument('--verbose-plans', action='store_true', help="Print every query plan.")
+
+    def handle(self, *args, **opts):
+        if connection.vendor != 'sqlite':
+            raise CommandError("check_query_plans only supports SQLite.")
+        setup_test_environment()
+
+        user = User.objects.filter(username=opts['user']).first()
+        product = Product.objects.order_by('id').first()
+        if user is None or product is None:
+            raise CommandError("Need a user and products; run seed_benchmark_data first.")
+
+        large_tables = self._large_tables(opts['min_rows'])
+        anon, authed = Client(), Client()
+        authed.force_login(user)
+
+        problems = []
+        for name, needs_login, url_for in SCENARIOS:
+            client = authed if needs_login else anon
+            with CaptureQueriesContext(connection) as ctx:
+                client.get(url_for(product))
+
+            for query in ctx.captured_queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                plan = self._plan(sql)
+                if opts['verbose_plans']:
+                    self.stdout.write(f"[{name}] {sql}\n    " + "\n    ".join(plan))
+                for step in plan:
+                    match = FULL_SCAN_RE.match(step)
+                    if not match or match.group(1) not in large_tables:
+                        continue
+                    if (name, match.group(1)) in ALLOWED_SCANS:
+                        continue
+                    problems.append((name, step, sql))
+
+        if problems:
+            for name, step, sql in problems:
+                self.stdout.write(self.style.ERROR(f"[{name}] {step}\n    {sql}"))
+            raise CommandError(f"{len(problems)} full table scan(s) on large tables.")
+        self.stdout.write(self.style.SUCCESS(
+            f"No full scans of large tables ({', '.join(sorted(large_tables)) or 'none over threshold'})."
+        ))
+
+    def _plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+    def _large_tables(self, min_rows):
+        tables = set()
+        with connection.cursor() as cursor:
+            for table in connection.introspection.table_names(cursor):
+                cursor.execute(f'SELECT count(*) FROM "{table}"')
+                if cursor.fetchone()[0] >= min_rows:
+                    tables.add(table)
+        return tables
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from shop import addresses
+
+
+class Command(BaseCommand):
+    help = ("Hash saved addresses, collapsing each user's duplicates into one row and repointing their orders "
+            "(in batches; safe to interrupt and rerun).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help="Users per transaction.")
+        parser.add_argument('--max-batches', type=int, default=None)
+        parser.add_argument('--dry-run', action='store_true', help="Only count what is left to process.")
+
+    def handle(self, *args, **opts):
+        if opts['dry_run']:
+            users, rows = addresses.pending_counts()
+            self.stdout.write(f"{rows:,} unhashed address(es) across {users:,} user(s).")
+            return
+        users, removed = addresses.dedupe(opts['batch_size'], opts['max_batches'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed the addresses of {users:,} user(s); removed {removed:,} duplicate(s)."
+        ))
@@ -0,0 +1,38 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import serviceability
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the pincode serviceability index from a CSV with columns "
+        "pincode[,pincode_end],zone,min_days,max_days,cod."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file')
+        parser.add_argument('--output', default=None, help="Index file (default: PINCODE_INDEX_PATH).")
+        parser.add_argument('--dry-run', action='store_true', help="Validate and report without writing.")
+
+    def handle(self, *args, **opts):
+        try:
+            with open(opts['csv_file'], newline='', encoding='utf-8-sig') as fh:
+                data = serviceability.build(serviceability.read_rules(fh))
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        _, ranges, rules, _ = serviceability.HEADER.unpack_from(data)
+        if opts['dry_run']:
+            self.stdout.write(f"Valid: {ranges:,} range(s), {rules:,} rule(s), {len(data):,} bytes.")
+            return
+
+        path = opts['output'] or serviceability.index_path()
+        serviceability.write_index(data, path)
+        index = serviceability.PincodeIndex(path)  # read it back as the workers will
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {os.fspath(path)}: {index.pincode_count:,} pincode(s) in {index.range_count:,} range(s), "
+            f"{rules:,} rule(s), {len(index.zones)} zone(s), {len(data):,} bytes. "
+            f"Workers pick it up within {serviceability.RELOAD_CHECK_SECONDS}s."
+        ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from shop import maintenance
+
+
+class Command(BaseCommand):
+    help = ("Delete expired/idle anonymous sessions and abandoned carts in small batches, "
+            "then return the freed pages to the filesystem (SQLite incremental VACUUM).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help="Seconds to sleep between batches so live requests get the write lock.")
+        parser.add_argument('--cart-days', type=int, default=maintenance.CART_ABANDON_DAYS,
+                            help="Cart items older than this, of users who have not logged in since.")
+        parser.add_argument('--idle-days', type=int, default=maintenance.ANONYMOUS_IDLE_DAYS,
+                            help="Anonymous sessions not modified for this long.")
+        parser.add_argument('--vacuum-pages', type=int, default=None,
+                            help="Free at most this many pages (default: all free pages).")
+        parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                            help="One-off: switch the database to auto_vacuum=INCREMENTAL (runs a full VACUUM).")
+
+    def handle(self, *args, **opts):
+        if opts['enable_incremental_vacuum']:
+            maintenance.enable_incremental_vacuum()
+            self.stdout.write(self.style.SUCCESS("auto_vacuum set to INCREMENTAL."))
+
+        reclaimed = maintenance.purge_all(opts['batch_size'], opts['pause'], opts['cart_days'], opts['idle_days'])
+        for label, count in reclaimed.items():
+            self.stdout.write(f"{label:<26}{count:>10,} deleted")
+
+        mode, pages = maintenance.incremental_vacuum(opts['vacuum_pages'])
+        if mode is None:
+            return
+        if mode != 2:
+            self.stdout.write(self.style.WARNING(
+                "auto_vacuum is not INCREMENTAL, so freed pages stay in the file for reuse; "
+                "run once with --enable-incremental-vacuum to return them to the filesystem."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Incremental VACUUM returned {pages:,} page(s)."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from shop import shelves
+
+
+class Command(BaseCommand):
+    help = "Rebuild the homepage shelves snapshot (schedule this, e.g. every few minutes)."
+
+    def handle(self, *args, **opts):
+        snapshot = shelves.rebuild()
+        counts = ', '.join(f"{name}: {len(rows)}" for name, rows in snapshot['shelves'].items())
+        self.stdout.write(self.style.SUCCESS(f"Homepage shelves rebuilt ({counts})."))
@@ -0,0 +1,98 @@
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connections
+
+from shop import jobs
+
+logger = logging.getLogger('shop.jobs')
+
+
+def _run(job_id):
+    try:
+        return jobs.run_job(job_id)
+    except Exception:
+        # e.g. the database was busy loading the job; it is requeued once stale
+        logger.exception("Job %s could not be run", job_id)
+        return False
+    finally:
+        close_old_connections()
+
+
+def work_loop(threads, poll_interval, burst, stop, stdout=None):
+    worker = jobs.worker_name()
+    last_maintenance = 0.0
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='job') as pool:
+        while not stop.is_set():
+            now = time.time()
+            try:
+                if now - last_maintenance > poll_interval * 10:
+                    jobs.requeue_stale()
+                    last_maintenance = now
+                jobs.enqueue_periodic(now)
+                claimed = jobs.claim(worker, limit=threads)
+            except DatabaseError:
+                logger.exception("Polling the job queue failed; retrying")
+                stop.wait(poll_interval)
+                continue
+            if claimed:
+                results = list(pool.map(_run, claimed))
+                if stdout:
+                    stdout.write(f"[{worker}] ran {len(results)} job(s), {results.count(False)} failed")
+                continue
+            if burst:
+                break
+            stop.wait(poll_interval)
+    connections.close_all()
+
+
+def _child(threads, poll_interval, burst):
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    work_loop(threads, poll_interval, burst, stop)
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the database queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help="Jobs run concurrently per process.")
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--burst', action='store_true', help="Exit once the queue is empty.")
+
+    def handle(self, *args, **opts):
+        self.stdout.write(f"Worker started with {opts['processes']} process(es) x {opts['threads']} thread(s); "
+                          f"tasks: {', '.join(sorted(jobs.registered_tasks()))}")
+        if opts['processes'] <= 1:
+            stop = threading.Event()
+            signal.signal(signal.SIGTERM, lambda *_: stop.set())
+            try:
+                work_loop(opts['threads'], opts['poll_interval'], opts['burst'], stop, self.stdout)
+            except KeyboardInterrupt:
+                pass
+            return
+
+        # Children must not inherit the parent's open database connections
+        connections.close_all()
+        ctx = multiprocessing.get_context('fork')
+        children = [
+            ctx.Process(target=_child, args=(opts['threads'], opts['poll_interval'], opts['burst']))
+            for _ in range(opts['processes'])
+        ]
+        for child in children:
+            child.start()
+        try:
+            for child in children:
+                child.join()
+        except KeyboardInterrupt:
+            for child in children:
+                child.terminate()
+            for child in children:
+                child.join()
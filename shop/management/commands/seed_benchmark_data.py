@@ -0,0 +1,275 @@
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from shop.models import (
+    Category, Product, ProductImage, VariantType, ProductVariant,
+    Address, Order, OrderItem, Review, CartItem, Wishlist,
+)
+
+# Everything this command creates is tagged with this prefix so that it can
+# be wiped again without touching real catalog data.
+PREFIX = 'bench'
+BENCH_PASSWORD = 'bench-pass'
+
+ADJECTIVES = ['Ultra', 'Pro', 'Smart', 'Classic', 'Neo', 'Prime', 'Eco', 'Turbo', 'Slim', 'Max']
+NOUNS = ['Phone', 'Laptop', 'Monitor', 'Headphones', 'T-Shirt', 'Keyboard', 'Mouse',
+         'Refrigerator', 'Watch', 'Speaker', 'Camera', 'Tablet', 'Charger', 'Shoes']
+VARIANT_VALUES = {
+    'Size': ['S', 'M', 'L', 'XL'],
+    'Color': ['Black', 'White', 'Blue', 'Red'],
+    'Storage': ['128 GB', '256 GB', '512 GB'],
+}
+STATUSES = [s for s, _ in Order.STATUS_CHOICES]
+
+
+def _batched(iterable, size):
+    batch = []
+    for obj in iterable:
+        batch.append(obj)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = "Generate a deterministic synthetic catalog (products, orders, reviews, carts...) for benchmarking."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--variants-per-product', type=int, default=2)
+        parser.add_argument('--images-per-product', type=int, default=2)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--items-per-order', type=int, default=3)
+        parser.add_argument('--reviews', type=int, default=5000)
+        parser.add_argument('--cart-items', type=int, default=5, help="Cart items per user.")
+        parser.add_argument('--wishlist-items', type=int, default=5, help="Wishlist items per user.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--clear', action='store_true', help="Delete previously seeded benchmark data first.")
+
+    def handle(self, *args, **opts):
+        self.rng = random.Random(opts['seed'])
+        self.batch_size = opts['batch_size']
+
+        if opts['clear']:
+            self._clear()
+
+        started = time.perf_counter()
+        categories = self._categories(opts['categories'])
+        product_ids = self._products(categories, opts['products'])
+        self._images(product_ids, opts['images_per_product'])
+        variant_ids = self._variants(product_ids, opts['variants_per_product'])
+        user_ids = self._users(opts['users'])
+        address_ids = self._addresses(user_ids)
+        self._orders(user_ids, address_ids, product_ids, opts['orders'], opts['items_per_order'])
+        self._reviews(user_ids, product_ids, opts['reviews'])
+        self._carts(user_ids, product_ids, variant_ids, opts['cart_items'])
+        self._wishlists(user_ids, product_ids, opts['wishlist_items'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Benchmark data seeded in {time.perf_counter() - started:.1f}s "
+            f"(login as {PREFIX}_user_0 / {BENCH_PASSWORD})."
+        ))
+
+    # ---------------- HELPERS ----------------
+    def _log(self, label, count):
+        self.stdout.write(f"  {label:<12} {count:>10,}")
+
+    def _bulk(self, model, objs):
+        count = 0
+        for batch in _batched(objs, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            count += len(batch)
+        return count
+
+    def _clear(self):
+        self.stdout.write("Clearing previous benchmark data...")
+        with transaction.atomic():
+            Order.objects.filter(order_id__startswith=PREFIX.upper()).delete()
+            User.objects.filter(username__startswith=f"{PREFIX}_user_").delete()
+            Product.objects.filter(slug__startswith=f"{PREFIX}-").delete()
+            Category.objects.filter(slug__startswith=f"{PREFIX}-").delete()
+
+    # ---------------- CATALOG ----------------
+    def _categories(self, n):
+        objs = [
+            Category(name=f"Bench {NOUNS[i % len(NOUNS)]} {i}", slug=f"{PREFIX}-cat-{i}", icon='bi-tag')
+            for i in range(n)
+        ]
+        self._log('categories', self._bulk(Category, objs))
+        return list(Category.objects.filter(slug__startswith=f"{PREFIX}-cat-").order_by('id'))
+
+    def _products(self, categories, n):
+        rng = self.rng
+
+        def gen():
+            for i in range(n):
+                name = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}"
+                yield Product(
+                    category=categories[i % len(categories)],
+                    name=name,
+                    slug=f"{PREFIX}-product-{i}",
+                    short_description=f"{name} short description",
+                    description=f"{name} with a long description. " * 8,
+                    price=Decimal(rng.randint(99, 99999)),
+                    stock=rng.randint(0, 500),
+                    image='products/cpu.webp',
+                    rating=round(rng.uniform(2.5, 5.0), 1),
+                    is_hot_deal=rng.random() < 0.05,
+                    is_top_deal=rng.random() < 0.05,
+                )
+
+        self._log('products', self._bulk(Product, gen()))
+        return list(
+            Product.objects.filter(slug__startswith=f"{PREFIX}-product-")
+            .order_by('id').values_list('id', flat=True)
+        )
+
+    def _images(self, product_ids, per_product):
+        objs = (
+            ProductImage(product_id=pid, image='products/extra/refrigirator.webp', is_primary=(j == 0))
+            for pid in product_ids for j in range(per_product)
+        )
+        self._log('images', self._bulk(ProductImage, objs))
+
+    def _variants(self, product_ids, per_product):
+        if not per_product:
+            return {}
+        types = [VariantType.objects.get_or_create(name=name)[0] for name in VARIANT_VALUES]
+        rng = self.rng
+
+        def gen():
+            for pid in product_ids:
+                vtype = types[pid % len(types)]
+                values = VARIANT_VALUES[vtype.name]
+                for j in range(per_product):
+                    yield ProductVariant(
+                        product_id=pid,
+                        variant_type=vtype,
+                        value=values[j % len(values)],
+                        price=Decimal(rng.randint(99, 99999)),
+                        stock=rng.randint(0, 100),
+                    )
+
+        self._log('variants', self._bulk(ProductVariant, gen()))
+        variant_ids = {}
+        rows = ProductVariant.objects.filter(product_id__in=product_ids).values_list('product_id', 'id')
+        for pid, vid in rows.iterator():
+            variant_ids.setdefault(pid, vid)
+        return variant_ids
+
+    # ---------------- USERS ----------------
+    def _users(self, n):
+        # Hash once: hashing per user would dominate the seeding time.
+        password = make_password(BENCH_PASSWORD)
+        objs = (
+            User(username=f"{PREFIX}_user_{i}", email=f"{PREFIX}{i}@example.com", password=password)
+            for i in range(n)
+        )
+        self._log('users', self._bulk(User, objs))
+        return list(
+            User.objects.filter(username__startswith=f"{PREFIX}_user_")
+            .order_by('id').values_list('id', flat=True)
+        )
+
+    def _addresses(self, user_ids):
+        objs = (
+            Address(
+                user_id=uid, full_name=f"Bench User {i}", phone='9999999999',
+                email=f"{PREFIX}{i}@example.com", pincode=str(110001 + i % 800),
+                address_line=f"{i} Benchmark Road", flat_house_no=str(i), is_default=True,
+            )
+            for i, uid in enumerate(user_ids)
+        )
+        self._log('addresses', self._bulk(Address, objs))
+        return dict(Address.objects.filter(user_id__in=user_ids).values_list('user_id', 'id'))
+
+    # ---------------- ORDERS ----------------
+    def _orders(self, user_ids, address_ids, product_ids, n, items_per_order):
+        rng = self.rng
+        orders_done = items_done = 0
+        sequence = iter(range(n))
+        while True:
+            # Orders and their items are created batch by batch so that even
+            # millions of rows never sit in memory at once.
+            batch = []
+            for i in sequence:
+                uid = user_ids[i % len(user_ids)]
+                batch.append(Order(
+                    user_id=uid,
+                    address_id=address_ids.get(uid),
+                    order_id=f"{PREFIX.upper()}{i:010d}",
+                    total_amount=Decimal('0.00'),
+                    status=rng.choice(STATUSES),
+                ))
+                if len(batch) >= self.batch_size:
+                    break
+            if not batch:
+                break
+
+            with transaction.atomic():
+                Order.objects.bulk_create(batch)
+                items = []
+                for order in batch:
+                    total = Decimal('0.00')
+                    for _ in range(rng.randint(1, items_per_order)):
+                        price = Decimal(rng.randint(99, 99999))
+                        qty = rng.randint(1, 3)
+                        total += price * qty
+                        items.append(OrderItem(
+                            order_id=order.pk, product_id=rng.choice(product_ids),
+                            quantity=qty, price=price,
+                        ))
+                    order.total_amount = total
+                OrderItem.objects.bulk_create(items)
+                Order.objects.bulk_update(batch, ['total_amount'])
+
+            orders_done += len(batch)
+            items_done += len(items)
+        self._log('orders', orders_done)
+        self._log('order items', items_done)
+
+    def _pairs(self, user_ids, product_ids, n, offset=0):
+        # Deterministic, collision-free (user, product) pairs for the
+        # unique_together constraints on reviews, carts and wishlists.
+        n = min(n, len(user_ids) * len(product_ids))
+        for i in range(n):
+            uid = user_ids[i % len(user_ids)]
+            pid = product_ids[(i // len(user_ids) + offset) % len(product_ids)]
+            yield uid, pid
+
+    def _reviews(self, user_ids, product_ids, n):
+        rng = self.rng
+        objs = (
+            Review(
+                product_id=pid, user_id=uid, rating=rng.randint(1, 5),
+                comment=f"Benchmark review {i}: " + "great value " * rng.randint(1, 10),
+            )
+            for i, (uid, pid) in enumerate(self._pairs(user_ids, product_ids, n))
+        )
+        self._log('reviews', self._bulk(Review, objs))
+
+    def _carts(self, user_ids, product_ids, variant_ids, per_user):
+        objs = (
+            CartItem(user_id=uid, product_id=pid, variant_id=variant_ids.get(pid), quantity=1 + pid % 3)
+            for uid, pid in self._pairs(user_ids, product_ids, per_user * len(user_ids), offset=7)
+        )
+        self._log('cart items', self._bulk(CartItem, objs))
+
+    def _wishlists(self, user_ids, product_ids, per_user):
+        objs = (
+            Wishlist(user_id=uid, product_id=pid)
+            for uid, pid in self._pairs(user_ids, product_ids, per_user * len(user_ids), offset=13)
+        )
+        self._log('wishlist', self._bulk(Wishlist, objs))
@@ -0,0 +1,288 @@
+"""
+Request metrics in Prometheus text format, aggregated across workers.
+
+``MetricsMiddleware`` records per view (URL name):
+
+* request latency as a histogram (``LATENCY_BUCKETS``), by method,
+* requests by status code,
+* database queries and time spent in them,
+* template render time (through ``InstrumentedTemplates``, the template
+  backend configured in settings).
+
+Each worker adds to in-memory counters and folds them into a small shared
+SQLite file (``METRICS_DIR``) every ``FLUSH_SECONDS`` with ``value = value +
+delta`` upserts, together with the growth of the cache backend's hit/miss
+counters. ``/metrics`` flushes its own worker and renders the shared totals,
+so any worker can answer a scrape. Alert on p95 with e.g.
+``histogram_quantile(0.95, sum by (le, view) (rate(shop_request_duration_seconds_bucket[5m])))``.
+
+Queries slower than ``SLOW_QUERY_MS`` are written, with the view that issued
+them, to the ``shop.slow_queries`` logger, which logs to a rotating file
+(``SLOW_QUERY_LOG``) unless LOGGING gives it handlers of its own.
+"""
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+FLUSH_SECONDS = 5
+UNRESOLVED = '<unresolved>'
+
+# name -> (type, help); histograms also get _bucket/_sum/_count samples
+FAMILIES = {
+    'shop_request_duration_seconds': ('histogram', "Request latency by view and method."),
+    'shop_requests_total': ('counter', "Requests by view and status code."),
+    'shop_db_queries_total': ('counter', "Database queries by view."),
+    'shop_db_query_seconds_total': ('counter', "Time spent in database queries by view."),
+    'shop_template_render_seconds_total': ('counter', "Time spent rendering templates by view."),
+    'shop_cache_operations_total': ('counter', "Cache lookups by result (local_hits, shared_hits, misses, ...)."),
+}
+SUFFIXES = ('_bucket', '_sum', '_count')
+
+slow_query_logger = logging.getLogger('shop.slow_queries')
+
+_request = threading.local()
+_pending = defaultdict(float)  # (name, labels, le) -> delta
+_pending_lock = threading.Lock()
+_state = {'flushed': time.monotonic(), 'cache_stats': {}, 'store': None, 'log_ready': False}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items()))
+
+
+def _format_le(le):
+    return '+Inf' if le == math.inf else repr(le)
+
+
+# ---------------- SHARED STORE ----------------
+class _Store:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def db(self):
+        if getattr(self._local, 'pid', None) != os.getpid():
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS samples (name TEXT NOT NULL, labels TEXT NOT NULL, "
+                "le REAL NOT NULL DEFAULT -1, value REAL NOT NULL, PRIMARY KEY (name, labels, le))"
+            )
+            self._local.db, self._local.pid = db, os.getpid()
+        return self._local.db
+
+    def add(self, deltas):
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(
+                "INSERT INTO samples (name, labels, le, value) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (name, labels, le) DO UPDATE SET value = value + excluded.value",
+                [(name, labels, -1 if le is None else le, value) for (name, labels, le), value in deltas],
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def rows(self):
+        return self.db.execute("SELECT name, labels, le, value FROM samples").fetchall()
+
+    def clear(self):
+        self.db.execute("DELETE FROM samples")
+
+
+def _store():
+    if _state['store'] is None:
+        directory = os.fspath(getattr(settings, 'METRICS_DIR', settings.BASE_DIR / 'var' / 'metrics'))
+        os.makedirs(directory, exist_ok=True)
+        _state['store'] = _Store(os.path.join(directory, 'metrics.sqlite3'))
+    return _state['store']
+
+
+# ---------------- RECORDING ----------------
+def _add(name, labels, value, le=None):
+    _pending[(name, labels, le)] += value
+
+
+def observe_request(view, method, status, seconds, queries, query_seconds, template_seconds):
+    labels = _labels(view=view, method=method)
+    view_labels = _labels(view=view)
+    with _pending_lock:
+        for le in LATENCY_BUCKETS:
+            # Every bucket gets a sample, so a new series starts out complete
+            _add('shop_request_duration_seconds_bucket', labels, 1 if seconds <= le else 0, le)
+        _add('shop_request_duration_seconds_sum', labels, seconds)
+        _add('shop_request_duration_seconds_count', labels, 1)
+        _add('shop_requests_total', _labels(view=view, status=status), 1)
+        _add('shop_db_queries_total', view_labels, queries)
+        _add('shop_db_query_seconds_total', view_labels, query_seconds)
+        _add('shop_template_render_seconds_total', view_labels, template_seconds)
+
+
+def _cache_deltas():
+    backend = caches['default']
+    if not hasattr(backend, 'stats'):
+        return []
+    stats = backend.stats()
+    last, deltas = _state['cache_stats'], []
+    for result in ('local_hits', 'shared_hits', 'misses', 'stale', 'evictions'):
+        if result in stats:
+            delta = stats[result] - last.get(result, 0)
+            if delta:
+                deltas.append((('shop_cache_operations_total', _labels(result=result), None), delta))
+            last[result] = stats[result]
+    return deltas
+
+
+def flush(force=False):
+    """Fold this worker's counters into the shared store (at most every FLUSH_SECONDS unless forced)."""
+    now = time.monotonic()
+    if not force and now - _state['flushed'] < FLUSH_SECONDS:
+        return
+    with _pending_lock:
+        if not force and now - _state['flushed'] < FLUSH_SECONDS:
+            return
+        _state['flushed'] = now
+        deltas = list(_pending.items()) + _cache_deltas()
+        _pending.clear()
+    if deltas:
+        _store().add(deltas)
+
+
+def _family(name):
+    for suffix in SUFFIXES:
+        if name.endswith(suffix) and name[:-len(suffix)] in FAMILIES:
+            return name[:-len(suffix)]
+    return name
+
+
+def render():
+    """The shared totals in Prometheus text exposition format."""
+    families = defaultdict(list)
+    for name, labels, le, value in _store().rows():
+        family = _family(name)
+        # Series by series; within a histogram series: buckets by le, then _sum, _count
+        order = SUFFIXES.index(name[len(family):]) if name != family else 0
+        families[family].append(((labels, order, le), name, labels, le, value))
+
+    lines = []
+    for family in sorted(families):
+        kind, help_text = FAMILIES.get(family, ('untyped', ''))
+        lines.append(f"# HELP {family} {help_text}")
+        lines.append(f"# TYPE {family} {kind}")
+        for _, name, labels, le, value in sorted(families[family], key=lambda sample: sample[0]):
+            if le >= 0:
+                labels = ','.join(filter(None, (labels, f'le="{_format_le(le)}"')))
+            lines.append(f"{name}{{{labels}}} {value!r}" if labels else f"{name} {value!r}")
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _pending_lock:
+        _pending.clear()
+    _store().clear()
+
+
+# ---------------- SLOW QUERIES ----------------
+def _slow_query_log():
+    if not _state['log_ready']:
+        if not slow_query_logger.handlers:
+            path = os.fspath(getattr(settings, 'SLOW_QUERY_LOG', settings.BASE_DIR / 'var' / 'log' / 'slow_queries.log'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            handler = RotatingFileHandler(path, maxBytes=5 * 1024 * 1024, backupCount=5, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s pid=%(process)d %(message)s'))
+            slow_query_logger.addHandler(handler)
+            slow_query_logger.setLevel(logging.WARNING)
+            slow_query_logger.propagate = False
+        _state['log_ready'] = True
+    return slow_query_logger
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.view_name if match else None) or UNRESOLVED
+
+
+class _QueryTimer:
+    def __init__(self, request, slow_seconds):
+        self.request = request
+        self.slow_seconds = slow_seconds
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            if elapsed >= self.slow_seconds:
+                _slow_query_log().warning(
+                    "%.1fms view=%s path=%s sql=%s", elapsed * 1000, _view_name(self.request),
+                    self.request.path, ' '.join(sql.split())[:4000],
+                )
+
+
+# ---------------- MIDDLEWARE / TEMPLATES ----------------
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_seconds = getattr(settings, 'SLOW_QUERY_MS', 250) / 1000
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        timer = _QueryTimer(request, self.slow_seconds)
+        _request.template_seconds = 0.0
+        wrappers = [conn.execute_wrapper(timer) for conn in connections.all()]
+        for wrapper in wrappers:
+            wrapper.__enter__()
+        try:
+            response = self.get_response(request)
+        finally:
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+        observe_request(
+            _view_name(request), request.method, response.status_code, time.perf_counter() - started,
+            timer.count, timer.seconds, _request.template_seconds,
+        )
+        flush()
+        return response
+
+
+class _TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            _request.template_seconds = getattr(_request, 'template_seconds', 0.0) + time.perf_counter() - start
+
+
+class InstrumentedTemplates(DjangoTemplates):
+    """The Django template backend, timing each top-level render for MetricsMiddleware."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return _TimedTemplate(template.template, self)
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_default_coupons(apps, schema_editor):
+    # The codes that used to be hard-coded in cart_view
+    Coupon = apps.get_model('shop', 'Coupon')
+    Coupon.objects.get_or_create(code='NEO10', defaults={
+        'description': 'Get 10% OFF on your cart total.',
+        'discount_type': 'percent',
+        'value': 10,
+    })
+    Coupon.objects.get_or_create(code='FLAT100', defaults={
+        'description': 'Save ₹100 instantly.',
+        'discount_type': 'flat',
+        'value': 100,
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_alter_cartitem_unique_together_cartitem_variant_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Coupon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=40, unique=True)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('discount_type', models.CharField(choices=[('percent', 'Percentage'), ('flat', 'Flat amount')], default='percent', max_length=10)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('max_discount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('min_order_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('starts_at', models.DateTimeField(blank=True, null=True)),
+                ('ends_at', models.DateTimeField(blank=True, null=True)),
+                ('usage_limit', models.PositiveIntegerField(blank=True, help_text='Total redemptions allowed (empty = unlimited)', null=True)),
+                ('per_user_limit', models.PositiveIntegerField(blank=True, help_text='Redemptions allowed per user (empty = unlimited)', null=True)),
+                ('used_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('auto_apply', models.BooleanField(default=False, help_text='Apply automatically when no code is entered')),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('categories', models.ManyToManyField(blank=True, related_name='coupons', to='shop.category')),
+                ('variants', models.ManyToManyField(blank=True, related_name='coupons', to='shop.productvariant')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CouponRedemption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('coupon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='redemptions', to='shop.coupon')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='coupon_redemptions', to='shop.order')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coupon_redemptions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['coupon', 'user'], name='shop_coupon_coupon__e6c9e7_idx')],
+            },
+        ),
+        migrations.RunPython(create_default_coupons, migrations.RunPython.noop),
+    ]
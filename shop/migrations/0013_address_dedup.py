@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:11
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def keep_newest_default(apps, schema_editor):
+    # Checkout used to mark every new address as default; keep the latest one
+    Address = apps.get_model('shop', 'Address')
+    users = (
+        Address.objects.filter(is_default=True).values('user_id')
+        .annotate(n=Count('id'), newest=Max('id')).filter(n__gt=1).values_list('newest', 'user_id')
+    )
+    for newest, user_id in list(users):
+        Address.objects.filter(user_id=user_id, is_default=True).exclude(pk=newest).update(is_default=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_requestprofile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='address',
+            name='address_user_default_idx',
+        ),
+        migrations.AddField(
+            model_name='address',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='address',
+            constraint=models.UniqueConstraint(condition=models.Q(('content_hash', ''), _negated=True), fields=('user', 'content_hash'), name='address_user_content_unique'),
+        ),
+        migrations.RunPython(keep_newest_default, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='address',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_default', True)), fields=('user',), name='address_one_default_per_user'),
+        ),
+    ]
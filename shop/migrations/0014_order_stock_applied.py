@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:23
+
+from django.db import migrations, models
+
+
+def mark_applied_orders(apps, schema_editor):
+    # Orders whose stock job already finished must not be decremented again
+    Job = apps.get_model('shop', 'Job')
+    Order = apps.get_model('shop', 'Order')
+    done = Job.objects.filter(name='tasks.apply_order_stock', status='done').values_list('payload', flat=True)
+    order_ids = [payload['order_id'] for payload in done.iterator() if payload and 'order_id' in payload]
+    for start in range(0, len(order_ids), 500):
+        Order.objects.filter(pk__in=order_ids[start:start + 500]).update(stock_applied=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_address_dedup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_applied',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(mark_applied_orders, migrations.RunPython.noop),
+    ]
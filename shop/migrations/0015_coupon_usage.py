@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_past_redemptions(apps, schema_editor):
+    CouponRedemption = apps.get_model('shop', 'CouponRedemption')
+    CouponUsage = apps.get_model('shop', 'CouponUsage')
+    counts = CouponRedemption.objects.values('coupon_id', 'user_id').annotate(n=Count('id')).order_by()
+    CouponUsage.objects.bulk_create(
+        [CouponUsage(coupon_id=row['coupon_id'], user_id=row['user_id'], used=row['n']) for row in counts.iterator()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_order_stock_applied'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CouponUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('used', models.PositiveIntegerField(default=0)),
+                ('coupon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usages', to='shop.coupon')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coupon_usages', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'coupon'), name='coupon_usage_user_coupon_unique')],
+            },
+        ),
+        migrations.RunPython(count_past_redemptions, migrations.RunPython.noop),
+    ]
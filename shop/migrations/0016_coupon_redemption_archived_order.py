@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0015_coupon_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='couponredemption',
+            name='archived_order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='coupon_redemptions', to='shop.archivedorder'),
+        ),
+    ]
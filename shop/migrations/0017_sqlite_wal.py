@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-19 14:05
+
+from django.db import migrations
+
+
+def use_wal(apps, schema_editor):
+    # WAL is stored in the database file, so switching once is enough; running
+    # the pragma on every connection rewrote the file header each time.
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+
+
+def use_rollback_journal(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=DELETE")
+
+
+class Migration(migrations.Migration):
+    # journal_mode can't be changed inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('shop', '0016_coupon_redemption_archived_order'),
+    ]
+
+    operations = [
+        migrations.RunPython(use_wal, use_rollback_journal),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -26,6 +27,16 @@ class Product(models.Model):
     is_top_deal = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # home: hot/top deal shelves. Partial indexes, because SQLite
+            # can't use a plain index for Django's bare "WHERE is_hot_deal".
+            models.Index(fields=['-created_at'], condition=models.Q(is_hot_deal=True), name='product_hot_deal_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(is_top_deal=True), name='product_top_deal_idx'),
+            # home "latest products", product_list ordering
+            models.Index(fields=['-created_at'], name='product_created_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -40,6 +51,21 @@ class Address(models.Model):
     landmark = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     is_default = models.BooleanField(default=False)
+    # Normalized fields (shop/addresses.py); '' until dedupe_addresses has run over the row
+    content_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+
+    class Meta:
+        constraints = [
+            # checkout reuses an existing address instead of inserting a copy
+            models.UniqueConstraint(
+                fields=['user', 'content_hash'], condition=~models.Q(content_hash=''),
+                name='address_user_content_unique',
+            ),
+            # checkout: default address prefill
+            models.UniqueConstraint(
+                fields=['user'], condition=models.Q(is_default=True), name='address_one_default_per_user',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.full_name} - {self.address_line}"
@@ -57,6 +83,18 @@ class Order(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Status the sales rollups currently count this order under ('' = not yet)
+    rollup_status = models.CharField(max_length=20, blank=True, editable=False)
+    # Set in the same transaction as the stock decrement, so a retried job can't apply it twice
+    stock_applied = models.BooleanField(default=False, editable=False)
+
+    class Meta:
+        indexes = [
+            # my_orders / dashboard: a user's orders, newest first
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+            # dashboard: delivered / pending counts
+            models.Index(fields=['user', 'status'], name='order_user_status_idx'),
+        ]
 
     def __str__(self):
         return self.order_id
@@ -70,6 +108,41 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.product} x {self.quantity}"
     
+# ---------------- ORDER ARCHIVE ----------------
+# Delivered/cancelled orders older than ORDER_ARCHIVE_AFTER_DAYS are moved
+# here by shop.archive so Order/OrderItem only hold recent activity. Rows
+# keep their original primary keys.
+class ArchivedOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    address = models.ForeignKey(Address, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    order_id = models.CharField(max_length=20, unique=True)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # my_orders: a user's older orders, newest first
+            models.Index(fields=['user', '-created_at'], name='archived_order_user_idx'),
+        ]
+
+    def __str__(self):
+        return self.order_id
+
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name='+')
+    quantity = models.PositiveIntegerField(default=1)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.product} x {self.quantity}"
+
+
 class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -79,6 +152,10 @@ class Review(models.Model):
 
     class Meta:
         unique_together = ('product', 'user')  # only one review per user
+        indexes = [
+            # product_detail: newest reviews of a product
+            models.Index(fields=['product', '-created_at'], name='review_product_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.product.name}"
@@ -161,3 +238,167 @@ class ProductVariant(models.Model):
 
     def __str__(self):
         return f"{self.product.name} - {self.variant_type.name}: {self.value}"
+
+
+class Coupon(models.Model):
+    DISCOUNT_CHOICES = [
+        ('percent', 'Percentage'),
+        ('flat', 'Flat amount'),
+    ]
+    code = models.CharField(max_length=40, unique=True)
+    description = models.CharField(max_length=255, blank=True)
+    discount_type = models.CharField(max_length=10, choices=DISCOUNT_CHOICES, default='percent')
+    value = models.DecimalField(max_digits=10, decimal_places=2)
+    max_discount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    min_order_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Targeting: when set, only matching cart lines count towards the discount
+    categories = models.ManyToManyField(Category, blank=True, related_name='coupons')
+    variants = models.ManyToManyField(ProductVariant, blank=True, related_name='coupons')
+    starts_at = models.DateTimeField(null=True, blank=True)
+    ends_at = models.DateTimeField(null=True, blank=True)
+    usage_limit = models.PositiveIntegerField(null=True, blank=True, help_text="Total redemptions allowed (empty = unlimited)")
+    per_user_limit = models.PositiveIntegerField(null=True, blank=True, help_text="Redemptions allowed per user (empty = unlimited)")
+    used_count = models.PositiveIntegerField(default=0, editable=False)
+    auto_apply = models.BooleanField(default=False, help_text="Apply automatically when no code is entered")
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def clean(self):
+        # Entered codes are upper-cased before lookup (promotions.normalize_code);
+        # done before validate_unique, so the admin reports "save10" vs "SAVE10"
+        self.code = (self.code or '').strip().upper()
+
+    def save(self, *args, **kwargs):
+        self.code = self.code.strip().upper()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.code
+
+
+class CouponRedemption(models.Model):
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name='redemptions')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='coupon_redemptions')
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='coupon_redemptions')
+    # Set when the order is archived (``order`` is then NULL)
+    archived_order = models.ForeignKey(ArchivedOrder, on_delete=models.SET_NULL, null=True, blank=True,
+                                       related_name='coupon_redemptions')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['coupon', 'user'])]
+
+    def __str__(self):
+        return f"{self.coupon.code} - {self.user.username}"
+
+
+class CouponUsage(models.Model):
+    """Per-user redemption counter, claimed with a conditional UPDATE so per_user_limit holds under concurrency."""
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name='usages')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='coupon_usages')
+    used = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'coupon'], name='coupon_usage_user_coupon_unique')]
+
+    def __str__(self):
+        return f"{self.coupon.code} - {self.user.username}: {self.used}"
+
+
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    # Enqueueing twice with the same key is a no-op
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # worker: next due jobs
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+# ---------------- SALES ROLLUPS ----------------
+# Maintained by shop.rollups; never edited by hand.
+class DailyProductSales(models.Model):
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name='+')
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day', 'product'], name='daily_product_sales_uniq')]
+
+    def __str__(self):
+        return f"{self.day} product {self.product_id}: {self.units}"
+
+
+class DailyCategorySales(models.Model):
+    day = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='+')
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day', 'category'], name='daily_category_sales_uniq')]
+
+    def __str__(self):
+        return f"{self.day} category {self.category_id}: {self.units}"
+
+
+class DailyStatusSales(models.Model):
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day', 'status'], name='daily_status_sales_uniq')]
+
+    def __str__(self):
+        return f"{self.day} {self.status}: {self.orders}"
+
+
+class RequestProfile(models.Model):
+    """One profiled request (see shop.profiling); the .pstats/.folded files live in PROFILER_DIR."""
+    TRIGGER_CHOICES = [
+        ('param', 'Query parameter'),
+        ('header', 'Header'),
+        ('sample', 'Random sample'),
+    ]
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    status_code = models.PositiveSmallIntegerField()
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField(default=0)
+    sql_ms = models.FloatField(default=0)
+    samples = models.PositiveIntegerField(default=0)
+    sql_timeline = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
@@ -0,0 +1,146 @@
+"""
+Order ID generator.
+
+IDs are 64-bit Snowflake-style integers rendered as 13 Crockford base32
+characters (e.g. ``0CHZ3M8Q0A02F``):
+
+    41 bits  milliseconds since ORDER_ID_EPOCH (good for ~69 years)
+    10 bits  worker id (0-1023)
+    12 bits  per-millisecond sequence (4096 IDs/ms per worker)
+
+Fixed-width base32 sorts the same way as the integer, so IDs are unique,
+increase monotonically and are appended to the end of the ``order_id`` index
+instead of landing on random B-tree pages.
+
+Worker ids are unique per host without a central lock: every process claims
+the lowest free slot by taking an exclusive ``flock`` on one of 1024 slot
+files (released by the OS when the process exits), and inside a process a
+thread lock guards the sequence, so IDs generated on one host never collide.
+Hosts sharing a database must be given disjoint ranges: the worker id is
+``ORDER_ID_WORKER_ID`` (a per-host base offset, e.g. 0, 64, 128, ...) plus
+the local slot. As a last line of defence ``create_order`` retries the insert
+with a fresh ID if ``order_id`` ever collides.
+"""
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+ORDER_ID_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKERS = 1 << WORKER_BITS
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+ID_LENGTH = 13
+
+CROCKFORD = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+_EPOCH_MS = int(ORDER_ID_EPOCH.timestamp() * 1000)
+_lock = threading.Lock()
+_state = {'pid': None, 'worker_id': None, 'lock_file': None, 'last_ms': -1, 'sequence': 0}
+
+
+def encode(value):
+    chars = []
+    for _ in range(ID_LENGTH):
+        value, rem = divmod(value, 32)
+        chars.append(CROCKFORD[rem])
+    return ''.join(reversed(chars))
+
+
+def decode(order_id):
+    value = 0
+    for ch in order_id.upper():
+        value = value * 32 + CROCKFORD.index(ch)
+    return value
+
+
+def parse(order_id):
+    """Split an order ID into ``(created_at, worker_id, sequence)``."""
+    value = decode(order_id)
+    ms = (value >> (WORKER_BITS + SEQUENCE_BITS)) + _EPOCH_MS
+    worker_id = (value >> SEQUENCE_BITS) & (MAX_WORKERS - 1)
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc), worker_id, value & MAX_SEQUENCE
+
+
+def _claim_slot():
+    """This process's slot on this host (lowest free one), and the open lock file holding it."""
+    if fcntl is None:
+        return os.getpid() % MAX_WORKERS, None
+    lock_dir = getattr(settings, 'ORDER_ID_LOCK_DIR', None) or os.path.join(tempfile.gettempdir(), 'neomart-order-ids')
+    os.makedirs(lock_dir, exist_ok=True)
+    for slot in range(MAX_WORKERS):
+        fh = open(os.path.join(lock_dir, f'worker-{slot}.lock'), 'a')
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            continue
+        return slot, fh
+    raise RuntimeError("All order ID worker slots are in use.")
+
+
+def _claim_worker_id():
+    # Inherited by every worker on the host, so it can only be an offset
+    base = int(os.environ.get('ORDER_ID_WORKER_ID') or getattr(settings, 'ORDER_ID_WORKER_ID', 0) or 0)
+    slot, lock_file = _claim_slot()
+    return (base + slot) % MAX_WORKERS, lock_file
+
+
+def _ensure_worker():
+    pid = os.getpid()
+    if _state['pid'] != pid:
+        # First use, or we are in a freshly forked child: the parent's slot
+        # lock is not ours to rely on, so claim a new one.
+        worker_id, lock_file = _claim_worker_id()
+        _state.update(pid=pid, worker_id=worker_id, lock_file=lock_file, last_ms=-1, sequence=0)
+    return _state['worker_id']
+
+
+def next_id_int():
+    with _lock:
+        worker_id = _ensure_worker()
+        now_ms = int(time.time() * 1000) - _EPOCH_MS
+        last_ms = _state['last_ms']
+        if now_ms > last_ms:
+            _state['last_ms'], _state['sequence'] = now_ms, 0
+        else:
+            # Same millisecond, or the wall clock stepped backwards: keep
+            # counting on the last timestamp, borrowing the next millisecond
+            # when the sequence runs out.
+            sequence = _state['sequence'] + 1
+            if sequence > MAX_SEQUENCE:
+                _state['last_ms'], sequence = last_ms + 1, 0
+            _state['sequence'] = sequence
+        return (_state['last_ms'] << (WORKER_BITS + SEQUENCE_BITS)) | (worker_id << SEQUENCE_BITS) | _state['sequence']
+
+
+def new_order_id():
+    """A new unique, time-ordered order ID (13 characters)."""
+    return encode(next_id_int())
+
+
+def create_order(attempts=3, **fields):
+    """
+    ``Order.objects.create(order_id=<new id>, **fields)``, retried with a
+    fresh ID if the ``order_id`` is taken (hosts misconfigured with
+    overlapping worker ranges). Call inside a transaction.
+    """
+    from .models import Order
+
+    for attempt in range(1, attempts + 1):
+        try:
+            with transaction.atomic():
+                return Order.objects.create(order_id=new_order_id(), **fields)
+        except IntegrityError:
+            if attempt == attempts:
+                raise
@@ -0,0 +1,44 @@
+from decimal import Decimal
+
+from . import promotions
+
+BULK_DISCOUNT_MIN_ITEMS = 5
+BULK_DISCOUNT_RATE = Decimal('0.20')
+GST_RATE = Decimal('0.18')
+
+
+def cart_totals(cart_items, user=None, coupon_code=''):
+    """
+    Price a cart. Shared by cart_view and checkout so both always agree on
+    the bulk discount and on which coupon/promotion applies.
+    """
+    items = list(cart_items)
+    subtotal = sum((item.subtotal for item in items), Decimal('0.00'))
+    total_items = sum(item.quantity for item in items)
+
+    # Bulk discount (20% if more than 5 items)
+    bulk_discount = Decimal('0.00')
+    if total_items > BULK_DISCOUNT_MIN_ITEMS:
+        bulk_discount = (subtotal * BULK_DISCOUNT_RATE).quantize(promotions.CENT)
+    amount_after_bulk = max(subtotal - bulk_discount, Decimal('0.00'))
+
+    lines = [(item.product.category_id, item.variant_id, item.subtotal) for item in items]
+    promotion, coupon_discount, coupon_error = promotions.evaluate(
+        lines, amount_after_bulk, user=user, code=coupon_code,
+    )
+
+    total_before_gst = max(amount_after_bulk - coupon_discount, Decimal('0.00'))
+    gst_estimate = (total_before_gst * GST_RATE).quantize(promotions.CENT)
+
+    return {
+        'items': items,
+        'subtotal': subtotal,
+        'total_items': total_items,
+        'bulk_discount': bulk_discount,
+        'promotion': promotion,
+        'coupon_discount': coupon_discount,
+        'coupon_error': coupon_error,
+        'total_before_gst': total_before_gst,
+        'gst_estimate': gst_estimate,
+        'grand_total': total_before_gst + gst_estimate,
+    }
@@ -0,0 +1,206 @@
+"""
+Opt-in per-request profiler.
+
+A request is profiled when a staff user adds ``?_profile=1`` (or sends an
+``X-Profile: 1`` header), or when it is picked by random sampling at
+``PROFILER_SAMPLE_RATE``. For that request only:
+
+* cProfile records every call (saved as a ``.pstats`` file),
+* a sampler thread records the request thread's stack every
+  ``PROFILER_INTERVAL`` seconds (saved as collapsed stacks, the input format
+  of flamegraph.pl / speedscope),
+* a database execute wrapper records the SQL timeline.
+
+The result is a ``RequestProfile`` row, browsable in the admin. Requests that
+are not profiled only pay for a couple of dictionary lookups.
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+
+QUERY_PARAM = '_profile'
+HEADER = 'HTTP_X_PROFILE'
+MAX_SQL_LENGTH = 2000
+
+# sys.setswitchinterval() is process-wide and requests overlap in threaded servers
+_switch_lock = threading.Lock()
+_switch_users = 0
+_switch_default = None
+
+
+def profile_dir():
+    return os.fspath(getattr(settings, 'PROFILER_DIR', settings.BASE_DIR / 'var' / 'profiles'))
+
+
+def shorten_switch_interval(interval):
+    """Let sampler threads get the GIL every ``interval``; undo with restore_switch_interval()."""
+    global _switch_users, _switch_default
+    with _switch_lock:
+        if _switch_users == 0:
+            _switch_default = sys.getswitchinterval()
+        _switch_users += 1
+        sys.setswitchinterval(min(sys.getswitchinterval(), interval))
+
+
+def restore_switch_interval():
+    """Put the original interval back once the last profiled request has finished."""
+    global _switch_users
+    with _switch_lock:
+        _switch_users -= 1
+        if _switch_users == 0:
+            sys.setswitchinterval(_switch_default)
+
+
+class StackSampler(threading.Thread):
+    """Collect collapsed stacks of one thread until stopped."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='request-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class QueryTimeline:
+    """``connection.execute_wrapper`` that records (start ms, duration ms, alias, sql)."""
+
+    def __init__(self, started):
+        self.started = started
+        self.queries = []
+
+    def wrapper(self, alias):
+        def record(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                end = time.perf_counter()
+                self.queries.append({
+                    'start_ms': round((start - self.started) * 1000, 2),
+                    'duration_ms': round((end - start) * 1000, 2),
+                    'alias': alias,
+                    'sql': sql[:MAX_SQL_LENGTH],
+                })
+        return record
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILER_SAMPLE_RATE', 0.0)
+        self.interval = getattr(settings, 'PROFILER_INTERVAL', 0.002)
+
+    def __call__(self, request):
+        trigger = self._trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+        return self._profile(request, trigger)
+
+    def _trigger(self, request):
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sample'
+        if QUERY_PARAM in request.META.get('QUERY_STRING', '') and QUERY_PARAM in request.GET:
+            trigger = 'param'
+        elif request.META.get(HEADER):
+            trigger = 'header'
+        else:
+            return None
+        user = getattr(request, 'user', None)
+        return trigger if user is not None and user.is_staff else None
+
+    def _profile(self, request, trigger):
+        started = time.perf_counter()
+        timeline = QueryTimeline(started)
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        profiler = cProfile.Profile()
+        wrappers = [conn.execute_wrapper(timeline.wrapper(conn.alias)) for conn in connections.all()]
+        for wrapper in wrappers:
+            wrapper.__enter__()
+        # Let the sampler actually get the GIL at its interval
+        shorten_switch_interval(self.interval / 2)
+        sampler.start()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            sampler.stop()
+            restore_switch_interval()
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+        duration = time.perf_counter() - started
+        save_profile(request, response, trigger, duration, profiler, sampler, timeline)
+        return response
+
+
+def save_profile(request, response, trigger, duration, profiler, sampler, timeline):
+    from .models import RequestProfile
+
+    user = getattr(request, 'user', None)
+    record = RequestProfile.objects.create(
+        method=request.method,
+        path=request.get_full_path()[:500],
+        status_code=response.status_code,
+        user=user if user is not None and user.is_authenticated else None,
+        trigger=trigger,
+        duration_ms=round(duration * 1000, 2),
+        query_count=len(timeline.queries),
+        sql_ms=round(sum(q['duration_ms'] for q in timeline.queries), 2),
+        samples=sum(sampler.stacks.values()),
+        sql_timeline=timeline.queries,
+    )
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    profiler.dump_stats(os.path.join(directory, f"{record.pk}.pstats"))
+    with open(os.path.join(directory, f"{record.pk}.folded"), 'w', encoding='utf-8') as fh:
+        fh.write(sampler.collapsed())
+    return record
+
+
+def stats_text(record, sort='cumulative', limit=40):
+    path = os.path.join(profile_dir(), f"{record.pk}.pstats")
+    if not os.path.exists(path):
+        return ''
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+def file_path(record, kind):
+    return os.path.join(profile_dir(), f"{record.pk}.{kind}")
+
+
+def delete_files(record):
+    for kind in ('pstats', 'folded'):
+        try:
+            os.remove(file_path(record, kind))
+        except FileNotFoundError:
+            pass
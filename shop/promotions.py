@@ -0,0 +1,216 @@
+"""
+Coupon / promotion rule engine.
+
+Active ``Coupon`` rows are compiled once into plain Python rule objects and
+kept in a per-process cache. The cache is keyed by a version number stored in
+Django's cache, which ``shop.signals`` bumps whenever a coupon (or its
+targeting) changes; rules are also reloaded after ``RULES_MAX_AGE`` seconds so
+that a per-process cache backend can never serve stale rules for long.
+"""
+import time
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import versions
+from .models import Coupon, CouponUsage
+
+VERSION_KEY = 'promotions:version'
+RULES_MAX_AGE = 60
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+_compiled = {'version': None, 'loaded_at': 0.0, 'by_code': {}, 'auto': ()}
+
+
+class CompiledRule:
+    __slots__ = (
+        'id', 'code', 'description', 'is_percent', 'value', 'max_discount',
+        'min_order_amount', 'category_ids', 'variant_ids', 'starts_at',
+        'ends_at', 'per_user_limit', 'usage_limit',
+    )
+
+    def __init__(self, coupon, category_ids, variant_ids):
+        self.id = coupon.id
+        self.code = coupon.code
+        self.description = coupon.description
+        self.is_percent = coupon.discount_type == 'percent'
+        self.value = coupon.value
+        self.max_discount = coupon.max_discount
+        self.min_order_amount = coupon.min_order_amount
+        self.category_ids = frozenset(category_ids)
+        self.variant_ids = frozenset(variant_ids)
+        self.starts_at = coupon.starts_at
+        self.ends_at = coupon.ends_at
+        self.per_user_limit = coupon.per_user_limit
+        self.usage_limit = coupon.usage_limit
+
+    def is_live(self, now):
+        return (self.starts_at is None or self.starts_at <= now) and (self.ends_at is None or now < self.ends_at)
+
+    def eligible_amount(self, lines, amount):
+        """Part of ``amount`` (the cart after bulk discount) this rule applies to."""
+        if not self.category_ids and not self.variant_ids:
+            return amount
+        subtotal = ZERO
+        eligible = ZERO
+        for category_id, variant_id, line_total in lines:
+            subtotal += line_total
+            if category_id in self.category_ids or variant_id in self.variant_ids:
+                eligible += line_total
+        if not subtotal:
+            return ZERO
+        # Spread the bulk discount proportionally over the eligible lines
+        return (amount * eligible / subtotal).quantize(CENT)
+
+    def discount(self, lines, amount):
+        base = self.eligible_amount(lines, amount)
+        if base <= 0:
+            return ZERO
+        if self.is_percent:
+            value = (base * self.value / 100).quantize(CENT)
+        else:
+            value = self.value
+        if self.max_discount is not None:
+            value = min(value, self.max_discount)
+        return min(value, base)
+
+
+def normalize_code(code):
+    """Codes match case-insensitively: keyed and looked up in upper case."""
+    return (code or '').strip().upper()
+
+
+def bump_version():
+    versions.bump(VERSION_KEY)
+
+
+def _load_rules():
+    now = timezone.now()
+    coupons = list(
+        Coupon.objects.filter(is_active=True)
+        .filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now))
+    )
+    ids = [c.id for c in coupons]
+    categories, variants = {}, {}
+    for coupon_id, category_id in Coupon.categories.through.objects.filter(coupon_id__in=ids).values_list('coupon_id', 'category_id'):
+        categories.setdefault(coupon_id, []).append(category_id)
+    for coupon_id, variant_id in Coupon.variants.through.objects.filter(coupon_id__in=ids).values_list('coupon_id', 'productvariant_id'):
+        variants.setdefault(coupon_id, []).append(variant_id)
+
+    by_code, auto = {}, []
+    for coupon in coupons:
+        rule = CompiledRule(coupon, categories.get(coupon.id, ()), variants.get(coupon.id, ()))
+        by_code[normalize_code(rule.code)] = rule
+        if coupon.auto_apply:
+            auto.append(rule)
+    return by_code, tuple(auto)
+
+
+def get_rules():
+    """Return ``(rules_by_code, auto_apply_rules)``, recompiling only when stale."""
+    version = versions.current(VERSION_KEY)
+    if version != _compiled['version'] or time.monotonic() - _compiled['loaded_at'] > RULES_MAX_AGE:
+        by_code, auto = _load_rules()
+        _compiled.update(version=version, loaded_at=time.monotonic(), by_code=by_code, auto=auto)
+    return _compiled['by_code'], _compiled['auto']
+
+
+def _uses_by_coupon(user, rules):
+    """``{coupon_id: used}`` for the user's per-user-limited ``rules``, in one query (none if no rule is limited)."""
+    limited = [rule.id for rule in rules if rule.per_user_limit is not None]
+    if not limited or user is None or not user.is_authenticated:
+        return {}
+    return dict(CouponUsage.objects.filter(user=user, coupon_id__in=limited).values_list('coupon_id', 'used'))
+
+
+def _has_uses_left(rule, user, uses):
+    if rule.per_user_limit is None:
+        return True
+    if user is None or not user.is_authenticated:
+        return False
+    return uses.get(rule.id, 0) < rule.per_user_limit
+
+
+def evaluate(lines, amount, user=None, code='', now=None):
+    """
+    Pick the promotion for a cart.
+
+    ``lines`` is a sequence of ``(category_id, variant_id, line_total)`` and
+    ``amount`` the cart total after the bulk discount. An entered ``code``
+    wins; otherwise the best auto-apply promotion is used.
+    Returns ``(rule, discount, error)``.
+    """
+    now = now or timezone.now()
+    by_code, auto = get_rules()
+
+    if code:
+        code = normalize_code(code)
+        rule = by_code.get(code)
+        if rule is None or not rule.is_live(now):
+            return None, ZERO, "Invalid coupon code."
+        if amount < rule.min_order_amount:
+            return None, ZERO, f"Coupon {code} needs a minimum order of ₹{rule.min_order_amount}."
+        discount = rule.discount(lines, amount)
+        if discount <= 0:
+            return None, ZERO, f"Coupon {code} does not apply to the items in your cart."
+        if not _has_uses_left(rule, user, _uses_by_coupon(user, [rule])):
+            return None, ZERO, f"You have already used coupon {code}."
+        return rule, discount, None
+
+    candidates = []
+    for rule in auto:
+        if rule.is_live(now) and amount >= rule.min_order_amount:
+            discount = rule.discount(lines, amount)
+            if discount > 0:
+                candidates.append((rule, discount))
+    # One query for all the limited candidates' usage counts
+    uses = _uses_by_coupon(user, [rule for rule, _ in candidates])
+    best, best_discount = None, ZERO
+    for rule, discount in candidates:
+        if discount > best_discount and _has_uses_left(rule, user, uses):
+            best, best_discount = rule, discount
+    return best, best_discount, None
+
+
+def _claim_user_use(rule, user):
+    """Count one more use of ``rule`` by ``user`` unless that would exceed per_user_limit."""
+    if rule.per_user_limit is None:
+        return True
+    if user is None or not user.is_authenticated:
+        return False
+    usage = CouponUsage.objects.filter(coupon_id=rule.id, user=user)
+    if usage.filter(used__lt=rule.per_user_limit).update(used=F('used') + 1):
+        return True
+    if usage.exists() or rule.per_user_limit < 1:
+        return False
+    try:
+        with transaction.atomic():
+            CouponUsage.objects.create(coupon_id=rule.id, user=user, used=1)
+        return True
+    except IntegrityError:
+        # A concurrent checkout created the row first; go through the limit check again
+        return bool(usage.filter(used__lt=rule.per_user_limit).update(used=F('used') + 1))
+
+
+def claim(rule, user):
+    """
+    Reserve one use of ``rule`` for ``user``. Call inside the checkout
+    transaction: the global and per-user counters are both incremented with
+    conditional UPDATEs, so neither limit can be exceeded by concurrent
+    checkouts, and nothing is kept if either is exhausted.
+    """
+    with transaction.atomic():
+        updated = (
+            Coupon.objects.filter(pk=rule.id, is_active=True)
+            .filter(Q(usage_limit__isnull=True) | Q(used_count__lt=F('usage_limit')))
+            .update(used_count=F('used_count') + 1)
+        )
+        if not updated:
+            return False
+        if not _claim_user_use(rule, user):
+            transaction.set_rollback(True)  # undo the global increment
+            return False
+    return True
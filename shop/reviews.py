@@ -0,0 +1,80 @@
+"""
+Product reviews: keyset-paginated pages and a cached rating summary.
+
+Reviews are listed newest first and paged by ``(created_at, id)``, so page N
+costs the same as page 1 (an index walk on ``review_product_created_idx``)
+no matter how many reviews a product has. The rating summary (count, average
+and per-star histogram) is cached per product and dropped by the Review
+signals, so it is only recomputed after that product's reviews change.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import Review
+
+PAGE_SIZE = 10
+SUMMARY_KEY = 'reviews:summary:{}'
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_cursor(review):
+    delta = review.created_at - EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds
+    return f"{micros}.{review.id}"
+
+
+def decode_cursor(cursor):
+    """Return ``(created_at, id)`` or ``None`` for a missing/garbled cursor."""
+    try:
+        micros, review_id = cursor.split('.')
+        return EPOCH + timedelta(microseconds=int(micros)), int(review_id)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def review_page(product_id, cursor=None, size=PAGE_SIZE):
+    """Return ``(reviews, next_cursor)``; ``next_cursor`` is None on the last page."""
+    reviews = (
+        Review.objects.filter(product_id=product_id)
+        .select_related('user')
+        .only('id', 'rating', 'comment', 'created_at', 'user__username')
+        .order_by('-created_at', '-id')
+    )
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, review_id = position
+        reviews = reviews.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=review_id))
+
+    # One extra row tells us whether there is another page
+    page = list(reviews[:size + 1])
+    next_cursor = encode_cursor(page[size - 1]) if len(page) > size else None
+    return page[:size], next_cursor
+
+
+def rating_summary(product_id):
+    """``{'count', 'avg', 'histogram': [(stars, count, percent), ...]}`` for 5..1 stars."""
+    key = SUMMARY_KEY.format(product_id)
+    summary = cache.get(key)
+    if summary is None:
+        counts = dict(
+            Review.objects.filter(product_id=product_id)
+            .values('rating').annotate(n=Count('id')).values_list('rating', 'n')
+        )
+        total = sum(counts.values())
+        avg = sum(stars * n for stars, n in counts.items()) / total if total else 0
+        summary = {
+            'count': total,
+            'avg': round(avg, 1),
+            'histogram': [
+                (stars, counts.get(stars, 0), round(100 * counts.get(stars, 0) / total) if total else 0)
+                for stars in range(5, 0, -1)
+            ],
+        }
+        cache.set(key, summary, None)
+    return summary
+
+
+def invalidate(product_id):
+    cache.delete(SUMMARY_KEY.format(product_id))
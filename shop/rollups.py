@@ -0,0 +1,154 @@
+"""
+Daily sales rollups.
+
+Three small tables summarise orders per day: by product, by category and by
+status. They are updated incrementally, one order at a time, whenever an
+order is created or changes status (``tasks.rollup_order``, queued by the
+Order signal). ``Order.rollup_status`` records which status an order is
+currently counted under, so applying the same change twice is a no-op and a
+status change moves the order between buckets instead of double counting.
+
+Cancelled orders stay in the status table but are taken out of the product
+and category tables. ``backfill_sales_rollups`` catches up orders the
+signals missed (e.g. ``.update()``) or rebuilds everything from scratch,
+archived orders included.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, DailyCategorySales, DailyProductSales, DailyStatusSales, Order, OrderItem,
+)
+
+UNCOUNTED = ('', 'cancelled')  # statuses that contribute no product/category sales
+
+
+def _bump(model, day, delta, **key):
+    row, _ = model.objects.get_or_create(day=day, **key)
+    model.objects.filter(pk=row.pk).update(**{field: F(field) + value for field, value in delta.items()})
+
+
+def _item_totals(order_id):
+    by_product = defaultdict(lambda: [0, Decimal('0')])
+    by_category = defaultdict(lambda: [0, Decimal('0')])
+    items = OrderItem.objects.filter(order_id=order_id).values_list(
+        'product_id', 'product__category_id', 'quantity', 'price',
+    )
+    for product_id, category_id, quantity, price in items:
+        for totals in (by_product[product_id], by_category[category_id]):
+            totals[0] += quantity
+            totals[1] += price * quantity
+    return by_product, by_category
+
+
+def apply_order(order_id):
+    """Bring the rollups in line with the order's current status. Returns True if anything changed."""
+    with transaction.atomic():
+        order = Order.objects.filter(pk=order_id).values('status', 'rollup_status', 'created_at', 'total_amount').first()
+        if order is None or order['status'] == order['rollup_status']:
+            return False
+        old, new = order['rollup_status'], order['status']
+        # Claim the transition; a concurrent run of the same change finds nothing to do
+        if not Order.objects.filter(pk=order_id, rollup_status=old).update(rollup_status=new):
+            return False
+
+        day = timezone.localdate(order['created_at'])
+        sign = (old in UNCOUNTED) - (new in UNCOUNTED)
+        if sign:
+            by_product, by_category = _item_totals(order_id)
+            for product_id, (units, revenue) in by_product.items():
+                _bump(DailyProductSales, day, {'units': sign * units, 'revenue': sign * revenue}, product_id=product_id)
+            for category_id, (units, revenue) in by_category.items():
+                _bump(DailyCategorySales, day, {'units': sign * units, 'revenue': sign * revenue}, category_id=category_id)
+
+        total = order['total_amount']
+        if old:
+            _bump(DailyStatusSales, day, {'orders': -1, 'revenue': -total}, status=old)
+        _bump(DailyStatusSales, day, {'orders': 1, 'revenue': total}, status=new)
+    return True
+
+
+def pending_orders():
+    """Orders whose current status is not (yet) reflected in the rollups."""
+    return Order.objects.exclude(rollup_status=F('status'))
+
+
+def catch_up(batch_size=500):
+    """Apply every pending order, one transaction per batch. Safe to interrupt and rerun."""
+    applied = 0
+    last_id = 0
+    while True:
+        ids = list(pending_orders().filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return applied
+        with transaction.atomic():
+            for order_id in ids:
+                applied += apply_order(order_id)
+        last_id = ids[-1]
+
+
+def _sum_rows(querysets, keys, values):
+    """Add up the grouped rows of several querysets by ``keys``: ``{key tuple: [values...]}``."""
+    totals = defaultdict(lambda: [0] * len(values))
+    for queryset in querysets:
+        for row in queryset:
+            sums = totals[tuple(row[key] for key in keys)]
+            for i, name in enumerate(values):
+                sums[i] += row[name] or 0
+    return totals
+
+
+def rebuild():
+    """
+    Recompute all rollups with a few GROUP BY queries over the hot orders and
+    the archive (archived orders keep counting; only their rows moved).
+    """
+    tz = timezone.get_current_timezone()
+    item_sources = [
+        OrderItem.objects.exclude(order__status='cancelled'),
+        ArchivedOrderItem.objects.exclude(order__status='cancelled'),
+    ]
+    counted_items = [
+        items.annotate(day=TruncDate('order__created_at', tzinfo=tz), line_total=F('price') * F('quantity'))
+        for items in item_sources
+    ]
+    with transaction.atomic():  # read and replace in one go: no order changes in between
+        by_product = _sum_rows(
+            (items.values('day', 'product_id').annotate(units=Sum('quantity'), revenue=Sum('line_total'))
+             for items in counted_items),
+            ('day', 'product_id'), ('units', 'revenue'),
+        )
+        by_category = _sum_rows(
+            (items.values('day', 'product__category_id').annotate(units=Sum('quantity'), revenue=Sum('line_total'))
+             for items in counted_items),
+            ('day', 'product__category_id'), ('units', 'revenue'),
+        )
+        by_status = _sum_rows(
+            (orders.annotate(day=TruncDate('created_at', tzinfo=tz)).values('day', 'status')
+             .annotate(orders=Count('id'), revenue=Sum('total_amount'))
+             for orders in (Order.objects.all(), ArchivedOrder.objects.all())),
+            ('day', 'status'), ('orders', 'revenue'),
+        )
+
+        DailyProductSales.objects.all().delete()
+        DailyCategorySales.objects.all().delete()
+        DailyStatusSales.objects.all().delete()
+
+        DailyProductSales.objects.bulk_create(
+            DailyProductSales(day=day, product_id=product_id, units=units, revenue=revenue)
+            for (day, product_id), (units, revenue) in by_product.items()
+        )
+        DailyCategorySales.objects.bulk_create(
+            DailyCategorySales(day=day, category_id=category_id, units=units, revenue=revenue)
+            for (day, category_id), (units, revenue) in by_category.items()
+        )
+        DailyStatusSales.objects.bulk_create(
+            DailyStatusSales(day=day, status=status, orders=orders, revenue=revenue)
+            for (day, status), (orders, revenue) in by_status.items()
+        )
+        Order.objects.exclude(rollup_status=F('status')).update(rollup_status=F('status'))
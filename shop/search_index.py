@@ -0,0 +1,295 @@
+"""
+In-process prefix index for the search box autocomplete.
+
+Every product and category name is normalised ("Apple iPhone 15" ->
+"apple iphone 15") and indexed under the full name and under every word
+suffix ("iphone 15", "15"), so typing any word of a name finds it. The keys
+live in one sorted list; a prefix is a contiguous range found with bisect.
+
+Small ranges are ranked on the fly. For prefixes matching more than
+``small_range`` keys ("a", "pro", ...) the top-K suggestions are precomputed
+at build time, so every lookup is bounded and takes microseconds.
+
+Suggestions are weighted by popularity (units sold, from ``OrderItem``).
+Product and category signals append the change to a short log in the cache
+(``SEQ_KEY`` counts the entries); every process replays the entries it hasn't
+seen yet onto its own index before answering, and only rebuilds from the
+database (in the background) when entries it needs have expired, or
+periodically so popularity stays fresh. The index is only read and modified
+under ``_lock``.
+"""
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Sum
+
+from .models import Category, OrderItem, Product
+
+SEQ_KEY = 'search-index:seq'
+CHANGE_KEY = 'search-index:change:{}'
+CHANGE_TIMEOUT = 3600  # a process further behind than this rebuilds instead
+MAX_REPLAY = 500  # ... as does one more than this many changes behind (bulk imports)
+INDEX_MAX_AGE = 600  # rebuild periodically so popularity stays fresh
+MAX_WORD_STARTS = 6
+END = '\uffff'
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize(text):
+    return ' '.join(WORD_RE.findall(text.lower()))
+
+
+def index_keys(label):
+    words = WORD_RE.findall(label.lower())
+    return {' '.join(words[i:]) for i in range(min(len(words), MAX_WORD_STARTS))}
+
+
+class PrefixIndex:
+    def __init__(self, entries=(), top_k=10, small_range=128):
+        """``entries``: iterable of ``(entry_key, label, kind, slug, weight)``."""
+        self.top_k = top_k
+        self.depth = top_k * 3  # spare rankings so removals rarely force a re-rank
+        self.small_range = small_range
+        self.entries = {}
+        pairs = []
+        for entry_key, label, kind, slug, weight in entries:
+            self.entries[entry_key] = (label, kind, slug, weight)
+            pairs.extend((key, entry_key) for key in index_keys(label))
+        pairs.sort(key=lambda pair: pair[0])
+        self.keys = [key for key, _ in pairs]
+        self.owners = [owner for _, owner in pairs]
+        self.top = {}
+        self._build_top()
+
+    def __len__(self):
+        return len(self.entries)
+
+    # ---------------- RANKING ----------------
+    def _range(self, prefix):
+        lo = bisect_left(self.keys, prefix)
+        return lo, bisect_left(self.keys, prefix + END, lo)
+
+    def _best(self, owners):
+        weights = {owner: self.entries[owner][3] for owner in owners}
+        return tuple(heapq.nlargest(self.depth, weights, key=weights.get))
+
+    def _build_top(self, lo=0, hi=None, length=0):
+        """
+        Rank ``keys[lo:hi]`` (which share their first ``length`` characters),
+        storing the ranking of every wide prefix on the way. A wide range is
+        ranked from its children's rankings, so each key is looked at once.
+        """
+        keys = self.keys
+        hi = len(keys) if hi is None else hi
+        if hi - lo <= self.small_range:
+            return self._best(self.owners[lo:hi])
+        candidates = []
+        i = lo
+        while i < hi:
+            if len(keys[i]) == length:
+                candidates.append(self.owners[i])
+                i += 1
+                continue
+            j = bisect_left(keys, keys[i][:length + 1] + END, i, hi)
+            candidates.extend(self._build_top(i, j, length + 1))
+            i = j
+        ranked = self._best(candidates)
+        if length:
+            self.top[keys[lo][:length]] = ranked
+        return ranked
+
+    # ---------------- LOOKUP ----------------
+    def suggest(self, query, limit=8):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        lo, hi = self._range(prefix)
+        ranked = self.top.get(prefix) if hi - lo > self.small_range else None
+        if ranked is None:
+            ranked = self._best(self.owners[lo:hi])
+        return [(entry_key,) + self.entries[entry_key] for entry_key in ranked[:min(limit, self.top_k)]]
+
+    # ---------------- INCREMENTAL UPDATES ----------------
+    # A stored ranking is the exact top-N of its range for its current length
+    # N. Removing an entry just drops it; a new entry is only merged in when
+    # it beats the last one. Once a ranking shrinks below ``top_k`` the range
+    # is ranked again from scratch.
+    def _update_prefixes(self, key, entry_key, removed):
+        weight = self.entries[entry_key][3] if not removed else None
+        for length in range(1, len(key) + 1):
+            prefix = key[:length]
+            lo, hi = self._range(prefix)
+            if hi - lo <= self.small_range:
+                # Rankings of longer prefixes would go stale too
+                for n in range(length, len(key) + 1):
+                    self.top.pop(key[:n], None)
+                break
+            current = self.top.get(prefix, ())
+            if removed:
+                ranked = tuple(owner for owner in current if owner != entry_key)
+            elif entry_key in current:
+                ranked = current
+            elif len(current) < self.depth or weight >= self.entries[current[-1]][3]:
+                ranked = self._best(current + (entry_key,))
+            else:
+                ranked = current
+            if len(ranked) < self.top_k:
+                ranked = self._best(self.owners[lo:hi])
+            self.top[prefix] = ranked
+
+    def remove(self, entry_key):
+        entry = self.entries.get(entry_key)
+        if entry is None:
+            return
+        keys = index_keys(entry[0])
+        for key in keys:
+            i = bisect_left(self.keys, key)
+            while i < len(self.keys) and self.keys[i] == key:
+                if self.owners[i] == entry_key:
+                    del self.keys[i]
+                    del self.owners[i]
+                    break
+                i += 1
+        for key in keys:
+            self._update_prefixes(key, entry_key, removed=True)
+        del self.entries[entry_key]
+
+    def add(self, entry_key, label, kind, slug, weight):
+        self.remove(entry_key)
+        self.entries[entry_key] = (label, kind, slug, weight)
+        keys = index_keys(label)
+        for key in keys:
+            i = bisect_left(self.keys, key)
+            self.keys.insert(i, key)
+            self.owners.insert(i, entry_key)
+        for key in keys:
+            self._update_prefixes(key, entry_key, removed=False)
+
+    def weight(self, entry_key, default=0):
+        entry = self.entries.get(entry_key)
+        return entry[3] if entry else default
+
+
+# ---------------- PROCESS-WIDE INDEX ----------------
+_lock = threading.Lock()
+_state = {'index': None, 'seq': 0, 'built_at': 0.0, 'building': False}
+
+
+def load_entries():
+    sold = dict(
+        OrderItem.objects.filter(product__isnull=False)
+        .values('product_id').annotate(n=Sum('quantity')).values_list('product_id', 'n')
+    )
+    category_weight = {}
+    rows = Product.objects.values_list('id', 'name', 'slug', 'category_id').iterator(chunk_size=5000)
+    for product_id, name, slug, category_id in rows:
+        weight = sold.get(product_id, 0)
+        category_weight[category_id] = category_weight.get(category_id, 0) + weight
+        yield ('p', product_id), name, 'product', slug, weight
+    for category_id, name, slug in Category.objects.values_list('id', 'name', 'slug'):
+        yield ('c', category_id), name, 'category', slug, category_weight.get(category_id, 0)
+
+
+def _seq():
+    seq = cache.get(SEQ_KEY)
+    if seq is None:
+        cache.add(SEQ_KEY, 0, None)
+        seq = cache.get(SEQ_KEY, 0)
+    return seq
+
+
+def rebuild():
+    seq = _seq()  # read first: changes logged during the build are replayed afterwards
+    index = PrefixIndex(load_entries())
+    with _lock:
+        _state.update(index=index, seq=seq, built_at=time.monotonic())
+    return index
+
+
+def _rebuild_in_background():
+    try:
+        rebuild()
+    finally:
+        with _lock:
+            _state['building'] = False
+        connections.close_all()
+
+
+def _start_rebuild():
+    with _lock:
+        start = not _state['building']
+        _state['building'] = True
+    if start:
+        # Keep answering from the current index while the new one is built
+        threading.Thread(target=_rebuild_in_background, name='search-index', daemon=True).start()
+
+
+def _replay(index, change):
+    op, entry_key, *fields = change
+    if op == 'add':
+        index.add(entry_key, *fields, index.weight(entry_key))
+    else:
+        index.remove(entry_key)
+
+
+def _catch_up(seq):
+    """Replay logged changes up to ``seq``; False if some have expired (a rebuild is needed)."""
+    applied = _state['seq']
+    if seq - applied > MAX_REPLAY:
+        return False
+    keys = [CHANGE_KEY.format(n) for n in range(applied + 1, seq + 1)]
+    changes = cache.get_many(keys)
+    if len(changes) < len(keys):
+        return False
+    with _lock:
+        if _state['seq'] == applied:  # not moved on by another thread meanwhile
+            for key in keys:
+                _replay(_state['index'], changes[key])
+            _state['seq'] = seq
+    return True
+
+
+def get_index():
+    if _state['index'] is None:
+        return rebuild()
+    seq = _seq()
+    if seq != _state['seq'] and (_state['building'] or not _catch_up(seq)):
+        _start_rebuild()
+    elif time.monotonic() - _state['built_at'] > INDEX_MAX_AGE:
+        _start_rebuild()
+    return _state['index']
+
+
+def suggest(query, limit=8):
+    index = get_index()
+    with _lock:
+        return index.suggest(query, limit)
+
+
+def _publish(*change):
+    """Log a change for every process (this one included, on its next lookup)."""
+    _seq()
+    seq = cache.incr(SEQ_KEY)
+    cache.set(CHANGE_KEY.format(seq), change, CHANGE_TIMEOUT)
+
+
+def product_saved(product):
+    _publish('add', ('p', product.id), product.name, 'product', product.slug)
+
+
+def product_deleted(product_id):
+    _publish('remove', ('p', product_id))
+
+
+def category_saved(category):
+    _publish('add', ('c', category.id), category.name, 'category', category.slug)
+
+
+def category_deleted(category_id):
+    _publish('remove', ('c', category_id))
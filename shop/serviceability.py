@@ -0,0 +1,229 @@
+"""
+Pincode serviceability and delivery estimates.
+
+``load_pincodes`` turns a zone CSV into one binary file (``PINCODE_INDEX_PATH``):
+
+    header   magic, range count, rule count, zone-name bytes
+    starts   uint32[ranges]   first pincode of each range, sorted
+    ends     uint32[ranges]   last pincode of each range
+    rule_ids uint16[ranges]   index into the rule table
+    rules    4 x uint8[rules] min days, max days, flags (COD), zone number
+    zones    JSON list of zone names
+
+Consecutive pincodes that resolve to the same rule are stored as one range,
+so the ~19k Indian pincodes fit in a few hundred KB. Every worker maps the
+file read-only (the pages are shared through the OS page cache) and answers a
+lookup with one bisect over ``starts``: about 15 comparisons, no allocation,
+no database or cache round trip. A rebuilt file is swapped in atomically and
+picked up by each worker within ``RELOAD_CHECK_SECONDS``.
+
+Without an index every pincode gets the old flat "3 to 5 days" estimate.
+"""
+import csv
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+MAGIC = b'PINIDX01'
+HEADER = struct.Struct('<8sIII')
+FLAG_COD = 1
+PINCODE_MIN, PINCODE_MAX = 100000, 999999
+RELOAD_CHECK_SECONDS = 30
+DEFAULT_DAYS = (3, 5)
+
+
+def index_path():
+    return os.fspath(getattr(settings, 'PINCODE_INDEX_PATH', settings.BASE_DIR / 'var' / 'pincodes.idx'))
+
+
+def normalize(pincode):
+    """Six-digit pincode as an int, or None."""
+    pincode = (pincode or '').replace(' ', '')
+    if len(pincode) != 6 or not pincode.isdigit():
+        return None
+    value = int(pincode)
+    return value if PINCODE_MIN <= value <= PINCODE_MAX else None
+
+
+# ---------------- BUILDING ----------------
+def _flag(value):
+    return (value or '').strip().lower() in ('1', 'y', 'yes', 'true')
+
+
+def read_rules(lines):
+    """
+    Parse CSV rows of ``pincode[,pincode_end],zone,min_days,max_days,cod``.
+    Yields ``(start, end, (min_days, max_days, cod, zone))``; a row covers a
+    range when ``pincode_end`` is given (e.g. a whole sorting district).
+    """
+    for line_no, row in enumerate(csv.DictReader(lines), start=2):
+        start = normalize(row.get('pincode'))
+        end = normalize(row.get('pincode_end')) if row.get('pincode_end') else start
+        if start is None or end is None or end < start:
+            given = '-'.join(filter(None, (row.get('pincode'), row.get('pincode_end'))))
+            raise ValueError(f"line {line_no}: bad pincode {given!r}")
+        try:
+            min_days, max_days = int(row['min_days']), int(row['max_days'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"line {line_no}: min_days and max_days must be numbers")
+        if not 0 <= min_days <= max_days <= 255:
+            raise ValueError(f"line {line_no}: need 0 <= min_days <= max_days <= 255")
+        yield start, end, (min_days, max_days, _flag(row.get('cod')), (row.get('zone') or '').strip())
+
+
+def build(rules):
+    """
+    Turn ``(start, end, rule)`` tuples into the index file contents. Where
+    rules overlap (several warehouses serving a pincode) the fastest one wins.
+    """
+    rule_ids = {}
+    best = [None] * (PINCODE_MAX - PINCODE_MIN + 1)
+    for start, end, rule in rules:
+        rule_id = rule_ids.setdefault(rule, len(rule_ids))
+        for offset in range(start - PINCODE_MIN, end - PINCODE_MIN + 1):
+            current = best[offset]
+            if current is None or rule[:2] < current[:2] or (rule[:2] == current[:2] and rule[2] > current[2]):
+                best[offset] = rule
+    if len(rule_ids) > 0xFFFF:
+        raise ValueError("more than 65535 distinct zone rules")
+
+    starts, ends, ids = array('I'), array('I'), array('H')
+    previous = None
+    for offset, rule in enumerate(best):
+        if rule is None:
+            previous = None
+            continue
+        if rule == previous:
+            ends[-1] = offset + PINCODE_MIN
+        else:
+            starts.append(offset + PINCODE_MIN)
+            ends.append(offset + PINCODE_MIN)
+            ids.append(rule_ids[rule])
+        previous = rule
+
+    zones = sorted({rule[3] for rule in rule_ids})
+    if len(zones) > 255:
+        raise ValueError("more than 255 zones")
+    table = bytearray()
+    for min_days, max_days, cod, zone in rule_ids:  # insertion order == rule id
+        table += bytes((min_days, max_days, FLAG_COD if cod else 0, zones.index(zone)))
+    if len(ids) % 2:
+        ids.append(0)  # keep the rule table 4-byte aligned
+    zone_bytes = json.dumps(zones).encode()
+    header = HEADER.pack(MAGIC, len(starts), len(rule_ids), len(zone_bytes))
+    return header + starts.tobytes() + ends.tobytes() + ids.tobytes() + bytes(table) + zone_bytes
+
+
+def write_index(data, path=None):
+    """Atomically replace the index file; running workers switch over on their next reload check."""
+    path = path or index_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as fh:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+# ---------------- LOOKUP ----------------
+class PincodeIndex:
+    """Read-only view of an index file through a shared memory map."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as fh:
+            stat = os.fstat(fh.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, ranges, rules, zone_len = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a pincode index")
+        view = memoryview(self._map)
+        offset = HEADER.size
+        self.starts = view[offset:offset + 4 * ranges].cast('I')
+        offset += 4 * ranges
+        self.ends = view[offset:offset + 4 * ranges].cast('I')
+        offset += 4 * ranges
+        self.rule_ids = view[offset:offset + 2 * ranges].cast('H')
+        offset += 2 * (ranges + ranges % 2)
+        self.rules = view[offset:offset + 4 * rules]
+        offset += 4 * rules
+        self.zones = json.loads(bytes(view[offset:offset + zone_len]))
+        self.range_count = ranges
+        self.pincode_count = sum(self.ends[i] - self.starts[i] + 1 for i in range(ranges))
+
+    def lookup(self, pincode):
+        """``(zone, min_days, max_days, cod)`` for an int pincode, or None if not serviceable."""
+        i = bisect_right(self.starts, pincode) - 1
+        if i < 0 or pincode > self.ends[i]:
+            return None
+        base = 4 * self.rule_ids[i]
+        min_days, max_days, flags, zone = self.rules[base:base + 4]
+        return self.zones[zone], min_days, max_days, bool(flags & FLAG_COD)
+
+
+_state = {'index': None, 'checked': float('-inf')}
+_lock = threading.Lock()
+
+
+def get_index():
+    """This process's index, reopened when the file has been replaced. None if there is none."""
+    now = time.monotonic()
+    if now - _state['checked'] < RELOAD_CHECK_SECONDS:
+        return _state['index']
+    with _lock:
+        if now - _state['checked'] >= RELOAD_CHECK_SECONDS:
+            path = index_path()
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                _state['index'] = None
+            else:
+                current = _state['index']
+                if current is None or current.identity != (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+                    _state['index'] = PincodeIndex(path)
+            _state['checked'] = now
+    return _state['index']
+
+
+def reset():
+    """Forget the loaded index so the next lookup reopens the file."""
+    with _lock:
+        _state.update(index=None, checked=float('-inf'))
+
+
+def _label(earliest, latest):
+    if earliest == latest:
+        return earliest.strftime('%d %b')
+    return f"{earliest.strftime('%d %b')} – {latest.strftime('%d %b')}"
+
+
+def estimate(pincode, start=None):
+    """
+    Delivery estimate for ``pincode`` counted from ``start`` (default today):
+    a dict with serviceable, zone, cod (None when unknown), earliest, latest
+    and a display label.
+    """
+    start = start or timezone.localdate()
+    index = get_index()
+    if index is None:
+        zone, (min_days, max_days), cod = '', DEFAULT_DAYS, None
+    else:
+        value = normalize(pincode)
+        found = index.lookup(value) if value is not None else None
+        if found is None:
+            return {'pincode': pincode, 'serviceable': False, 'zone': '', 'cod': False,
+                    'earliest': None, 'latest': None, 'label': "Not deliverable"}
+        zone, min_days, max_days, cod = found
+    earliest, latest = start + timedelta(days=min_days), start + timedelta(days=max_days)
+    return {'pincode': pincode, 'serviceable': True, 'zone': zone, 'cod': cod,
+            'earliest': earliest, 'latest': latest, 'label': _label(earliest, latest)}
@@ -0,0 +1,157 @@
+"""
+Cacheable page shells for the catalog pages (hole punching).
+
+``home`` and ``product_list`` look the same for everybody except for a few
+spots: the messages toast, the user menu, the cart badge and mini cart, the
+hero's account button, recently viewed products and the wishlist hearts.
+Those spots are ``{% hole "name" %}`` tags. Rendered normally a hole just
+includes ``shop/fragments/<name>.html``; rendered as a shell it leaves a
+marker, and the CSRF token is a placeholder, so the page is the same for
+every visitor and is cached per URL and theme under a catalog version that
+Product/Category changes bump.
+
+``serve`` then fills the shell in-process: the visitor's fragments are
+rendered from a small context (no context processors) and cached under the
+visitor's version, which cart and wishlist changes bump; hearts are switched
+on in a single regex pass and the placeholder becomes the visitor's CSRF
+token. A warm catalog page costs a handful of cache reads whether or not the
+visitor is logged in.
+"""
+import hashlib
+import re
+
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import get_template, render_to_string
+
+from . import versions
+from .context_processors import cart_context
+from .models import Product, Wishlist
+
+SHELL_TIMEOUT = 300
+FRAGMENT_TIMEOUT = 600
+CACHEABLE_PARAMS = {'page', 'q', 'category', 'sort'}
+VISITOR_HOLES = ('user_menu', 'cart_badge', 'mini_cart', 'hero_account')
+CSRF_PLACEHOLDER = 'csrf-placeholder-3b9d1f0e'
+HOLE_RE = re.compile(r'<!--hole:(\w+)-->')
+HEART_RE = re.compile(r'bi-heart" data-heart="(\d+)"')
+
+CATALOG_VERSION_KEY = 'page-shell:version'
+VISITOR_VERSION_KEY = 'page-shell:visitor:{}'
+SHELL_KEY = 'page-shell:{}:{}:{}'
+FRAGMENTS_KEY = 'page-fragments:{}:{}'
+RECENT_KEY = 'page-fragments:recent:{}:{}'
+
+
+def marker(name):
+    return f'<!--hole:{name}-->'
+
+
+def catalog_version():
+    return versions.current(CATALOG_VERSION_KEY)
+
+
+def invalidate_catalog():
+    versions.bump(CATALOG_VERSION_KEY)
+
+
+def invalidate_visitor(user_id):
+    versions.bump(VISITOR_VERSION_KEY.format(user_id))
+
+
+# ---------------- FRAGMENTS ----------------
+def _render_fragment(name, context):
+    return get_template(f'shop/fragments/{name}.html').render(context)
+
+
+def _visitor_fragments(request, catalog_version):
+    """The visitor's holes plus their wishlisted product IDs, cached until their cart or wishlist changes."""
+    user = request.user
+    if user.is_authenticated:
+        owner = f"user:{user.pk}:{versions.current(VISITOR_VERSION_KEY.format(user.pk))}"
+    elif request.guest_cart:
+        owner = 'guest:' + hashlib.sha1(request.guest_cart.cookie_value().encode()).hexdigest()
+    else:
+        owner = 'anonymous'
+    key = FRAGMENTS_KEY.format(owner, catalog_version)
+    fragments = cache.get(key)
+    if fragments is None:
+        context = {'user': user, **cart_context(request)}
+        fragments = {name: _render_fragment(name, context) for name in VISITOR_HOLES}
+        fragments['wishlist_ids'] = frozenset(
+            Wishlist.objects.filter(user=user).values_list('product_id', flat=True)
+        ) if user.is_authenticated else frozenset()
+        cache.set(key, fragments, FRAGMENT_TIMEOUT)
+    return fragments
+
+
+def _recently_viewed(request, catalog_version):
+    recent_ids = request.session.get('recently_viewed', [])[:8]
+    if not recent_ids:
+        return ''
+    key = RECENT_KEY.format('.'.join(map(str, recent_ids)), catalog_version)
+    html = cache.get(key)
+    if html is None:
+        products = Product.objects.filter(id__in=recent_ids).only('id', 'name', 'slug', 'price', 'image')
+        products = sorted(products, key=lambda p: recent_ids.index(p.id))
+        html = _render_fragment('recently_viewed', {'recently_viewed_products': products})
+        cache.set(key, html, FRAGMENT_TIMEOUT)
+    return html
+
+
+def fill(request, shell, catalog_version):
+    """Assemble the visitor's page from a shell."""
+    fragments = _visitor_fragments(request, catalog_version)
+    holes = dict(fragments)
+    names = set(HOLE_RE.findall(shell))
+    if 'messages' in names:
+        # Only rendered (and consumed) when there is something to show
+        storage = messages.get_messages(request)
+        holes['messages'] = _render_fragment('messages', {'messages': storage}) if len(storage) else ''
+    if 'recently_viewed' in names:
+        holes['recently_viewed'] = _recently_viewed(request, catalog_version)
+
+    html = HOLE_RE.sub(lambda m: holes.get(m.group(1), ''), shell)
+    wishlist_ids = fragments['wishlist_ids']
+    if wishlist_ids:
+        html = HEART_RE.sub(
+            lambda m: f'bi-heart-fill text-danger" data-heart="{m.group(1)}"' if int(m.group(1)) in wishlist_ids
+            else m.group(0),
+            html,
+        )
+    if CSRF_PLACEHOLDER in html:
+        html = html.replace(CSRF_PLACEHOLDER, get_token(request))
+    return html
+
+
+# ---------------- SHELLS ----------------
+def _shell_key(request, catalog_version):
+    if set(request.GET) - CACHEABLE_PARAMS:
+        return None
+    theme = request.session.get('theme', 'light')
+    url = hashlib.sha1(request.get_full_path().encode()).hexdigest()
+    return SHELL_KEY.format(catalog_version, theme, url)
+
+
+def serve(request, template_name, build_context, catalog_version=None):
+    """
+    Respond with ``template_name`` for this visitor, rendering the shared shell
+    only on a cache miss. ``build_context`` returns the shell's (visitor
+    independent) context and may raise Http404. ``catalog_version`` is the
+    version the context's data comes from (the current one by default).
+    """
+    catalog_version = catalog_version or versions.current(CATALOG_VERSION_KEY)
+    key = _shell_key(request, catalog_version)
+    shell = cache.get(key) if key else None
+    if shell is None:
+        context = {**build_context(), 'shell': True, 'csrf_token': CSRF_PLACEHOLDER}
+        request.page_shell = True  # context processors skip per-visitor work
+        try:
+            shell = render_to_string(template_name, context, request)
+        finally:
+            request.page_shell = False
+        if key:
+            cache.set(key, shell, SHELL_TIMEOUT)
+    return HttpResponse(fill(request, shell, catalog_version))
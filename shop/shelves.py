@@ -0,0 +1,89 @@
+"""
+Materialized homepage shelves.
+
+Without a search query the hot deals, top deals and latest products shelves
+are the same for every visitor, so they are built once into a snapshot (the
+card fields the template needs) and kept in the cache. Product/category
+signals queue a rebuild on the job queue (``run_worker`` also rebuilds it
+periodically, and ``refresh_home_shelves`` does it on demand); visitors keep
+getting the previous snapshot meanwhile.
+"""
+import time
+
+from django.core.cache import cache
+
+from . import jobs
+from .models import Category, Product
+
+SHELVES_KEY = 'home:shelves'
+SHELVES_MAX_AGE = 300  # seconds before a background refresh is triggered
+REBUILD_COALESCE = 10  # seconds
+SHELF_SIZES = {'hot_deals': 8, 'top_deals': 8, 'latest_products': 12}
+CARD_FIELDS = ('id', 'name', 'slug', 'short_description', 'price', 'image', 'rating', 'category_id')
+
+
+def shelf_querysets(products):
+    """The three shelves for a product queryset (also used for filtered home pages)."""
+    return {
+        'hot_deals': products.filter(is_hot_deal=True).order_by('-created_at'),
+        'top_deals': products.filter(is_top_deal=True).order_by('-created_at'),
+        'latest_products': products.order_by('-created_at'),
+    }
+
+
+def build_snapshot():
+    categories = dict(Category.objects.values_list('id', 'name'))
+    shelves = {}
+    for name, qs in shelf_querysets(Product.objects.all()).items():
+        rows = list(qs.values(*CARD_FIELDS)[:SHELF_SIZES[name]])
+        for row in rows:
+            row['category_name'] = categories.get(row['category_id'], '')
+        shelves[name] = rows
+    return {'built_at': time.time(), 'shelves': shelves}
+
+
+def rebuild():
+    snapshot = build_snapshot()
+    cache.set(SHELVES_KEY, snapshot, None)
+    return snapshot
+
+
+def schedule_rebuild():
+    """
+    Queue a background rebuild. Changes within the same few seconds share one
+    job, which runs once that window has closed so it sees all of them.
+    """
+    now = time.time()
+    slot = int(now // REBUILD_COALESCE)
+    jobs.enqueue(
+        'tasks.rebuild_home_shelves',
+        key=f"home-shelves:{slot}",
+        delay=(slot + 1) * REBUILD_COALESCE - now,
+    )
+
+
+def snapshot_product_ids():
+    snapshot = cache.get(SHELVES_KEY)
+    if snapshot is None:
+        return set()
+    return {row['id'] for rows in snapshot['shelves'].values() for row in rows}
+
+
+def _hydrate(row):
+    # Unsaved model instances render exactly like the queried ones
+    # (image.url, category.name) without touching the database.
+    product = Product(**{f: row[f] for f in CARD_FIELDS})
+    product.category = Category(id=row['category_id'], name=row['category_name'])
+    return product
+
+
+def get_shelves():
+    """Return ``{'hot_deals': [...], 'top_deals': [...], 'latest_products': [...]}``."""
+    snapshot = cache.get(SHELVES_KEY)
+    if snapshot is None:
+        snapshot = rebuild()
+    elif time.time() - snapshot['built_at'] > SHELVES_MAX_AGE:
+        # Throttle so a stale snapshot doesn't turn every GET into a write
+        if cache.add(f"{SHELVES_KEY}:refresh-queued", 1, REBUILD_COALESCE * 2):
+            schedule_rebuild()
+    return {name: [_hydrate(row) for row in rows] for name, rows in snapshot['shelves'].items()}
@@ -0,0 +1,159 @@
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save, m2m_changed
+from django.dispatch import receiver
+
+from . import addresses, bundles, feeds, guest_cart, jobs, profiling, promotions, reviews, search_index, shells, shelves
+from .models import (
+    Address, CartItem, Category, Coupon, Order, Product, ProductImage, ProductVariant, RequestProfile, Review, Wishlist,
+)
+
+
+# ---------------- PROMOTIONS ----------------
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def coupon_changed(sender, **kwargs):
+    promotions.bump_version()
+
+
+@receiver(m2m_changed, sender=Coupon.categories.through)
+@receiver(m2m_changed, sender=Coupon.variants.through)
+def coupon_targeting_changed(sender, action, **kwargs):
+    if action.startswith('post_'):
+        promotions.bump_version()
+
+
+# ---------------- HOMEPAGE SHELVES ----------------
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, created=False, **kwargs):
+    # Only products that are (or were) on a shelf, or brand new ones that
+    # belong on "latest", make the snapshot stale.
+    if created or instance.is_hot_deal or instance.is_top_deal or instance.id in shelves.snapshot_product_ids():
+        # After the admin's / checkout's transaction: the rebuild must see the change
+        transaction.on_commit(shelves.schedule_rebuild)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, **kwargs):
+    transaction.on_commit(shelves.schedule_rebuild)
+
+
+# ---------------- SEARCH SUGGESTIONS ----------------
+# Published after commit: other workers replay the change as soon as they see it
+@receiver(post_save, sender=Product)
+def product_saved_for_search(sender, instance, **kwargs):
+    transaction.on_commit(lambda: search_index.product_saved(instance))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted_for_search(sender, instance, **kwargs):
+    product_id = instance.id
+    transaction.on_commit(lambda: search_index.product_deleted(product_id))
+
+
+@receiver(post_save, sender=Category)
+def category_saved_for_search(sender, instance, **kwargs):
+    transaction.on_commit(lambda: search_index.category_saved(instance))
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted_for_search(sender, instance, **kwargs):
+    category_id = instance.id
+    transaction.on_commit(lambda: search_index.category_deleted(category_id))
+
+
+# ---------------- REVIEWS ----------------
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_changed(sender, instance, **kwargs):
+    reviews.invalidate(instance.product_id)
+
+
+# ---------------- PRODUCT PAGE BUNDLES ----------------
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed_for_bundle(sender, instance, **kwargs):
+    bundles.invalidate(instance.id)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def product_part_changed(sender, instance, **kwargs):
+    bundles.invalidate(instance.product_id)
+
+
+# ---------------- SALES ROLLUPS ----------------
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, **kwargs):
+    # Checkout saves the order inside its transaction, so the job only
+    # becomes visible (and runs) once the order items exist too.
+    if instance.status != instance.rollup_status:
+        jobs.enqueue('tasks.rollup_order', {'order_id': instance.pk})
+
+
+# ---------------- PROFILER ----------------
+@receiver(post_delete, sender=RequestProfile)
+def request_profile_deleted(sender, instance, **kwargs):
+    profiling.delete_files(instance)
+
+
+# ---------------- GUEST CART ----------------
+@receiver(user_logged_in)
+def merge_guest_cart(sender, request, user, **kwargs):
+    cart = getattr(request, 'guest_cart', None)
+    if cart:
+        guest_cart.merge(user, cart)
+
+
+# ---------------- PAGE SHELLS ----------------
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def catalog_changed(sender, **kwargs):
+    shells.invalidate_catalog()
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+@receiver(post_save, sender=Wishlist)
+@receiver(post_delete, sender=Wishlist)
+def visitor_state_changed(sender, instance, **kwargs):
+    shells.invalidate_visitor(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    # The user menu shows the username and staff links
+    shells.invalidate_visitor(instance.pk)
+
+
+# ---------------- ADDRESSES ----------------
+@receiver(pre_save, sender=Address)
+def address_hash(sender, instance, **kwargs):
+    # Admin edits keep the dedup hash in step with the fields
+    instance.content_hash = addresses.content_hash(instance)
+
+
+# ---------------- SITEMAPS / PRODUCT FEED ----------------
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def feed_product_changed(sender, instance, **kwargs):
+    feeds.mark_changed(instance.id)
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def feed_variant_changed(sender, instance, **kwargs):
+    feeds.mark_changed(instance.product_id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def feed_category_changed(sender, **kwargs):
+    feeds.mark_categories_changed()
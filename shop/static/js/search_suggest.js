@@ -0,0 +1,43 @@
+/* Live search suggestions for the navbar search box (see views.search_suggest). */
+(function () {
+  const input = document.querySelector('.search-input[data-suggest-url]');
+  const box = document.getElementById('liveSuggestions');
+  if (!input || !box) return;
+
+  const list = box.querySelector('.live-suggestion-list');
+  let timer = null;
+  let lastQuery = '';
+  let controller = null;
+
+  function render(suggestions) {
+    list.replaceChildren();
+    suggestions.forEach(function (s) {
+      const a = document.createElement('a');
+      a.href = s.url;
+      a.className = 'badge suggestion-pill-soft';
+      const icon = document.createElement('i');
+      icon.className = (s.kind === 'category' ? 'bi bi-grid-3x3-gap' : 'bi bi-box-seam') + ' me-1';
+      a.append(icon, s.label);
+      list.append(a);
+    });
+    box.hidden = suggestions.length === 0;
+  }
+
+  function fetchSuggestions() {
+    const q = input.value.trim();
+    if (q === lastQuery) return;
+    lastQuery = q;
+    if (!q) { render([]); return; }
+    if (controller) controller.abort();
+    controller = new AbortController();
+    fetch(input.dataset.suggestUrl + '?q=' + encodeURIComponent(q), {signal: controller.signal})
+      .then(function (r) { return r.json(); })
+      .then(function (data) { if (data.q.trim() === lastQuery) render(data.suggestions); })
+      .catch(function () {});
+  }
+
+  input.addEventListener('input', function () {
+    clearTimeout(timer);
+    timer = setTimeout(fetchSuggestions, 120);
+  });
+})();
@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Avg, F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import archive, bundles, feeds, maintenance, rollups, shells, shelves
+from .jobs import task
+from .models import Job, Order, OrderItem, Product, RequestProfile, Review
+
+
+@task(max_attempts=10)
+def apply_order_stock(order_id):
+    """Decrement stock for an order's items (enqueued by checkout). Runs at most once per order."""
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order_id, stock_applied=False).update(stock_applied=True):
+            return  # already applied (a re-run after the job's status couldn't be saved)
+        product_ids = []
+        for product_id, quantity in OrderItem.objects.filter(order_id=order_id).values_list('product_id', 'quantity'):
+            if product_id is not None:
+                Product.objects.filter(pk=product_id).update(stock=Greatest(F('stock') - quantity, 0))
+                product_ids.append(product_id)
+    for product_id in product_ids:
+        bundles.invalidate(product_id)
+        feeds.mark_changed(product_id)
+
+
+@task()
+def refresh_product_rating(product_id):
+    """Store the average review rating on the product (enqueued on review submission)."""
+    avg = Review.objects.filter(product_id=product_id).aggregate(avg=Avg('rating'))['avg']
+    if avg is not None:
+        Product.objects.filter(pk=product_id).update(rating=round(avg, 1))
+        bundles.invalidate(product_id)
+        shells.invalidate_catalog()
+
+
+@task(every=shelves.SHELVES_MAX_AGE)
+def rebuild_home_shelves():
+    shelves.rebuild()
+    shells.invalidate_catalog()
+
+
+@task(every=900)
+def refresh_feeds():
+    # Only chunks whose products changed are rewritten
+    feeds.refresh()
+
+
+@task()
+def rollup_order(order_id):
+    """Fold an order's new status into the daily sales rollups (enqueued by the Order signal)."""
+    rollups.apply_order(order_id)
+
+
+@task(every=3600)
+def catch_up_sales_rollups():
+    # Status changes made with .update() send no signal
+    rollups.catch_up()
+
+
+@task(every=24 * 3600)
+def archive_old_orders():
+    archive.archive_orders()
+
+
+@task(every=24 * 3600)
+def purge_stale_data():
+    maintenance.purge_all(pause=0.05)
+    maintenance.incremental_vacuum(max_pages=maintenance.VACUUM_PAGES_PER_RUN)
+
+
+@task(every=24 * 3600)
+def purge_finished_jobs(days=7):
+    cutoff = timezone.now() - timedelta(days=days)
+    Job.objects.filter(status='done', finished_at__lt=cutoff).delete()
+
+
+@task(every=24 * 3600)
+def purge_old_profiles(days=14):
+    cutoff = timezone.now() - timedelta(days=days)
+    # Queryset deletes still send post_delete per row, which removes the profile files
+    RequestProfile.objects.filter(created_at__lt=cutoff).delete()
@@ -0,0 +1,28 @@
+from functools import lru_cache
+
+from django import template
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+
+@lru_cache(maxsize=None)
+def _read_static(path):
+    # Prefer the collected copy (what production serves), fall back to the
+    # finders so that it also works under runserver without collectstatic.
+    if staticfiles_storage.exists(path):
+        with staticfiles_storage.open(path) as fh:
+            return fh.read().decode('utf-8')
+    found = finders.find(path)
+    if not found:
+        return ''
+    with open(found, encoding='utf-8') as fh:
+        return fh.read()
+
+
+@register.simple_tag
+def inline_static(path):
+    """Inline a static text file (e.g. critical CSS) into the page."""
+    return mark_safe(_read_static(path))
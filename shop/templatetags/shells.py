@@ -0,0 +1,18 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..shells import marker
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name):
+    """
+    A per-visitor spot of the page (see shop/shells.py): the fragment
+    ``shop/fragments/<name>.html`` rendered inline, or a marker when the page
+    is being rendered as a shared shell.
+    """
+    if context.get('shell'):
+        return mark_safe(marker(name))
+    return context.template.engine.get_template(f'shop/fragments/{name}.html').render(context)
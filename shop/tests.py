@@ -0,0 +1,709 @@
+import hashlib
+import io
+import os
+import re
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import (
+    addresses, archive, catalog, feeds, guest_cart, jobs, maintenance, metrics, order_ids, profiling, promotions,
+    rollups, search_index, serviceability, shells, tasks, versions,
+)
+from .cache_backend import TwoTierCache
+from .models import (
+    Address, ArchivedOrder, CartItem, Category, Coupon, CouponRedemption, CouponUsage, DailyCategorySales,
+    DailyProductSales, DailyStatusSales, Job, Order, OrderItem, Product, Review, Wishlist,
+)
+
+# Never the dev server's on-disk cache: its versions and entries belong to another database
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shop-tests'}}
+
+# Pages render without collectstatic having built the manifest
+PLAIN_STATIC = {**settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ShopTestCase(TestCase):
+    """A private cache, empty at the start of every test."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+class ApplyOrderStockTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user('buyer', password='x')
+        category = Category.objects.create(name='Phones', slug='phones')
+        self.product = Product.objects.create(category=category, name='Phone', slug='phone', price=100, stock=10)
+        self.order = Order.objects.create(user=user, order_id='TEST0001', total_amount=300)
+        OrderItem.objects.create(order=self.order, product=self.product, quantity=3, price=100)
+
+    def test_running_twice_decrements_once(self):
+        tasks.apply_order_stock(order_id=self.order.pk)
+        tasks.apply_order_stock(order_id=self.order.pk)
+        self.product.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(self.product.stock, 7)
+        self.assertTrue(self.order.stock_applied)
+
+    def test_requeued_job_does_not_reapply(self):
+        # A job whose 'done' status was never saved is requeued and runs again
+        job = jobs.enqueue('tasks.apply_order_stock', {'order_id': self.order.pk})
+        self.assertTrue(jobs.run_job(job.pk))
+        Job.objects.filter(pk=job.pk).update(status='queued')
+        self.assertTrue(jobs.run_job(job.pk))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 7)
+
+
+class JobHeartbeatTests(ShopTestCase):
+    def test_renewed_lock_is_not_requeued(self):
+        job = jobs.enqueue('tasks.refresh_feeds')
+        self.assertEqual(jobs.claim('w1'), [job.pk])
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(seconds=jobs.STALE_AFTER + 1))
+        self.assertEqual(jobs.heartbeat(job.pk, 'w2'), 0)
+        self.assertEqual(jobs.heartbeat(job.pk, 'w1'), 1)
+        self.assertEqual(jobs.requeue_stale(), 0)
+
+    def test_long_task_beats_until_it_finishes(self):
+        def slow():
+            time.sleep(0.2)
+
+        job = jobs.enqueue('tests.slow')
+        jobs.claim('w1')
+        with mock.patch.dict(jobs._tasks, {'tests.slow': jobs.TaskSpec('tests.slow', slow, 1, None)}), \
+                mock.patch.object(jobs, 'HEARTBEAT_EVERY', 0.02), mock.patch.object(jobs, 'heartbeat') as beat:
+            self.assertTrue(jobs.run_job(job.pk))
+            beats = beat.call_count
+            time.sleep(0.1)
+        self.assertGreater(beats, 2)
+        self.assertEqual(beat.call_count, beats)
+        beat.assert_called_with(job.pk, 'w1')
+
+
+class CouponClaimTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('shopper', password='x')
+        self.coupon = Coupon.objects.create(code='ONCE', value=10, per_user_limit=1, usage_limit=5)
+
+    def rule(self):
+        return promotions.get_rules()[0]['ONCE']
+
+    def test_per_user_limit_is_claimed_once(self):
+        self.assertTrue(promotions.claim(self.rule(), self.user))
+        self.assertFalse(promotions.claim(self.rule(), self.user))
+        self.coupon.refresh_from_db()
+        # The refused claim gave back its global use
+        self.assertEqual(self.coupon.used_count, 1)
+        self.assertEqual(CouponUsage.objects.get(coupon=self.coupon, user=self.user).used, 1)
+
+
+class PromotionEvaluateTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('shopper', password='x')
+        for n in range(3):
+            Coupon.objects.create(code=f'auto{n}', value=5 + n, per_user_limit=1, auto_apply=True)
+        promotions.bump_version()
+
+    def test_codes_match_case_insensitively(self):
+        Coupon.objects.create(code='save10', value=10)
+        promotions.bump_version()
+        rule, discount, error = promotions.evaluate([], 1000, self.user, code='Save10')
+        self.assertIsNone(error)
+        self.assertEqual(rule.code, 'SAVE10')
+
+    def test_auto_rules_cost_one_usage_query(self):
+        promotions.get_rules()  # compiled rules are cached per process
+        with self.assertNumQueries(1):
+            rule, discount, _ = promotions.evaluate([], 1000, self.user)
+        self.assertEqual(rule.code, 'AUTO2')
+
+
+class PurgeTests(ShopTestCase):
+    def test_cart_of_returning_user_survives_a_batch_selected_before(self):
+        old = timezone.now() - timedelta(days=maintenance.CART_ABANDON_DAYS + 5)
+        user = User.objects.create_user('returning', password='x', last_login=old)
+        category = Category.objects.create(name='Books', slug='books')
+        product = Product.objects.create(category=category, name='Book', slug='book', price=10)
+        item = CartItem.objects.create(user=user, product=product)
+        CartItem.objects.filter(pk=item.pk).update(added_at=old)
+
+        cutoff = timezone.now() - timedelta(days=maintenance.CART_ABANDON_DAYS)
+        abandoned = CartItem.objects.filter(added_at__lt=cutoff, user__last_login__lt=cutoff)
+        pks = list(abandoned.values_list('pk', flat=True))
+        self.assertEqual(pks, [item.pk])
+        User.objects.filter(pk=user.pk).update(last_login=timezone.now())  # logs in meanwhile
+        self.assertEqual(maintenance._delete_in_batches(abandoned, pks, 100, 0), 0)
+        self.assertTrue(CartItem.objects.filter(pk=item.pk).exists())
+
+
+class CreateOrderTests(ShopTestCase):
+    def test_retries_with_a_fresh_id_on_collision(self):
+        user = User.objects.create_user('buyer', password='x')
+        Order.objects.create(user=user, order_id='TAKEN0000000A', total_amount=1)
+        with mock.patch.object(order_ids, 'new_order_id', side_effect=['TAKEN0000000A', 'FRESH0000000B']):
+            order = order_ids.create_order(user=user, total_amount=5)
+        self.assertEqual(order.order_id, 'FRESH0000000B')
+
+
+class RollupTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user('buyer', password='x')
+        self.category = Category.objects.create(name='Phones', slug='phones')
+        self.phone = Product.objects.create(category=self.category, name='Phone', slug='phone', price=100)
+        self.case = Product.objects.create(category=self.category, name='Case', slug='case', price=10)
+        self.order = Order.objects.create(user=user, order_id='ROLLUP00001', total_amount=230)
+        OrderItem.objects.create(order=self.order, product=self.phone, quantity=2, price=100)
+        OrderItem.objects.create(order=self.order, product=self.case, quantity=3, price=10)
+        self.day = timezone.localdate(self.order.created_at)
+
+    def replay_jobs(self):
+        # Each rollup job runs twice, as it would if its 'done' status was lost
+        for job in Job.objects.filter(name='tasks.rollup_order', status='queued'):
+            jobs.run_job(job.pk)
+            Job.objects.filter(pk=job.pk).update(status='queued')
+            jobs.run_job(job.pk)
+
+    def set_status(self, status):
+        self.order.refresh_from_db()
+        self.order.status = status
+        self.order.save()
+        self.replay_jobs()
+        self.assertFalse(rollups.apply_order(self.order.pk))
+        self.assertEqual(rollups.catch_up(), 0)
+
+    def totals(self):
+        return (
+            sorted(DailyProductSales.objects.filter(day=self.day).values_list('product_id', 'units', 'revenue')),
+            sorted(DailyCategorySales.objects.filter(day=self.day).values_list('category_id', 'units', 'revenue')),
+            sorted(DailyStatusSales.objects.filter(day=self.day, orders__gt=0).values_list('status', 'orders', 'revenue')),
+        )
+
+    def test_replayed_changes_are_counted_once(self):
+        self.replay_jobs()
+        self.set_status('processing')
+        self.set_status('delivered')
+        self.assertEqual(self.totals(), (
+            [(self.phone.pk, 2, 200), (self.case.pk, 3, 30)],
+            [(self.category.pk, 5, 230)],
+            [('delivered', 1, 230)],
+        ))
+
+    def test_a_concurrent_run_finds_the_change_claimed(self):
+        # Both runs read the order before either has written anything
+        seen = Order.objects.filter(pk=self.order.pk).values('status', 'rollup_status', 'created_at', 'total_amount').first()
+        self.assertTrue(rollups.apply_order(self.order.pk))
+        with mock.patch('django.db.models.query.QuerySet.first', return_value=seen):
+            self.assertFalse(rollups.apply_order(self.order.pk))
+        self.assertEqual(self.totals()[2], [('pending', 1, 230)])
+        self.assertEqual(self.totals()[0], [(self.phone.pk, 2, 200), (self.case.pk, 3, 30)])
+
+    def test_cancelling_takes_the_sales_back_out(self):
+        self.replay_jobs()
+        self.set_status('cancelled')
+        self.assertEqual(self.totals(), (
+            [(self.phone.pk, 0, 0), (self.case.pk, 0, 0)],
+            [(self.category.pk, 0, 0)],
+            [('cancelled', 1, 230)],
+        ))
+
+
+class ArchiveTests(ShopTestCase):
+    def test_coupon_redemption_follows_the_archived_order(self):
+        user = User.objects.create_user('buyer', password='x')
+        coupon = Coupon.objects.create(code='OLD', value=10)
+        order = Order.objects.create(user=user, order_id='OLD00000001', total_amount=90,
+                                     status='delivered', rollup_status='delivered')
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=400))
+        CouponRedemption.objects.create(coupon=coupon, user=user, order=order, amount=10)
+
+        self.assertEqual(archive.archive_batch(), 1)
+        redemption = CouponRedemption.objects.get()
+        self.assertIsNone(redemption.order_id)
+        self.assertEqual(redemption.archived_order, ArchivedOrder.objects.get(order_id='OLD00000001'))
+
+    def test_rebuilding_rollups_keeps_archived_sales(self):
+        user = User.objects.create_user('buyer', password='x')
+        category = Category.objects.create(name='Phones', slug='phones')
+        product = Product.objects.create(category=category, name='Phone', slug='phone', price=100)
+        for n, status in enumerate(('delivered', 'cancelled', 'delivered', 'pending')):
+            order = Order.objects.create(user=user, order_id=f'ROLL{n:07}', total_amount=100 * (n + 1), status=status)
+            OrderItem.objects.create(order=order, product=product, quantity=n + 1, price=100)
+            if n < 3:  # old enough to archive
+                Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=400 + n))
+        rollups.catch_up()
+
+        def snapshot():
+            return [
+                sorted(model.objects.values_list(*fields))
+                for model, fields in ((DailyProductSales, ('day', 'product_id', 'units', 'revenue')),
+                                      (DailyCategorySales, ('day', 'category_id', 'units', 'revenue')),
+                                      (DailyStatusSales, ('day', 'status', 'orders', 'revenue')))
+            ]
+        before = snapshot()
+        self.assertEqual(archive.archive_orders(), 3)
+        rollups.rebuild()
+        self.assertEqual(snapshot(), before)
+
+
+ADDRESS = {
+    'full_name': 'Asha Rao', 'phone': '9876543210', 'email': 'asha@example.com', 'pincode': '560001',
+    'address_line': '12 MG Road', 'flat_house_no': 'Flat 4B', 'landmark': 'Near Metro',
+}
+
+
+class AddressTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('buyer', password='x')
+
+    def test_checkout_reuses_the_same_address_written_differently(self):
+        category = Category.objects.create(name='Phones', slug='phones')
+        product = Product.objects.create(category=category, name='Phone', slug='phone', price=100, stock=10)
+        self.client.force_login(self.user)
+        written_again = {
+            **ADDRESS, 'full_name': 'ASHA  RAO', 'phone': '+91 98765-43210',
+            'address_line': '12, MG Road.', 'landmark': 'near metro.',
+        }
+        with self.settings(PINCODE_INDEX_PATH=os.path.join(tempfile.gettempdir(), 'no-such-pincodes.idx')):
+            serviceability.reset()
+            self.addCleanup(serviceability.reset)
+            for values in (ADDRESS, written_again):
+                CartItem.objects.create(user=self.user, product=product, quantity=1)
+                response = self.client.post('/checkout/', values)
+                self.assertEqual(response.status_code, 302)
+        address = Address.objects.get(user=self.user)
+        self.assertTrue(address.is_default)
+        self.assertEqual(list(Order.objects.values_list('address_id', flat=True)), [address.pk, address.pk])
+
+    def test_a_new_address_takes_over_as_default(self):
+        with transaction.atomic():
+            first = addresses.save_default(self.user, ADDRESS)
+        with transaction.atomic():
+            second = addresses.save_default(self.user, {**ADDRESS, 'flat_house_no': 'Flat 9C'})
+        self.assertNotEqual(first.pk, second.pk)
+        self.assertEqual(list(Address.objects.filter(user=self.user, is_default=True)), [second])
+        with transaction.atomic():
+            again = addresses.save_default(self.user, ADDRESS)
+        self.assertEqual(again.pk, first.pk)
+        self.assertEqual(list(Address.objects.filter(user=self.user, is_default=True)), [first])
+
+    def test_dedupe_folds_legacy_duplicates_into_the_default(self):
+        # Rows from before content_hash existed: bulk_create skips the pre_save hashing
+        default, copy, other = Address.objects.bulk_create([
+            Address(user=self.user, is_default=True, **ADDRESS),
+            Address(user=self.user, **{**ADDRESS, 'address_line': '12, MG road.', 'phone': '09876543210'}),
+            Address(user=self.user, **{**ADDRESS, 'pincode': '560002'}),
+        ])
+        order = Order.objects.create(user=self.user, address=copy, order_id='ADDR0000001', total_amount=10)
+        archived = ArchivedOrder.objects.create(id=order.pk + 1, user=self.user, address=copy, order_id='ADDR0000002',
+                                                total_amount=10, status='delivered', created_at=timezone.now())
+
+        self.assertEqual(addresses.dedupe_batch(), (1, 1))
+        self.assertEqual(addresses.dedupe_batch(), (0, 0))
+        self.assertEqual(set(Address.objects.values_list('pk', flat=True)), {default.pk, other.pk})
+        self.assertFalse(Address.objects.filter(content_hash='').exists())
+        self.assertTrue(Address.objects.get(pk=default.pk).is_default)
+        order.refresh_from_db()
+        archived.refresh_from_db()
+        self.assertEqual((order.address_id, archived.address_id), (default.pk, default.pk))
+
+
+PINCODES_CSV = """pincode,pincode_end,zone,min_days,max_days,cod
+560001,560010,south,1,2,yes
+560005,,south-express,1,1,no
+110001,110003,north,3,5,no
+"""
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class ServiceabilityTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.enterContext(override_settings(PINCODE_INDEX_PATH=os.path.join(self.dir.name, 'pincodes.idx')))
+        serviceability.reset()
+        self.addCleanup(serviceability.reset)
+        self.load(PINCODES_CSV)
+
+    def load(self, rows):
+        path = os.path.join(self.dir.name, 'pincodes.csv')
+        with open(path, 'w', encoding='utf-8') as fh:
+            fh.write(rows)
+        call_command('load_pincodes', path, stdout=io.StringIO())
+
+    def answer(self, pincode):
+        found = serviceability.estimate(pincode, start=date(2026, 1, 1))
+        if not found['serviceable']:
+            return None
+        return found['zone'], found['earliest'].day - 1, found['latest'].day - 1, found['cod']
+
+    def test_range_boundaries(self):
+        self.assertEqual(serviceability.get_index().range_count, 4)
+        expected = {
+            '100000': None, '110000': None, '110001': ('north', 3, 5, False), '110003': ('north', 3, 5, False),
+            '110004': None, '560000': None, '560001': ('south', 1, 2, True), '560004': ('south', 1, 2, True),
+            # the faster overlapping rule wins for its one pincode
+            '560005': ('south-express', 1, 1, False), '560006': ('south', 1, 2, True),
+            '560010': ('south', 1, 2, True), '560011': None, '999999': None, '56001': None, 'abcdef': None,
+        }
+        self.assertEqual({pincode: self.answer(pincode) for pincode in expected}, expected)
+
+    def test_rebuilt_index_is_picked_up_after_the_reload_check(self):
+        self.assertIsNone(self.answer('400001'))
+        self.load(PINCODES_CSV + "400001,,west,2,4,yes\n")
+        self.assertIsNone(self.answer('400001'))  # checked moments ago
+        with mock.patch.object(serviceability, 'RELOAD_CHECK_SECONDS', 0):
+            self.assertEqual(self.answer('400001'), ('west', 2, 4, True))
+
+    def test_checkout_refuses_an_unserviceable_pincode(self):
+        user = User.objects.create_user('buyer', password='x')
+        CartItem.objects.create(user=user, product=Product.objects.create(
+            category=Category.objects.create(name='Phones', slug='phones'), name='Phone', slug='phone', price=100,
+        ))
+        self.client.force_login(user)
+        response = self.client.post('/checkout/', {**ADDRESS, 'pincode': '400001'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "deliver to pincode 400001")
+        self.assertFalse(Order.objects.exists())
+        self.assertTrue(CartItem.objects.filter(user=user).exists())
+
+
+class GuestCartTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(name='Phones', slug='phones')
+        self.phone = Product.objects.create(category=category, name='Phone', slug='phone', price=100, stock=10)
+        self.case = Product.objects.create(category=category, name='Case', slug='case', price=10, stock=10)
+
+    def cookie(self):
+        return self.client.cookies[guest_cart.COOKIE_NAME].value
+
+    def test_cookie_round_trip(self):
+        for product in (self.phone, self.phone, self.case):
+            self.client.get(f'/cart/add/{product.pk}/')
+        self.assertEqual(guest_cart.GuestCart(self.cookie()).lines, [[self.phone.pk, None, 2], [self.case.pk, None, 1]])
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_tampered_cookie_is_ignored(self):
+        self.client.get(f'/cart/add/{self.phone.pk}/')
+        value, signature = self.cookie().rsplit(':', 1)
+        self.assertEqual(guest_cart.GuestCart(f'{value[:-1]}9:{signature}').lines, [])
+        self.assertEqual(guest_cart.GuestCart(f'{self.phone.pk}::5').lines, [])
+
+    def test_line_cap(self):
+        cart = guest_cart.GuestCart()
+        for product_id in range(1, guest_cart.MAX_LINES + 1):
+            self.assertTrue(cart.add(product_id))
+        self.assertFalse(cart.add(guest_cart.MAX_LINES + 1))
+        self.assertTrue(cart.add(1))  # an existing line can still grow
+        oversized = guest_cart._encode([[n, None, 1] for n in range(1, 41)])
+        self.assertEqual(len(guest_cart._decode(oversized)), guest_cart.MAX_LINES)
+
+    def test_login_merges_into_the_cart(self):
+        user = User.objects.create_user('buyer', password='x')
+        CartItem.objects.create(user=user, product=self.phone, quantity=2)
+        for product in (self.phone, self.phone, self.phone, self.case):
+            self.client.get(f'/cart/add/{product.pk}/')
+        version = versions.current(shells.VISITOR_VERSION_KEY.format(user.pk))
+
+        response = self.client.post('/login/', {'username': 'buyer', 'password': 'x'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            sorted(CartItem.objects.filter(user=user).values_list('product_id', 'quantity')),
+            [(self.phone.pk, 5), (self.case.pk, 1)],
+        )
+        self.assertNotEqual(versions.current(shells.VISITOR_VERSION_KEY.format(user.pk)), version)
+        self.assertEqual(self.cookie(), '')
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class CatalogSnapshotTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        catalog.reset()
+        self.addCleanup(catalog.reset)
+        category = Category.objects.create(name='Phones', slug='phones')
+        Product.objects.create(category=category, name='Phone', slug='phone', price=100, stock=10)
+
+    def test_version_bump_keeps_serving_while_rebuilding(self):
+        snapshot = catalog.get_snapshot()
+        shells.invalidate_catalog()
+        with mock.patch.object(catalog, '_start_refresh') as start_refresh:
+            self.assertIs(catalog.get_snapshot(), snapshot)
+        start_refresh.assert_called_once_with()
+
+    def test_listing_shell_is_keyed_by_the_snapshot_version(self):
+        snapshot = catalog.get_snapshot()
+        shells.invalidate_catalog()
+        with mock.patch.object(catalog, '_start_refresh'):
+            self.assertEqual(self.client.get('/products/').status_code, 200)
+        url = hashlib.sha1(b'/products/').hexdigest()
+        self.assertIsNotNone(cache.get(shells.SHELL_KEY.format(snapshot.version, 'light', url)))
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class PageShellTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        catalog.reset()
+        self.addCleanup(catalog.reset)
+        category = Category.objects.create(name='Phones', slug='phones')
+        self.phone = Product.objects.create(category=category, name='Phone', slug='phone', price=100, stock=10)
+        self.case = Product.objects.create(category=category, name='Case', slug='case', price=10, stock=10)
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        Wishlist.objects.create(user=self.alice, product=self.phone)
+        CartItem.objects.create(user=self.alice, product=self.case, quantity=3)
+
+    def page_for(self, user):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(user)
+        response = client.get('/products/')
+        self.assertEqual(response.status_code, 200)
+        return client, response.content.decode()
+
+    def hearts(self, html):
+        return sorted(int(product_id) for product_id in re.findall(r'bi-heart-fill text-danger" data-heart="(\d+)"', html))
+
+    def test_one_shell_filled_per_visitor(self):
+        with mock.patch.object(shells, 'render_to_string', wraps=shells.render_to_string) as render_shell:
+            alice, alice_html = self.page_for(self.alice)
+            bob, bob_html = self.page_for(self.bob)
+        self.assertEqual(render_shell.call_count, 1)
+
+        self.assertEqual(self.hearts(alice_html), [self.phone.pk])
+        self.assertEqual(self.hearts(bob_html), [])
+        self.assertEqual(len(re.findall(shells.HEART_RE, bob_html)), 2)
+        self.assertIn('Hi, Alice', alice_html)
+        self.assertNotIn('Hi, Alice', bob_html)
+        self.assertIn('Hi, Bob', bob_html)
+        badge = re.compile(r'badge rounded-pill bg-danger[^>]*>\s*(\d+)')
+        self.assertEqual(badge.findall(alice_html)[:1], ['3'])
+        self.assertEqual(badge.findall(bob_html), [])
+
+        for client, html in ((alice, alice_html), (bob, bob_html)):
+            self.assertNotIn(shells.CSRF_PLACEHOLDER, html)
+            token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', html).group(1)
+            response = client.post(f'/compare/add/{self.phone.pk}/', {'csrfmiddlewaretoken': token})
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(client.post(f'/compare/add/{self.phone.pk}/').status_code, 403)
+
+
+class SearchIndexTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Phones', slug='phones')
+        self.product = Product.objects.create(category=self.category, name='Pixel', slug='pixel', price=100)
+        self.index = search_index.rebuild()
+
+    def labels(self, query):
+        return [label for _, label, *_ in search_index.suggest(query)]
+
+    def test_changes_are_replayed_without_a_rebuild(self):
+        self.product.name = 'Galaxy'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+            Product.objects.create(category=self.category, name='Gadget', slug='gadget', price=5)
+        with mock.patch.object(search_index, '_start_rebuild') as start_rebuild:
+            self.assertEqual(sorted(self.labels('ga')), ['Gadget', 'Galaxy'])
+        start_rebuild.assert_not_called()
+        self.assertIs(search_index.get_index(), self.index)
+
+    def test_changes_wait_for_the_commit(self):
+        self.product.name = 'Galaxy'
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.product.save()
+        self.assertEqual(self.labels('ga'), [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.labels('ga'), ['Galaxy'])
+
+    def test_expired_change_triggers_a_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        cache.delete(search_index.CHANGE_KEY.format(cache.get(search_index.SEQ_KEY)))
+        with mock.patch.object(search_index, '_start_rebuild') as start_rebuild:
+            search_index.suggest('pix')
+        start_rebuild.assert_called_once_with()
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class FeedViewTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        feeds_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(feeds_dir.cleanup)
+        self.enterContext(override_settings(FEEDS_DIR=feeds_dir.name, SITE_URL='https://shop.example'))
+        category = Category.objects.create(name='Phones', slug='phones')
+        Product.objects.create(category=category, name='Phone', slug='phone', price=100, stock=3)
+
+    def test_not_built_yet_queues_one_refresh(self):
+        with mock.patch.object(feeds.time, 'time', return_value=1_000_000.0):  # same coalescing slot
+            for url in ('/feeds/products.csv', '/sitemap.xml'):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 503)
+                self.assertIn('Retry-After', response)
+        self.assertEqual(Job.objects.filter(name='tasks.refresh_feeds').count(), 1)
+
+        feeds.refresh()
+        response = self.client.get('/feeds/products.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Phone', b''.join(response.streaming_content).decode())
+
+    def test_xml_feed_is_google_merchant_rss(self):
+        feeds.refresh()
+        body = b''.join(self.client.get('/feeds/products.xml').streaming_content)
+        channel = ElementTree.fromstring(body).find('channel')
+        item = channel.find('item')
+        g = '{%s}' % feeds.GOOGLE_NS
+        self.assertEqual(item.findtext('title'), 'Phone')
+        self.assertEqual(item.findtext('link'), 'https://shop.example/product/phone/')
+        self.assertEqual(item.findtext(g + 'price'), '100.00 INR')
+        self.assertEqual(item.findtext(g + 'availability'), 'in_stock')
+
+
+class ShelfRebuildTests(ShopTestCase):
+    def test_rebuild_is_queued_after_the_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Phones', slug='phones')
+            self.assertFalse(Job.objects.filter(name='tasks.rebuild_home_shelves').exists())
+        self.assertTrue(Job.objects.filter(name='tasks.rebuild_home_shelves').exists())
+
+
+class ProductReviewsTests(ShopTestCase):
+    def test_dates_are_in_local_time(self):
+        user = User.objects.create_user('reviewer', password='x')
+        category = Category.objects.create(name='Phones', slug='phones')
+        product = Product.objects.create(category=category, name='Phone', slug='phone', price=100)
+        review = Review.objects.create(product=product, user=user, rating=4, comment='Good')
+        # 20:00 UTC is already the next day in Asia/Kolkata
+        Review.objects.filter(pk=review.pk).update(created_at=datetime(2026, 3, 1, 20, 0, tzinfo=dt_timezone.utc))
+        with self.settings(TIME_ZONE='Asia/Kolkata'):
+            data = self.client.get('/product/phone/reviews/').json()
+        self.assertEqual(data['reviews'][0]['created_at'], '02 Mar 2026')
+
+
+class SwitchIntervalTests(SimpleTestCase):
+    def test_restored_when_the_last_profiled_request_ends(self):
+        original = sys.getswitchinterval()
+        profiling.shorten_switch_interval(0.001)
+        profiling.shorten_switch_interval(0.002)
+        self.assertEqual(sys.getswitchinterval(), 0.001)
+        profiling.restore_switch_interval()
+        self.assertEqual(sys.getswitchinterval(), 0.001)
+        profiling.restore_switch_interval()
+        self.assertEqual(sys.getswitchinterval(), original)
+
+
+SAMPLE_RE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-z_]+="([^"\\\n]|\\[\\"n])*",?)*\})? \S+$')
+
+
+class MetricsTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_dir.cleanup)
+        self.enterContext(override_settings(METRICS_DIR=metrics_dir.name, METRICS_TOKEN='s3cret'))
+        self.enterContext(mock.patch.dict(metrics._state, store=None))
+        metrics.reset()
+
+    def test_render_is_valid_exposition_text(self):
+        metrics.observe_request('product_list', 'GET', 200, 0.03, 4, 0.01, 0.02)
+        metrics.observe_request('odd "view"\\\n', 'POST', 500, 20.0, 1, 0.5, 0.0)
+        metrics.flush(force=True)
+        lines = metrics.render().splitlines()
+
+        samples = [line for line in lines if not line.startswith('#')]
+        self.assertEqual([line for line in samples if not SAMPLE_RE.match(line)], [])
+        self.assertIn('# TYPE shop_request_duration_seconds histogram', lines)
+        series = [line for line in samples if 'view="product_list"' in line and 'duration' in line]
+        self.assertEqual(series, [
+            *(f'shop_request_duration_seconds_bucket{{method="GET",view="product_list",le="{le}"}} {value}'
+              for le, value in (('0.005', 0.0), ('0.01', 0.0), ('0.025', 0.0), ('0.05', 1.0), ('0.1', 1.0),
+                                ('0.25', 1.0), ('0.5', 1.0), ('1.0', 1.0), ('2.5', 1.0), ('5.0', 1.0),
+                                ('10.0', 1.0), ('+Inf', 1.0))),
+            'shop_request_duration_seconds_sum{method="GET",view="product_list"} 0.03',
+            'shop_request_duration_seconds_count{method="GET",view="product_list"} 1.0',
+        ])
+        self.assertIn('shop_requests_total{status="500",view="odd \\"view\\"\\\\\\n"} 1.0', samples)
+        self.assertIn('shop_request_duration_seconds_bucket{method="POST",view="odd \\"view\\"\\\\\\n",le="10.0"} 0.0',
+                      samples)
+
+    def test_scrape_needs_staff_or_the_token(self):
+        User.objects.create_user('shopper', password='x')
+        User.objects.create_user('admin', password='x', is_staff=True)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        with self.settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+        self.client.login(username='shopper', password='x')
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.client.login(username='admin', password='x')
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        self.location = location.name
+
+    def backend(self, **options):
+        return TwoTierCache(self.location, {'OPTIONS': options})
+
+    def test_write_in_another_process_invalidates_the_local_copy(self):
+        backend = self.backend()
+        backend.set('key', 1)
+        self.assertEqual(backend.get('key'), 1)
+        self.assertEqual(backend.get('key'), 1)  # now served from the local tier
+        pid = os.fork()
+        if pid == 0:  # another worker on the same machine
+            try:
+                TwoTierCache(self.location, {}).set('key', 2)
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertEqual(backend.get('key'), 2)
+        stats = backend.stats()
+        self.assertEqual((stats['local_hits'], stats['stale'], stats['shared_hits']), (1, 1, 2))
+
+    def test_local_tier_evicts_least_recently_used(self):
+        backend = self.backend(LOCAL_MAX_ENTRIES=2)
+        for key in 'abc':
+            backend.set(key, key)
+        backend.get('a')
+        backend.get('b')
+        backend.get('a')  # local hit: 'b' is now the oldest
+        backend.get('c')  # evicts 'b'
+        backend.get('a')  # still local
+        backend.get('b')  # back from the shared store, evicting 'c'
+        backend.get('missing')
+        stats = backend.stats()
+        self.assertEqual(
+            {name: stats[name] for name in ('sets', 'local_hits', 'shared_hits', 'misses', 'evictions', 'local_entries')},
+            {'sets': 3, 'local_hits': 2, 'shared_hits': 4, 'misses': 1, 'evictions': 2, 'local_entries': 2},
+        )
+        self.assertEqual(stats['hit_ratio'], round(6 / 7, 4))
@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import path, re_path
 from django.contrib.auth import views as auth_views
 from . import views
 from .views import logout_view
@@ -8,6 +8,8 @@ urlpatterns = [
     path('products/', views.product_list, name='product_list'),
     path('category/<slug:slug>/', views.product_list, name='product_list_by_category'),
     path('product/<slug:slug>/', views.product_detail, name='product_detail'),
+    path('product/<slug:slug>/reviews/', views.product_reviews, name='product_reviews'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
 
     path('cart/', views.cart_view, name='cart'),
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
@@ -17,6 +19,12 @@ urlpatterns = [
     path('checkout/', views.checkout, name='checkout'),
     path('orders/', views.my_orders, name='my_orders'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('staff/analytics/', views.sales_analytics, name='sales_analytics'),
+    path('staff/cache-stats/', views.cache_stats, name='cache_stats'),
+    path('metrics', views.metrics, name='metrics'),
+    # At the site root: a sitemap may only list URLs below its own directory
+    re_path(r'^(?P<name>sitemap(?:-pages|-products-\d+)?\.xml)$', views.sitemap_file, name='sitemap_file'),
+    path('feeds/products.<str:fmt>', views.product_feed, name='product_feed'),
 
     path('login/', auth_views.LoginView.as_view(template_name='shop/login.html'), name='login'),
     path("logout/", logout_view, name="logout"),
@@ -0,0 +1,25 @@
+"""
+Version stamps kept in the cache.
+
+A cached thing (page shells, product bundles, coupon rules, feed chunks) is
+stored under the current version of whatever it was built from; bumping the
+version makes every worker's copy stale at once without deleting anything.
+A version that isn't set yet (or was evicted) starts out as a fresh one,
+which every worker then agrees on.
+"""
+import uuid
+
+from django.core.cache import cache
+
+
+def current(key):
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def bump(key):
+    cache.set(key, uuid.uuid4().hex, None)
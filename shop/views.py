@@ -1,17 +1,30 @@
-import uuid
+import hmac
+import os
 from decimal import Decimal
-from datetime import date, timedelta
 
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.conf import settings
+from django.core.cache import caches
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.core.paginator import Paginator
 from django.contrib import messages
-from django.db.models import Q, Sum, F
-from .models import Product, Category, CartItem, Order, OrderItem, Address, Wishlist, ProductVariant, VariantType, Review
+from django.db import transaction
+from django.db.models import Q, F, TextField, Value
+from django.db.models.functions import Coalesce, NullIf, Substr
+from django.utils import timezone
+from .models import Product, Category, CartItem, Order, OrderItem, Address, Wishlist, ProductVariant, VariantType, Review, CouponRedemption, ArchivedOrder
 from .forms import RegisterForm, AddressForm, ReviewForm
+from . import addresses, analytics, archive, bundles, catalog, feeds, jobs, order_ids, promotions, serviceability, shells
+from . import metrics as request_metrics
+from . import reviews as review_pages
+from . import search_index
+from . import shelves as shelves_snapshot
+from .pricing import cart_totals
 from django.views.decorators.http import require_POST
 from django.contrib.auth import logout
-from django.db.models import Avg
 from .models import VariantType
 
 def _push_recently_viewed(request, product_id, max_items=8):
@@ -28,83 +41,114 @@ def _push_recently_viewed(request, product_id, max_items=8):
 
 
 def home(request):
-    query = request.GET.get('q')
-    category_slug = request.GET.get('category')
-    products = Product.objects.all()
-
-    if query:
-        products = products.filter(
-            Q(name__icontains=query) |
-            Q(short_description__icontains=query) |
-            Q(description__icontains=query)
-        )
-    if category_slug:
-        products = products.filter(category__slug=category_slug)
-
-    hot_deals = products.filter(is_hot_deal=True)[:8]
-    top_deals = products.filter(is_top_deal=True)[:8]
-    latest_products = products.order_by('-created_at')[:12]
-    recent_ids = request.session.get('recently_viewed', [])
-    recent_products_qs = Product.objects.filter(id__in=recent_ids)
-    recent_products = list(recent_products_qs)
-    recent_products.sort(key=lambda p: recent_ids.index(p.id))
-    recently_viewed_products = recent_products[:8]
+    snapshot = catalog.get_snapshot()
 
+    def build_context():
+        query = request.GET.get('q')
+        category_slug = request.GET.get('category')
 
-    context = {
-        'hot_deals': hot_deals,
-        'top_deals': top_deals,
-        'latest_products': latest_products,
-        'recently_viewed_products': recently_viewed_products,
-    }
-    return render(request, 'shop/home.html', context)
+        if query:
+            products = Product.objects.select_related('category').filter(
+                Q(name__icontains=query) |
+                Q(short_description__icontains=query) |
+                Q(description__icontains=query)
+            )
+            if category_slug:
+                products = products.filter(category__slug=category_slug)
+            shelves = {
+                name: qs[:shelves_snapshot.SHELF_SIZES[name]]
+                for name, qs in shelves_snapshot.shelf_querysets(products).items()
+            }
+        elif category_slug:
+            # Picked from the in-memory catalog; only the shelf products are loaded
+            category = snapshot.categories.get(category_slug)
+            if category is None:
+                shelves = {name: [] for name in shelves_snapshot.SHELF_SIZES}
+            else:
+                shelves = catalog.hydrate_shelves(snapshot.shelves(category.id))
+        else:
+            # Same for every visitor: served from the precomputed snapshot
+            shelves = shelves_snapshot.get_shelves()
+
+        return {
+            'hot_deals': shelves['hot_deals'],
+            'top_deals': shelves['top_deals'],
+            'latest_products': shelves['latest_products'],
+        }
+
+    # Recently viewed and the account button are holes, filled per visitor.
+    # Keyed by the snapshot's version: it may still be catching up with the catalog.
+    return shells.serve(request, 'shop/home.html', build_context, snapshot.version)
+
+def search_suggest(request):
+    """Autocomplete for the search box, answered from the in-process prefix index."""
+    query = request.GET.get('q', '')
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 8)), 10))
+    except ValueError:
+        limit = 8
+
+    suggestions = []
+    for _, label, kind, slug, _ in search_index.suggest(query, limit):
+        if kind == 'product':
+            url = reverse('product_detail', args=[slug])
+        else:
+            url = reverse('product_list_by_category', args=[slug])
+        suggestions.append({'label': label, 'kind': kind, 'url': url})
+    return JsonResponse({'q': query, 'suggestions': suggestions})
 
 def product_list(request, slug=None):
-    category = None
-    categories = Category.objects.all()
-    products = Product.objects.all()
-
-    if slug:
-        category = get_object_or_404(Category, slug=slug)
-        products = products.filter(category=category)
-
-    query = request.GET.get('q')
-    if query:
-        products = products.filter(
-            Q(name__icontains=query) |
-            Q(short_description__icontains=query) |
-            Q(description__icontains=query)
-        )
-
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    # ✅ Wishlist IDs for current user (for filled heart icon)
-    wishlist_ids = []
-    if request.user.is_authenticated:
-        wishlist_ids = list(
-            Wishlist.objects.filter(user=request.user)
-            .values_list("product_id", flat=True)
-        )
+    # Shared shell; wishlist hearts and the header are filled per visitor (see shells.py)
+    snapshot = catalog.get_snapshot()
+
+    def build_context():
+        category = None
+        query = request.GET.get('q')
+        sort = request.GET.get('sort')
+        if sort not in catalog.ORDERINGS:
+            sort = catalog.DEFAULT_SORT
+
+        if query:
+            # Text search still needs the database (descriptions aren't in the snapshot)
+            products = Product.objects.select_related('category').order_by(*catalog.ORDERINGS[sort])
+            if slug:
+                category = get_object_or_404(Category, slug=slug)
+                products = products.filter(category=category)
+            products = products.filter(
+                Q(name__icontains=query) |
+                Q(short_description__icontains=query) |
+                Q(description__icontains=query)
+            )
+            page_obj = Paginator(products, 12).get_page(request.GET.get('page'))
+        else:
+            # Filter, sort and slice in memory; only the page's products are loaded
+            if slug:
+                category = snapshot.categories.get(slug)
+                if category is None:
+                    raise Http404("No Category matches the given query.")
+            product_ids = snapshot.product_ids(category.id if category else None, sort)
+            page_obj = Paginator(product_ids, 12).get_page(request.GET.get('page'))
+            page_obj.object_list = catalog.hydrate(page_obj.object_list)
 
-    context = {
-        'category': category,
-        'categories': categories,
-        'page_obj': page_obj,
-        'is_paginated': page_obj.has_other_pages(),
-        'wishlist_ids': wishlist_ids,   # ✅ sent to template
-    }
-    return render(request, 'shop/product_list.html', context)
+        return {
+            'category': category,
+            'page_obj': page_obj,
+            'is_paginated': page_obj.has_other_pages(),
+            'sort': sort,
+        }
+
+    return shells.serve(request, 'shop/product_list.html', build_context, snapshot.version)
 
 
 @login_required(login_url='login')
 def product_detail(request, slug):
-    product = get_object_or_404(Product, slug=slug)
-    extra_images = product.images.all()
+    bundle = bundles.get(slug)
+    if bundle is None:
+        raise Http404("No Product matches the given query.")
+    product = bundle['product']
 
-    reviews = Review.objects.filter(product=product).order_by('-created_at')
-    recommended = Product.objects.filter(category=product.category).exclude(id=product.id)[:4]
+    reviews, next_cursor = review_pages.review_page(product.id)
+    rating_summary = review_pages.rating_summary(product.id)
 
     if request.method == 'POST':
         form = ReviewForm(request.POST)
@@ -117,39 +161,52 @@ def product_detail(request, slug):
                 review.product = product
                 review.user = request.user
                 review.save()
+                jobs.enqueue('tasks.refresh_product_rating', {'product_id': product.id}, key=f"rating:{review.pk}")
                 messages.success(request, "Review submitted successfully!")
             return redirect('product_detail', slug=slug)
     else:
         form = ReviewForm()
 
-    avg_rating = reviews.aggregate(avg=Avg('rating'))['avg'] or 0
-
     # ---------------- RECENTLY VIEWED ----------------
     _push_recently_viewed(request, product.id)
 
-    recent_ids = request.session.get('recently_viewed', [])
-    recent_products_qs = Product.objects.filter(id__in=recent_ids).exclude(id=product.id)
-    recent_products = list(recent_products_qs)
-    recent_products.sort(key=lambda p: recent_ids.index(p.id))
-    recently_viewed_products = recent_products[:8]
-
-    # ---------------- VARIANTS ----------------
-    variants = product.variants.select_related("variant_type").all().order_by("variant_type__name")
-    variant_types = VariantType.objects.filter(productvariant__product=product).distinct()
+    # Recommended and recently viewed cards share one query
+    recent_ids = [pid for pid in request.session.get('recently_viewed', []) if pid != product.id]
+    card_ids = set(bundle['recommended_ids']) | set(recent_ids)
+    cards = Product.objects.only('id', 'name', 'slug', 'price', 'image').in_bulk(card_ids) if card_ids else {}
+    recommended = [cards[pid] for pid in bundle['recommended_ids'] if pid in cards]
+    recently_viewed_products = [cards[pid] for pid in recent_ids if pid in cards][:8]
 
     return render(request, 'shop/product_detail.html', {
         'product': product,
         'recommended_products': recommended,
         'reviews': reviews,
+        'reviews_next': next_cursor,
+        'rating_summary': rating_summary,
         'form': form,
-        'avg_rating': round(avg_rating, 1),
-        'extra_images': extra_images,
-        'variants': variants,
-        'variant_types': variant_types,
+        'avg_rating': rating_summary['avg'],
+        'extra_images': bundle['extra_images'],
+        'variant_groups': bundle['variant_groups'],
         'recently_viewed_products': recently_viewed_products,
     })
 
-@login_required
+def product_reviews(request, slug):
+    """Next page of a product's reviews for the "load more" button."""
+    product_id = get_object_or_404(Product.objects.only('id'), slug=slug).id
+    reviews, next_cursor = review_pages.review_page(product_id, request.GET.get('after'))
+    return JsonResponse({
+        'reviews': [
+            {
+                'user': r.user.username.title(),
+                'rating': r.rating,
+                'comment': r.comment,
+                'created_at': timezone.localtime(r.created_at).strftime('%d %b %Y'),  # as the template's |date shows it
+            }
+            for r in reviews
+        ],
+        'next': next_cursor,
+    })
+
 def add_to_cart(request, product_id):
     product = get_object_or_404(Product, id=product_id)
     variant = None
@@ -158,6 +215,14 @@ def add_to_cart(request, product_id):
     if variant_id:
         variant = get_object_or_404(ProductVariant, id=variant_id, product=product)
 
+    if not request.user.is_authenticated:
+        # Anonymous carts live in a signed cookie until login (see guest_cart.py)
+        if request.guest_cart.add(product.id, variant.id if variant else None):
+            messages.success(request, f"Added {product.name} to your cart.")
+        else:
+            messages.warning(request, "Your cart is full. Log in to add more items.")
+        return redirect('cart')
+
     cart_item, created = CartItem.objects.get_or_create(
         user=request.user,
         product=product,
@@ -171,93 +236,95 @@ def add_to_cart(request, product_id):
     return redirect('cart')
 
 
-@login_required
 def cart_view(request):
-    cart_items = CartItem.objects.filter(user=request.user)
-
-    # Base subtotal and item count
-    subtotal = sum(item.subtotal for item in cart_items) or Decimal('0.00')
-    total_items = sum(item.quantity for item in cart_items) or 0
-
-    # Old bulk discount logic (20% if more than 5 items)
-    bulk_discount = Decimal('0.00')
-    if total_items > 5:
-        bulk_discount = (subtotal * Decimal('0.20')).quantize(Decimal('0.01'))
+    if not request.user.is_authenticated:
+        return _guest_cart_view(request)
+    cart_items = CartItem.objects.filter(user=request.user).select_related('product__category', 'variant__variant_type')
 
     # Handle coupon apply/clear (via modal form)
     coupon_code = request.session.get('coupon_code', '')
     if request.method == 'POST':
         code = request.POST.get('coupon_code', '').strip().upper()
         if code:
-            valid_codes = ['NEO10', 'FLAT100']
-            if code in valid_codes:
+            totals = cart_totals(cart_items, request.user, code)
+            if totals['coupon_error']:
+                request.session.pop('coupon_code', None)
+                messages.error(request, totals['coupon_error'])
+            else:
                 request.session['coupon_code'] = code
-                coupon_code = code
                 messages.success(request, f"Coupon {code} applied.")
-            else:
-                request.session.pop('coupon_code', None)
-                coupon_code = ''
-                messages.error(request, "Invalid coupon code.")
         else:
             # Empty input clears coupon
             request.session.pop('coupon_code', None)
-            coupon_code = ''
             messages.info(request, "Coupon removed.")
         return redirect('cart')
 
-    # Amount after bulk discount
-    amount_after_bulk = subtotal - bulk_discount
-    if amount_after_bulk < 0:
-        amount_after_bulk = Decimal('0.00')
-
-    # Coupon discount logic
-    coupon_discount = Decimal('0.00')
-    if coupon_code == 'NEO10':
-        coupon_discount = (amount_after_bulk * Decimal('0.10')).quantize(Decimal('0.01'))
-    elif coupon_code == 'FLAT100':
-        coupon_discount = Decimal('100.00')
-        if coupon_discount > amount_after_bulk:
-            coupon_discount = amount_after_bulk
-
-    # Amount after coupon (before GST)
-    total_before_gst = amount_after_bulk - coupon_discount
-    if total_before_gst < 0:
-        total_before_gst = Decimal('0.00')
-
-    # Simple GST placeholder (18%)
-    gst_estimate = (total_before_gst * Decimal('0.18')).quantize(Decimal('0.01'))
-
-    # Final total including GST
-    grand_total = total_before_gst + gst_estimate
-
-    # Delivery estimate: today + 3 to 5 days
-    today = date.today()
-    start = today + timedelta(days=3)
-    end = today + timedelta(days=5)
-    estimated_delivery = f"{start.strftime('%d %b')} – {end.strftime('%d %b')}"
+    # Bulk discount, coupon/promotion and GST (shared with checkout)
+    totals = cart_totals(cart_items, request.user, coupon_code)
+    promotion = totals['promotion']
+
+    # Delivery estimate for the pincode the user checked, else their default address
+    if 'pincode' in request.GET:
+        request.session['delivery_pincode'] = request.GET['pincode'].strip()[:10]
+    pincode = request.session.get('delivery_pincode') or (
+        Address.objects.filter(user=request.user, is_default=True).values_list('pincode', flat=True).first()
+    )
+    delivery = serviceability.estimate(pincode)
 
     context = {
-        'cart_items': cart_items,
-        'subtotal': subtotal,
-        'bulk_discount': bulk_discount,
-        'coupon_discount': coupon_discount,
-        'gst_estimate': gst_estimate,
-        'total': grand_total,
-        'total_items': total_items,
-        'coupon_code': coupon_code,
-        'estimated_delivery': estimated_delivery,
+        'cart_items': totals['items'],
+        'subtotal': totals['subtotal'],
+        'bulk_discount': totals['bulk_discount'],
+        'coupon_discount': totals['coupon_discount'],
+        'gst_estimate': totals['gst_estimate'],
+        'total': totals['grand_total'],
+        'total_items': totals['total_items'],
+        'coupon_code': promotion.code if promotion else coupon_code,
+        'delivery_pincode': pincode or '',
+        'delivery': delivery,
+        'estimated_delivery': delivery['label'],
     }
     return render(request, 'shop/cart.html', context)
 
-@login_required
+
+def _guest_cart_view(request):
+    """Cart page for anonymous visitors: same pricing, no coupons and nothing written to the database."""
+    if request.method == 'POST':
+        messages.info(request, "Log in to apply a coupon.")
+        return redirect('cart')
+
+    totals = cart_totals(request.guest_cart.items())
+    pincode = request.GET.get('pincode', '').strip()[:10]
+    delivery = serviceability.estimate(pincode)
+    return render(request, 'shop/cart.html', {
+        'cart_items': totals['items'],
+        'subtotal': totals['subtotal'],
+        'bulk_discount': totals['bulk_discount'],
+        'coupon_discount': totals['coupon_discount'],
+        'gst_estimate': totals['gst_estimate'],
+        'total': totals['grand_total'],
+        'total_items': totals['total_items'],
+        'coupon_code': totals['promotion'].code if totals['promotion'] else '',
+        'delivery_pincode': pincode,
+        'delivery': delivery,
+        'estimated_delivery': delivery['label'],
+    })
+
 def remove_from_cart(request, item_id):
+    if not request.user.is_authenticated:
+        request.guest_cart.remove(item_id)
+        messages.info(request, "Item removed from cart.")
+        return redirect('cart')
     item = get_object_or_404(CartItem, id=item_id, user=request.user)
     item.delete()
     messages.info(request, "Item removed from cart.")
     return redirect('cart')
 
-@login_required
 def update_cart_item(request, item_id):
+    if not request.user.is_authenticated:
+        if request.method == 'POST':
+            request.guest_cart.set_quantity(item_id, int(request.POST.get('quantity', 1)))
+        return redirect('cart')
     item = get_object_or_404(CartItem, id=item_id, user=request.user)
     if request.method == 'POST':
         qty = int(request.POST.get('quantity', 1))
@@ -270,46 +337,50 @@ def update_cart_item(request, item_id):
 
 @login_required
 def checkout(request):
-    cart_items = CartItem.objects.filter(user=request.user)
+    cart_items = CartItem.objects.filter(user=request.user).select_related('product', 'variant')
     if not cart_items.exists():
         messages.warning(request, "Your cart is empty.")
         return redirect('product_list')
 
-    # Compute totals in Python
-    total = sum(item.subtotal for item in cart_items) or Decimal('0.00')
-    bulk_discount = Decimal('0.00')
-    total_items = sum(item.quantity for item in cart_items) or 0
-
-    if total_items > 5:
-        bulk_discount = total * Decimal('0.20')
-        total -= bulk_discount
+    # Same pricing as the cart page, including the applied coupon
+    totals = cart_totals(cart_items, request.user, request.session.get('coupon_code', ''))
+    promotion = totals['promotion']
+    total = totals['total_before_gst']
 
     if request.method == 'POST':
         form = AddressForm(request.POST)
-        if form.is_valid():
-            address = form.save(commit=False)
-            address.user = request.user
-            address.is_default = True
-            address.save()
-
-            order_id = uuid.uuid4().hex[:10].upper()
-            order = Order.objects.create(
-                user=request.user,
-                address=address,
-                order_id=order_id,
-                total_amount=total,
-            )
-            for item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item.product,
-                    quantity=item.quantity,
-                    price=item.product.price,
-                )
-                # reduce stock
-                item.product.stock = max(0, item.product.stock - item.quantity)
-                item.product.save()
-            cart_items.delete()
+        delivery = serviceability.estimate(form.data.get('pincode', ''))
+        if form.is_valid() and not delivery['serviceable']:
+            messages.error(request, f"Sorry, we don't deliver to pincode {form.cleaned_data['pincode']} yet.")
+        elif form.is_valid():
+            with transaction.atomic():
+                if promotion and not promotions.claim(promotion, request.user):
+                    request.session.pop('coupon_code', None)
+                    messages.error(request, f"Coupon {promotion.code} is no longer available.")
+                    return redirect('cart')
+
+                # Reuses the row if the user has shipped here before
+                address = addresses.save_default(request.user, form.cleaned_data)
+
+                order = order_ids.create_order(user=request.user, address=address, total_amount=total)
+                for item in totals['items']:
+                    OrderItem.objects.create(
+                        order=order,
+                        product=item.product,
+                        quantity=item.quantity,
+                        price=item.product.price,
+                    )
+                # reduce stock in the background (committed with the order)
+                jobs.enqueue('tasks.apply_order_stock', {'order_id': order.id}, key=f"order-stock:{order.order_id}")
+                if promotion:
+                    CouponRedemption.objects.create(
+                        coupon_id=promotion.id,
+                        user=request.user,
+                        order=order,
+                        amount=totals['coupon_discount'],
+                    )
+                cart_items.delete()
+            request.session.pop('coupon_code', None)
             messages.success(request, f"Order {order.order_id} placed successfully!")
             return redirect('order_success', order_id=order.order_id)
 
@@ -328,38 +399,48 @@ def checkout(request):
                 'pincode': default_address.pincode,
             }
         form = AddressForm(initial=initial)
+        delivery = serviceability.estimate(initial.get('pincode', ''))
 
     return render(request, 'shop/checkout.html', {
-        'cart_items': cart_items,
+        'cart_items': totals['items'],
+        'subtotal': totals['subtotal'],
         'total': total,
-        'bulk_discount': bulk_discount,
-        'total_items': total_items,
+        'bulk_discount': totals['bulk_discount'],
+        'coupon_discount': totals['coupon_discount'],
+        'coupon_code': promotion.code if promotion else '',
+        'total_items': totals['total_items'],
         'form': form,
+        'delivery': delivery,
     })
 
 @login_required
 def my_orders(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'shop/my_orders.html', {'orders': orders})
+    # Older pages transparently continue into archived orders
+    orders, next_cursor = archive.order_history(request.user, request.GET.get('after'))
+    return render(request, 'shop/my_orders.html', {
+        'orders': orders,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('after'),
+    })
 
 @login_required
 def dashboard(request):
-    orders_qs = Order.objects.filter(user=request.user).order_by('-created_at')
-    addresses = Address.objects.filter(user=request.user)
+    saved_addresses = Address.objects.filter(user=request.user).order_by('-is_default', '-created_at')
 
-    total_spent = orders_qs.aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00')
-    total_orders = orders_qs.count()
-    delivered_orders = orders_qs.filter(status='delivered').count() if hasattr(Order, 'status') else 0
-    pending_orders = orders_qs.exclude(status='delivered').count() if hasattr(Order, 'status') else total_orders
+    # Lifetime totals cover archived orders too
+    hot = archive.order_totals(Order.objects.filter(user=request.user))
+    archived = archive.order_totals(ArchivedOrder.objects.filter(user=request.user))
+    total_spent = (hot['spent'] or Decimal('0.00')) + (archived['spent'] or Decimal('0.00'))
+    total_orders = hot['orders'] + archived['orders']
+    delivered_orders = hot['delivered'] + archived['delivered']
+    pending_orders = total_orders - delivered_orders
 
-    last_order = orders_qs.first()
-    last_order_date = last_order.created_at if last_order else None
-
-    recent_orders = orders_qs[:5]
+    recent_orders, _ = archive.order_history(request.user, size=5)
+    last_order_date = recent_orders[0].created_at if recent_orders else None
 
     context = {
         'orders': recent_orders,
-        'addresses': addresses,
+        'addresses': saved_addresses,
         'total_spent': total_spent,
         'total_orders': total_orders,
         'delivered_orders': delivered_orders,
@@ -369,6 +450,41 @@ def dashboard(request):
     return render(request, 'shop/dashboard.html', context)
 
 
+ANALYTICS_PERIODS = (30, 90, 365, 1095)
+
+@staff_member_required
+def sales_analytics(request):
+    """Store-wide sales charts for staff, computed from the daily rollups."""
+    try:
+        days = int(request.GET.get('days', 90))
+    except ValueError:
+        days = 90
+    if days not in ANALYTICS_PERIODS:
+        days = 90
+    return render(request, 'shop/analytics.html', {
+        'report': analytics.sales_report(days),
+        'periods': ANALYTICS_PERIODS,
+    })
+
+
+@staff_member_required
+def cache_stats(request):
+    """Hit/miss/eviction counters of this worker's cache (per process)."""
+    backend = caches['default']
+    stats = backend.stats() if hasattr(backend, 'stats') else {}
+    return JsonResponse({'pid': os.getpid(), 'backend': type(backend).__name__, 'stats': stats})
+
+
+def metrics(request):
+    """Prometheus scrape target: staff, or a bearer token matching METRICS_TOKEN."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    auth = request.META.get('HTTP_AUTHORIZATION', '')
+    if not (request.user.is_staff or (token and hmac.compare_digest(auth, f"Bearer {token}"))):
+        return HttpResponse(status=403)
+    request_metrics.flush(force=True)
+    return HttpResponse(request_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 def register(request):
     if request.method == 'POST':
         form = RegisterForm(request.POST)
@@ -412,17 +528,19 @@ def remove_from_wishlist(request, product_id):
 
 @login_required
 def order_success(request, order_id):
-    order = get_object_or_404(Order, order_id=order_id, user=request.user)
+    order = (
+        Order.objects.filter(order_id=order_id, user=request.user).first()
+        or get_object_or_404(ArchivedOrder, order_id=order_id, user=request.user)
+    )
 
-    # Reuse delivery estimate logic (3–5 days from today)
-    today = date.today()
-    start = today + timedelta(days=3)
-    end = today + timedelta(days=5)
-    estimated_delivery = f"{start.strftime('%d %b')} – {end.strftime('%d %b')}"
+    # Counted from the order date, for the pincode it ships to
+    pincode = Address.objects.filter(pk=order.address_id).values_list('pincode', flat=True).first()
+    delivery = serviceability.estimate(pincode, timezone.localdate(order.created_at))
 
     return render(request, 'shop/order_success.html', {
         'order': order,
-        'estimated_delivery': estimated_delivery,
+        'delivery': delivery,
+        'estimated_delivery': delivery['label'],
     })
 
 
@@ -459,7 +577,44 @@ def remove_from_compare(request, product_id):
 
 def compare_view(request):
     compare = _get_compare_list(request)
-    products_qs = Product.objects.filter(id__in=compare)
+    products_qs = (
+        Product.objects.filter(id__in=compare).select_related('category')
+        .only('id', 'name', 'price', 'stock', 'image', 'rating', 'category__name')
+        # The template falls back to the description; 121 characters are all truncatechars:120 needs
+        .annotate(summary=Coalesce(NullIf('short_description', Value('')), Substr('description', 1, 121),
+                                   output_field=TextField()))
+    )
     products = list(products_qs)
     products.sort(key=lambda p: compare.index(p.id))
     return render(request, 'shop/compare.html', {'products': products})
+
+
+# ---------------- SITEMAPS / PRODUCT FEED ----------------
+# Pre-built files (see shop/feeds.py), so crawlers never page through product_list
+CRAWLER_CACHE_CONTROL = 'public, max-age=3600'
+
+def _feeds_not_built():
+    # First request on a fresh deploy: build in the worker, not in this request
+    feeds.schedule_refresh()
+    response = HttpResponse("Not generated yet, try again shortly.", status=503, content_type='text/plain')
+    response['Retry-After'] = str(feeds.REFRESH_COALESCE)
+    return response
+
+def sitemap_file(request, name):
+    if not os.path.exists(feeds.path(feeds.MANIFEST)):
+        return _feeds_not_built()
+    try:
+        response = FileResponse(open(feeds.path(name), 'rb'), content_type=feeds.FORMATS['xml'])
+    except FileNotFoundError:
+        raise Http404("No such sitemap.")
+    response['Cache-Control'] = CRAWLER_CACHE_CONTROL
+    return response
+
+def product_feed(request, fmt):
+    if fmt not in feeds.FORMATS:
+        raise Http404("Unknown feed format.")
+    if not os.path.exists(feeds.path(feeds.MANIFEST)):
+        return _feeds_not_built()
+    response = StreamingHttpResponse(feeds.feed_parts(fmt), content_type=feeds.FORMATS[fmt])
+    response['Cache-Control'] = CRAWLER_CACHE_CONTROL
+    return response